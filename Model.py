@@ -1,58 +1,140 @@
 from gurobipy import Model, GRB
+import gurobipy as gp
 from data import *
 import numpy as np
+import copy
+import json
+import time
 from KPI_calculations import get_longest_queue_time
+from solver_profiles import get_profile
+from model_hygiene import RowStager
+
+
+def add_desk_constraints(model, rows, B, desk, y_open, n_desks, N, minimum_desk_time, initial_desks=0, formulation='indicator'):
+    # Desk opening, minimum open time and the link between the desk count B and the individual desks, shared
+    # by the ACP and the desk master problem of the flight decomposition. Linear rows go to the RowStager rows.
+    # formulation 'indicator' uses indicator constraints, 'tight' the linear start-up and minimum up time
+    # inequalities from unit commitment, which have a much stronger LP relaxation
+    if formulation not in ('indicator', 'tight'):
+        raise ValueError(f"Unknown formulation '{formulation}', options are 'indicator' and 'tight'")
+    m = minimum_desk_time
+    rows.mark_used(desk.values())
+    rows.mark_used(y_open.values())
+
+    # Ensure that once a desk is opened, it stays open for at least "minimum_desk_time" consecutive time intervals
+    # model.addConstrs((desk[i, t] <= desk[i, t + 1] for i in range(n_desks) for t in range(N - 1)), "DeskOpeningConsistency")
+    if formulation == 'indicator':
+        for i in range(n_desks):
+            for t in range(1, N - m):
+                model.addConstr((y_open[i,t] == 1) >> (sum(desk[i, t + k] for k in range(m)) >= m),
+                    f"MinConsecutiveOpening_{i}_{t}")
+    else:
+        # A desk is open at t if it was opened in the last m intervals (openings from t = 1 to N - m - 1 bind)
+        rows.add("MinConsecutiveOpening", (((i, t), gp.quicksum(y_open[i, s] for s in range(max(1, t - m + 1), min(t, N - m - 1) + 1)),
+                                            GRB.LESS_EQUAL, desk[i, t])
+                                           for i in range(n_desks) for t in range(1, N) if max(1, t - m + 1) <= min(t, N - m - 1)))
+
+    # Link the number of desks opened in each time interval to the binary desk variables
+    rows.add("LinkDeskToB", ((t, B[t], GRB.EQUAL, desk.sum('*', t)) for t in range(N)))
+
+    # Ensure that desks incur an opening cost when they are opened
+    # (desks still open from a previous horizon are not opened again)
+    rows.add("OpeningCost", ((i, y_open[i, 0], GRB.EQUAL, desk[i, 0]) for i in range(initial_desks, n_desks)))
+    if formulation == 'indicator':
+        for i in range(n_desks):
+            for t in range(1, N):
+                model.addConstr((desk[i, t - 1] == 0) >> (y_open[i, t] == desk[i, t]), f"OpeningCost_{i}_{t}")
+    else:
+        # y_open[i, t] = desk[i, t] * (1 - desk[i, t - 1]), linearized
+        rows.add("OpeningCost", (((i, t), y_open[i, t], GRB.GREATER_EQUAL, desk[i, t] - desk[i, t - 1]) for i in range(n_desks) for t in range(1, N)))
+        rows.add("OpeningOnlyIfOpen", (((i, t), y_open[i, t], GRB.LESS_EQUAL, desk[i, t]) for i in range(n_desks) for t in range(1, N)))
+        rows.add("OpeningOnlyIfClosed", (((i, t), y_open[i, t], GRB.LESS_EQUAL, 1 - desk[i, t - 1]) for i in range(n_desks) for t in range(1, N)))
+
+    # Desks incur an operating cost while they are open through B[t], which LinkDeskToB ties to the open desks
+
 
 class ACP:
-    def __init__(self, model_name, T, l, parameter_settings, flight_schedule=None, data_schiphol=None, schiphol_case=False, passenger_scale=1):
+    def __init__(self, model_name, T, l, parameter_settings, flight_schedule=None, data_schiphol=None, schiphol_case=False, passenger_scale=1,
+                 passenger_flow=None, initial_queue=None, initial_desks=0, time_varying=None, hygiene=False,
+                 formulation='indicator', env=None, expected_demand=False, passenger_classes=None):
         self.objective = None
+        self.build_times = {}  # Wall time [s] of each construction phase
+        phase_start = time.perf_counter()
         self.model_name = model_name
-        self.model = Model(model_name)
+        self.model = Model(model_name, env=env)  # env: a shared Gurobi environment, e.g. of a sweep (see solve_sweep)
         self.T = T  # Total time window [hrs]
         self.l = l  # Length of the considered time interval [hrs]
-        self.N = int(self.T // self.l)  # Number of intervals
+        self.N = int(round(self.T / self.l))  # Number of intervals
         self.schiphol_case = schiphol_case
         self.parameter_settings = parameter_settings
         self.passenger_scale = passenger_scale
+        self.t_interval = int(round(self.l * 60))  # Length of the considered time interval [min]
+        self.initial_queue = initial_queue if initial_queue is not None else {}  # Queue carried over from a previous horizon per flight
+        self.initial_desks = initial_desks  # Number of desks still open at the end of a previous horizon
+        self.formulation = formulation  # Desk opening constraints, 'indicator' or 'tight' (see add_desk_constraints)
+        self.expected_demand = expected_demand  # Plan on the expected passenger arrivals instead of a sample
 
         if self.schiphol_case is False:
             self.flight_schedule = flight_schedule  # Dictionary of flight index as key and interval index as departure time in timewindow T
         else:
             self.flight_schedule = {i: (row['ETD_minutes'], row['MAX_PAX']) for i, row in data_schiphol.flights.iterrows()}
+            if time_varying is None:
+                time_varying = data_schiphol.time_varying_settings(self.t_interval, int(round(self.T / self.l)))
+        # Per flight (p, h0) or per interval (C, s_open, s_operate, l) arrays replacing the scalar parameter_settings
+        self.time_varying = time_varying if time_varying is not None else {}
+
+        # With passenger classes (a PassengerClasses or its dict of settings) every flight and class is one queue
+        # j = flight * K + class, flight_schedule, d, I0, p, h, q and I are then per queue and flights is per flight
+        if passenger_classes is None and self.schiphol_case:
+            passenger_classes = data_schiphol.passenger_classes
+        if isinstance(passenger_classes, dict):
+            passenger_classes = PassengerClasses(passenger_classes)
+        self.passenger_classes = passenger_classes
+        self.flights = self.flight_schedule
+        self.flight_time_varying = self.time_varying  # As given per flight, e.g. to build the ACP again with the classes
+        if self.passenger_classes is not None:
+            self.flight_schedule = self.passenger_classes.expand(self.flights)
+            self.time_varying = self.passenger_classes.expand_time_varying(self.time_varying, len(self.flights))
+        self.set_queue_index()
+
+        self.J = len(self.flight_schedule)  # Total number of flights in T (of queues with passenger classes)
+        # Check-in windows: passengers can not check-in before 4 hours and after 45 minutes in advance of departure
+        self.windows = CheckinWindows.from_schedule(self.flight_schedule, self.t_interval, self.N, earliest_checkin=4 * 60, last_checkin=45)
+        self.flights_at = self.windows.flights_at()  # For each interval t the flights that can check in
+        if passenger_flow is None:
+            self.d, too_early = self.create_passenger_flow()
+        else:
+            self.d, too_early = passenger_flow  # Arrivals streamed in by a caller, e.g. a rolling horizon
+        self.I0 = {j: self.initial_queue.get(j, too_early[j]) for j in range(self.J)}  # Number of passengers waiting before desk opening per flight
+        self.build_times['passenger_flow'] = time.perf_counter() - phase_start
+
+        # Linear rows are staged and added at the end. The builder leaves out the rows known to be redundant, the generic
+        # hygiene pass (hygiene=True) is an opt-in check for the ones it misses
+        self.rows = RowStager(self.model, hygiene)
+        self.hygiene_report = {}
+        for phase in (self.initialize_data, self.setup_decision_variables, self.add_constraints, self.set_objective, self.apply_hygiene):
+            phase_start = time.perf_counter()
+            phase()
+            self.build_times[phase.__name__] = time.perf_counter() - phase_start
 
-        self.J = len(self.flight_schedule)  # Total number of flights in T
-        self.d, too_early = self.create_passenger_flow()
-        self.I0 = {j: too_early[j] for j in range(self.J)}  # Number of passengers waiting before desk opening per flight
-        # Tj calculation
-        self.early_limit = 4 / self.l  # passengers can not check-in before 4 hours in advance of departure
-        self.late_limit = 0.75 / self.l  # passengers can not check-in after 45 minutes before departure
-        Tj = dict()
-        for j, t in self.flight_schedule.items():
-            earliest_checkin_index = int(round(t[0] / (self.l*60)) - self.early_limit)
-            latest_checkin_index = int(round(t[0] / (self.l*60)) - self.late_limit)
-            non_checkin_intervals = set(range(earliest_checkin_index)) | set(
-                range(latest_checkin_index + 1, self.N))
-            Tj[j] = non_checkin_intervals
-        self.Tj = Tj  # For each flight j the set of time intervals in which it is not possible to check in
-        self.t_interval = 5
-
-        self.initialize_data()
-        self.setup_decision_variables()
-        self.add_constraints()
-        self.set_objective()
-
-
-
-    def create_passenger_flow(self, t_interval=5, tot_m=24 * 60, mean_early_t=2 * 60, arrival_std=0.5,
+
+
+    def create_passenger_flow(self, t_interval=None, tot_m=None, mean_early_t=2 * 60, arrival_std=0.5,
                 last_checkin=45, earliest_checkin=4 * 60):
     # def create_passenger_flow(self, t_interval=5, tot_m=24 * 60, mean_early_t=2 * 60, arrival_std=0.5,
     #             last_checkin=4 * 60, earliest_checkin=4 * 60 - (4 * 60 - 45)): #ALL PASSENGERS TOO EARLY - VERIFICATION
     # def create_passenger_flow(self, t_interval=5, tot_m=24 * 60, mean_early_t=2 * 60, arrival_std=0.5,
     #                           last_checkin=0, earliest_checkin=1): #ALL PASSENGERS TOO LATE - VERIFICATION
-        self.t_interval = t_interval
+        t_interval = t_interval if t_interval is not None else self.t_interval
+        tot_m = tot_m if tot_m is not None else int(self.T * 60)
         flight_schedule = self.flight_schedule
+        windows = self.windows if (t_interval, tot_m, last_checkin, earliest_checkin) == (self.t_interval, int(self.T * 60), 45, 4 * 60) else None
+        if self.passenger_classes is not None:
+            # Arrival profile of the class of every queue
+            mean_early_t = self.passenger_classes.queue_values('mean_early_t', len(self.flights), mean_early_t)
+            arrival_std = self.passenger_classes.queue_values('arrival_std', len(self.flights), arrival_std)
         d, too_early = data.flights_to_d(flight_schedule, t_interval, tot_m, mean_early_t, arrival_std, last_checkin,
-                                         earliest_checkin)
+                                         earliest_checkin, windows=windows, expected=self.expected_demand)
         too_early = [round(self.passenger_scale * x) for x in too_early]  # Ensure correct scaling of too_early
         for key in d:
             d[key] = round(self.passenger_scale * d[key])  # Ensure correct scaling of d
@@ -66,102 +148,147 @@ class ACP:
 
         return d, too_early
 
+    def set_queue_index(self):
+        # Flight and class of every queue, and the desk group that serves it: 0 for the shared desks, 1 + i for the i-th
+        # class with dedicated desks
+        if self.passenger_classes is None:
+            self.flight_of = np.arange(len(self.flight_schedule))
+            self.class_of = np.zeros(len(self.flight_schedule), dtype=int)
+            self.desk_group = np.zeros(len(self.flight_schedule), dtype=int)
+            return
+        self.flight_of = self.passenger_classes.flight_of(len(self.flights))
+        self.class_of = self.passenger_classes.class_of(len(self.flights))
+        groups = np.where(self.passenger_classes.dedicated, np.cumsum(self.passenger_classes.dedicated), 0)
+        self.desk_group = groups[self.class_of]
+
+    def settings_array(self, name, size):
+        # Setting per flight or per interval: the time_varying array where given, the scalar of parameter_settings elsewhere
+        scalar = self.parameter_settings[name]
+        if name not in self.time_varying:
+            return np.full(size, float(scalar))
+        values = np.asarray(self.time_varying[name], dtype=float)
+        if values.shape != (size,):
+            raise ValueError(f"Time varying setting '{name}' has shape {values.shape}, expected ({size},)")
+        return np.where(np.isnan(values), scalar, values)
+
     def initialize_data(self):
+        # parameter_settings are given per 5-minute interval, rescale the per-interval ones to the interval length used
+        scale = self.t_interval / 5
         # Costs and demands
-        self.p = {j: self.parameter_settings['p'] for j in range(self.J)}  # Service time per passenger for a specific aircraft [hrs]
-        self.C = {t: self.parameter_settings['C'] for t in range(self.N)}  # Maximum (for dynamic) of desks available per interval
-        self.s_open = {t: self.parameter_settings['s_open'] for t in range(self.N)}  # Desk opening costs for time t
-        self.s_operate = {t: self.parameter_settings['s_operate'] for t in range(self.N)}  # Desk operating costs for time t
-        self.h = {j: self.parameter_settings['h0'] for j in range(self.J)}  # Queue costs
-
-        A = np.zeros((self.J, self.N))
-        for key, value in self.Tj.items():
-            for time in list(value):
-                A[int(key), int(time)] = 1
-        self.A = A
-        self.l_param = self.parameter_settings['l']  # average service time per desk
+        self.p = self.settings_array('p', self.J)  # Service time per passenger for a specific aircraft [hrs]
+        self.desks_available = self.settings_array('C', self.N)  # Desks available per interval
+        if self.desks_available.max() > self.parameter_settings['C']:
+            raise ValueError(f"More desks available in some interval than the {self.parameter_settings['C']} desks of parameter_settings['C']")
+        self.C = self.desks_available * scale  # Maximum (for dynamic) of desks available per interval
+        self.s_open = self.settings_array('s_open', self.N)  # Desk opening costs for time t
+        self.s_operate = self.settings_array('s_operate', self.N) * scale  # Desk operating costs for time t
+        self.h = self.settings_array('h0', self.J) * scale  # Queue costs
+        self.minimum_desk_time = max(1, int(np.ceil(self.parameter_settings['minimum_desk_time'] / scale)))  # Minimum open time [intervals]
+
+        self.A = (~self.windows.mask()).astype(float)  # 1 where flight j can not check in at interval t
+        self.l_param = self.settings_array('l', self.N) * scale  # average service time per desk
 
     def setup_decision_variables(self):
         # Decision variables
-        self.B = self.model.addVars(self.N, vtype=GRB.INTEGER, name="B")  # number of desks to be assigned in interval t
-        self.q = self.model.addVars(self.J, self.N, vtype=GRB.INTEGER, name="q")
-        self.x = self.model.addVars(self.J, self.N, vtype=GRB.BINARY, name="x")
-        self.I = self.model.addVars(self.J, self.N, vtype=GRB.INTEGER, name="I")
+        self.B = self.model.addVars(self.N, ub=self.desks_available.tolist(), vtype=GRB.INTEGER, name="B")  # number of desks to be assigned in interval t
+        # Queue variables only exist inside the check-in window of each flight
+        window_keys = self.windows.keys()
+        self.q = self.model.addVars(window_keys, vtype=GRB.INTEGER, name="q")
+        self.x = self.model.addVars(window_keys, vtype=GRB.BINARY, name="x")
+        self.I = self.model.addVars(window_keys, vtype=GRB.INTEGER, name="I")
         self.desk = self.model.addVars(self.parameter_settings['C'], self.N, vtype=GRB.BINARY, name="desk")  # binary variable indicating desk open status
         self.y_open = self.model.addVars(self.parameter_settings['C'], self.N, vtype=GRB.BINARY, name="y_open")  # binary variable indicating desk opening
+        # Desks of B[t] that only serve one passenger class, per class with dedicated desks
+        n_dedicated = int(self.desk_group.max(initial=0)) if self.model_name == "dynamic_ACP" else 0
+        self.B_class = self.model.addVars(n_dedicated, self.N, ub=np.tile(self.desks_available, n_dedicated).tolist(), vtype=GRB.INTEGER, name="B_class")
 
     def add_constraints(self):
-        # Initial conditions
-        self.model.addConstrs((self.I[j, int(self.flight_schedule[j][0] / (self.l*60) - 4 * 12 + 1)] == self.I0[j] for j in range(self.J)), "InitialQueue")
+        start, end = self.windows.start, self.windows.end
+        open_flights = [j for j in range(self.J) if self.windows.length[j] > 0]
 
-        # Queue dynamics
-        self.model.addConstrs((self.I[j, t] == (self.I[j, t - 1] + self.d[j, t] - self.q[j, t])
-                               for j in range(self.J) for t in range(int(self.flight_schedule[j][0] / (self.l*60) - (4 * 12) + 2), self.N)), "QueueDynamics")
-
-        # No passengers can ENTER queue when they are outside the check-in limits
-        self.model.addConstrs((self.I[j, t] == 0
-                               for j in range(self.J) for t in self.Tj[j]), "EnterQueueLimit")
+        # Initial conditions, the passengers waiting when the window opens (or carried over from a previous horizon)
+        self.rows.add("InitialQueue", ((j, self.I[j, start[j]], GRB.EQUAL, self.I0[j] + self.d[j, start[j]] - self.q[j, start[j]]) for j in open_flights))
 
-        # Capacity limits -> first in static
-        self.model.addConstrs((sum(self.q[j, t] * self.p[j] for j in range(self.J)) <= self.C[t]
-                               for t in range(self.N)), "CapacityLimit")
+        # Queue dynamics
+        self.rows.add("QueueDynamics", (((j, t), self.I[j, t], GRB.EQUAL, self.I[j, t - 1] + self.d[j, t] - self.q[j, t])
+                                        for j in open_flights for t in range(start[j] + 1, end[j] + 1)))
+
+        # No passengers can remain in the queue after the last check-in, as a bound instead of a row
+        closing = [self.I[j, end[j]] for j in open_flights if self.windows.closes_in_horizon(j)]
+        self.model.setAttr('UB', closing, [0] * len(closing))
+
+        # Service load p[j] * q[j, t] of every interval and desk group, built from the window index arrays
+        flight_index, time_index = self.windows.indices()
+        desk_group = self.desk_group if self.model_name == "dynamic_ACP" else np.zeros_like(self.desk_group)  # The static model has no desks
+        n_groups = int(desk_group.max(initial=0)) + 1
+        slot = desk_group[flight_index] * self.N + time_index
+        order = np.argsort(slot, kind='stable')
+        q_vars = list(self.q.values())
+        coefficients = self.p[flight_index].tolist()
+        counts = np.bincount(slot, minlength=n_groups * self.N)
+        has_load = counts > 0  # Slots without queues would only give empty rows
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        group_load = [gp.LinExpr([coefficients[k] for k in order[bounds[s]:bounds[s + 1]]], [q_vars[k] for k in order[bounds[s]:bounds[s + 1]]])
+                      for s in range(n_groups * self.N)]
+        load = group_load[:self.N] if n_groups == 1 else [gp.quicksum(group_load[g * self.N + t] for g in range(n_groups)) for t in range(self.N)]
+
+        # Capacity limits -> first in static. In the dynamic model they are implied by the desk capacity where the open
+        # desks can not serve more than C[t]
+        interval_load = has_load.reshape(n_groups, self.N).any(axis=0)
+        if self.model_name == "dynamic_ACP":
+            interval_load &= self.l_param * self.desks_available > self.C + 1e-9
+        self.rows.add("CapacityLimit", ((t, load[t], GRB.LESS_EQUAL, self.C[t]) for t in np.flatnonzero(interval_load).tolist()))
 
         # Check-in limits -> first in static -> maybe delete
         # self.model.addConstrs((self.q[j, t] * self.p[j] <= self.C[t] * self.x[j, t]
         #                       for j in range(self.J) for t in range(self.N)), "CheckInLimit")
 
         if self.model_name == "dynamic_ACP":
-            # Dynamic capacity limits
-            self.model.addConstrs((sum(self.q[j, t] * self.p[j] for j in range(self.J)) <= self.l_param * self.B[t]
-                                   for t in range(self.N)), "CapacityLimit_dynamic")
+            # Dynamic capacity limits, with dedicated desks per group: the shared desks are those of B[t] not dedicated to a class
+            if n_groups == 1:
+                self.rows.add("CapacityLimit_dynamic", ((t, load[t], GRB.LESS_EQUAL, self.l_param[t] * self.B[t]) for t in range(self.N) if has_load[t]))
+            else:
+                dedicated = [self.B_class.sum('*', t) for t in range(self.N)]
+                self.rows.add("CapacityLimit_dynamic", ((t, group_load[t], GRB.LESS_EQUAL, self.l_param[t] * (self.B[t] - dedicated[t]))
+                                                        for t in range(self.N) if has_load[t]))
+                self.rows.add("CapacityLimit_class", (((g, t), group_load[(g + 1) * self.N + t], GRB.LESS_EQUAL, self.l_param[t] * self.B_class[g, t])
+                                                      for g in range(n_groups - 1) for t in range(self.N) if has_load[(g + 1) * self.N + t]))
+                self.rows.add("DedicatedDeskLimit", ((t, dedicated[t], GRB.LESS_EQUAL, self.B[t]) for t in range(self.N)))
 
             # All passengers accepted in time frame -> maybe delete, because passengers can arrive too late
             # self.model.addConstrs((self.A[j, t] * self.I[j, t] == 0
             #                       for j in range(self.J) for t in range(self.N)), "All_pax_in_timeframe")
 
-            # Ensure that once a desk is opened, it stays open for at least "minimum_desk_time" consecutive time intervals
-            # self.model.addConstrs((self.desk[i, t] <= self.desk[i, t + 1] for i in range(self.parameter_settings['C']) for t in range(self.N - 1)), "DeskOpeningConsistency")
-            for i in range(self.parameter_settings['C']):
-                for t in range(1, self.N - self.parameter_settings["minimum_desk_time"]):
-                    self.model.addConstr((self.y_open[i,t] == 1) >> (sum(self.desk[i, t + k] for k in range(self.parameter_settings["minimum_desk_time"])) >= self.parameter_settings["minimum_desk_time"]),
-                        f"MinConsecutiveOpening_{i}_{t}")
-
-            # Link the number of desks opened in each time interval to the binary desk variables
-            self.model.addConstrs((self.B[t] == sum(self.desk[i, t] for i in range(self.parameter_settings['C'])) for t in range(self.N)), "LinkDeskToB")
-
-            # Ensure that desks incur an opening cost when they are opened
-            for i in range(self.parameter_settings['C']):
-                for t in range(self.N):
-                    if t == 0:
-                        self.model.addConstr(self.y_open[i, t] == self.desk[i, t], f"OpeningCost_{i}_{t}")
-                    else:
-                        self.model.addConstr((self.desk[i, t - 1] == 0) >> (self.y_open[i, t] == self.desk[i, t]),
-                                             f"OpeningCost_{i}_{t}")
-
-            # Ensure that desks incur an operating cost while they are open
-            self.model.addConstrs((self.B[t] == sum(self.desk[i, t] for i in range(self.parameter_settings['C'])) for t in range(self.N)), "OperatingCost")
+            add_desk_constraints(self.model, self.rows, self.B, self.desk, self.y_open, self.parameter_settings['C'], self.N,
+                                 self.minimum_desk_time, self.initial_desks, self.formulation)
 
     def set_objective(self):
-        # Objective function
+        # Objective function, with the cost arrays as coefficients of the variable lists
+        self.model.setObjective(gp.quicksum(self.cost_expressions()), GRB.MINIMIZE)
+
+    def cost_expressions(self):
+        # Waiting, opening and operating costs as linear expressions (for the static model the opening cost of x)
+        flight_index, time_index = self.windows.indices()
+        waiting_cost = gp.LinExpr(self.h[flight_index].tolist(), list(self.I.values()))
         if self.model_name == "static_ACP":
-            self.model.setObjective(
-                sum(self.h[j] * self.I[j, t] + self.s_open[t] * self.x[j, t]
-                    for j in range(self.J) for t in range(self.N)),
-                GRB.MINIMIZE
-            )
-        else:
-            self.model.setObjective(
-                sum(self.h[j] * self.I[j, t] for j in range(self.J) for t in range(self.N)) +
-                sum(self.s_open[t] * sum(self.y_open[i, t] for i in range(self.parameter_settings['C'])) for t in
-                    range(self.N)) +
-                sum(self.s_operate[t] * self.B[t] for t in range(self.N)),
-                GRB.MINIMIZE
-            )
-
-    def optimize(self):
-        # Optimize the model
+            return waiting_cost, gp.LinExpr(self.s_open[time_index].tolist(), list(self.x.values())), gp.LinExpr()
+        opening_cost = gp.LinExpr(np.tile(self.s_open, self.parameter_settings['C']).tolist(), list(self.y_open.values()))
+        operating_cost = gp.LinExpr(self.s_operate.tolist(), list(self.B.values()))
+        return waiting_cost, opening_cost, operating_cost
+
+    def apply_hygiene(self):
+        # Adds the staged rows, with hygiene=True without the empty, duplicate, dominated and single variable ones, see model_hygiene.py
+        self.hygiene_report = self.rows.flush()
+        removed = {kind: sum(families.values()) for kind, families in self.hygiene_report.items() if isinstance(families, dict)}
+        if removed:
+            print(f"Model hygiene: {self.hygiene_report['rows_added']} of {self.hygiene_report['rows_staged']} rows added, removed {removed}")
+
+    def optimize(self, profile=None, callback=None, compute_iis=True, **solver_params):
+        # Optimize the model, with a named solve profile ('fast', 'balanced', 'exact' or a tuned one) and/or Gurobi parameters
         self.model.setParam('OutputFlag', True)  # Enable detailed Gurobi output
-        self.model.optimize()
+        for name, value in {**get_profile(profile), **solver_params}.items():
+            self.model.setParam(name, value)
+        self.model.optimize(callback)
         # Output results
         if self.model.status == GRB.OPTIMAL:
             print("Optimal solution found!")
@@ -169,8 +296,17 @@ class ACP:
             print(f"Total Runtime = {self.model.Runtime} seconds")
             self.objective = self.model.ObjVal
 
+        elif self.model.status in (GRB.TIME_LIMIT, GRB.INTERRUPTED, GRB.NODE_LIMIT, GRB.SOLUTION_LIMIT, GRB.WORK_LIMIT) and self.model.SolCount > 0:
+            print("Solve limit reached, using the best plan found")
+            print(f"Objective Value = {self.model.ObjVal}")
+            print(f"MIP gap = {self.model.MIPGap}")
+            print(f"Total Runtime = {self.model.Runtime} seconds")
+            self.objective = self.model.ObjVal
+
         elif self.model.status == GRB.INF_OR_UNBD:
             print("Model is infeasible or unbounded")
+        elif self.model.status == GRB.INFEASIBLE and not compute_iis:
+            print("Model is infeasible")
         elif self.model.status == GRB.INFEASIBLE:
             print("Model is infeasible")
             self.model.computeIIS()
@@ -183,17 +319,133 @@ class ACP:
         else:
             print("Optimization ended with status ", self.model.Status)
 
+    def save(self, path):
+        # Writes the built model to <path>.mps and the metadata needed to map its variables back to <path>.json
+        self.model.write(path + '.mps')
+        flight_index, time_index = self.windows.indices()
+        metadata = {
+            'model_name': self.model_name, 'T': self.T, 'l': self.l, 'passenger_scale': self.passenger_scale,
+            'parameter_settings': {key: float(value) if isinstance(value, float) else int(value) for key, value in self.parameter_settings.items()},
+            'flight_schedule': [[int(etd), int(pax)] for etd, pax in self.flight_schedule.values()],
+            'd': [int(self.d.get((j, t), 0)) for j, t in zip(flight_index.tolist(), time_index.tolist())],
+            'I0': [int(self.I0[j]) for j in range(self.J)],
+            'initial_desks': int(self.initial_desks),
+            'formulation': self.formulation,
+            'time_varying': {name: np.asarray(values, dtype=float).tolist() for name, values in self.time_varying.items()},
+            'flights': [[int(etd), int(pax)] for etd, pax in self.flights.values()],
+            'flight_time_varying': {name: np.asarray(values, dtype=float).tolist() for name, values in self.flight_time_varying.items()},
+            'passenger_classes': None if self.passenger_classes is None else
+            {name: {key: np.asarray(value).tolist() for key, value in settings.items()} for name, settings in self.passenger_classes.settings.items()},
+        }
+        with open(path + '.json', 'w') as f:
+            json.dump(metadata, f)
+
+    @classmethod
+    def load(cls, path, env=None):
+        # Reads a model written by save() without rebuilding it from Python
+        with open(path + '.json') as f:
+            metadata = json.load(f)
+        acp = cls.__new__(cls)
+        acp.objective = None
+        acp.build_times = {}
+        acp.model_name = metadata['model_name']
+        acp.T = metadata['T']
+        acp.l = metadata['l']
+        acp.N = int(round(acp.T / acp.l))
+        acp.schiphol_case = False
+        acp.parameter_settings = metadata['parameter_settings']
+        acp.passenger_scale = metadata['passenger_scale']
+        acp.t_interval = int(round(acp.l * 60))
+        acp.initial_queue = {}
+        acp.initial_desks = metadata['initial_desks']
+        acp.formulation = metadata.get('formulation', 'indicator')
+        acp.time_varying = {name: np.array(values) for name, values in metadata.get('time_varying', {}).items()}
+        acp.flight_schedule = {j: tuple(flight) for j, flight in enumerate(metadata['flight_schedule'])}
+        acp.flights = {j: tuple(flight) for j, flight in enumerate(metadata.get('flights', metadata['flight_schedule']))}
+        acp.flight_time_varying = {name: np.array(values) for name, values in metadata.get('flight_time_varying', metadata.get('time_varying', {})).items()}
+        acp.passenger_classes = PassengerClasses(metadata['passenger_classes']) if metadata.get('passenger_classes') else None
+        acp.set_queue_index()
+        acp.J = len(acp.flight_schedule)
+        acp.windows = CheckinWindows.from_schedule(acp.flight_schedule, acp.t_interval, acp.N, earliest_checkin=4 * 60, last_checkin=45)
+        acp.flights_at = acp.windows.flights_at()
+        acp.d = dict(zip(acp.windows.keys(), metadata['d']))
+        acp.I0 = dict(enumerate(metadata['I0']))
+        acp.initialize_data()
+        acp.model = gp.read(path + '.mps', env) if env is not None else gp.read(path + '.mps')
+        acp.map_variables()
+        return acp
+
+    def clone(self):
+        # Independent copy of a built (or loaded) ACP, e.g. for a worker that modifies bounds or parameters
+        acp = copy.copy(self)
+        acp.objective = None
+        acp.model = self.model.copy()
+        acp.map_variables()
+        return acp
+
+    def map_variables(self):
+        # Rebuilds the variable tupledicts from the variable names of a loaded or copied model
+        families = {'B': {}, 'q': {}, 'x': {}, 'I': {}, 'desk': {}, 'y_open': {}, 'B_class': {}}
+        self.model.update()
+        variables = self.model.getVars()
+        for var, name in zip(variables, self.model.getAttr('VarName', variables)):
+            family, _, index = name.partition('[')
+            key = tuple(int(i) for i in index[:-1].split(','))
+            families[family][key if len(key) > 1 else key[0]] = var
+        self.B = gp.tupledict(families['B'])
+        self.q = gp.tupledict(families['q'])
+        self.x = gp.tupledict(families['x'])
+        self.I = gp.tupledict(families['I'])
+        self.desk = gp.tupledict(families['desk'])
+        self.y_open = gp.tupledict(families['y_open'])
+        self.B_class = gp.tupledict(families['B_class'])
+
+    def interval_totals(self, variables, solution=None):
+        # Solution of q or I summed over all flights per interval. solution(list of variables) gives the values,
+        # by default of the final solution, in a callback e.g. model.cbGetSolution
+        solution = solution if solution is not None else (lambda variables: self.model.getAttr('X', variables))
+        _, time_index = self.windows.indices()
+        values = np.array(solution(list(variables.values())))
+        return np.bincount(time_index, weights=values, minlength=self.N)
+
+    def class_totals(self, variables, solution=None):
+        # Solution of q or I summed per passenger class and interval, a K x N array (one row without passenger classes)
+        solution = solution if solution is not None else (lambda variables: self.model.getAttr('X', variables))
+        flight_index, time_index = self.windows.indices()
+        K = 1 if self.passenger_classes is None else self.passenger_classes.K
+        values = np.array(solution(list(variables.values())))
+        return np.bincount(self.class_of[flight_index] * self.N + time_index, weights=values, minlength=K * self.N).reshape(K, self.N)
+
+    def class_KPIs(self, solution=None):
+        # Waiting cost, passengers checked in and longest wait [min] per passenger class (FIFO within the class)
+        solution = solution if solution is not None else (lambda variables: self.model.getAttr('X', variables))
+        names = ['all'] if self.passenger_classes is None else self.passenger_classes.names
+        flight_index, _ = self.windows.indices()
+        waiting_costs = np.bincount(self.class_of[flight_index], weights=self.h[flight_index] * np.array(solution(list(self.I.values()))),
+                                    minlength=len(names))
+        q_values = self.class_totals(self.q, solution)
+        I_values = self.class_totals(self.I, solution)
+        return {name: {'waiting_cost': float(waiting_costs[k]), 'passengers': float(q_values[k].sum()),
+                       'max_waiting_time': (get_longest_queue_time(q_values[k].tolist(), I_values[k].tolist(), plot=False) or 0) * self.t_interval}
+                for k, name in enumerate(names)}
+
+    def flight_values(self, variables, j):
+        # Solution of q or I for flight j over the whole horizon, zero outside its check-in window
+        values = np.zeros(self.N)
+        for t in range(self.windows.start[j], self.windows.end[j] + 1):
+            values[t] = variables[j, t].X
+        return values
+
     def plot_queue(self):
         # Plot number of passengers accepted at desk for each flight
         plt.figure(figsize=(10, 6))
         for j in range(self.J):
-            q_values = [self.q[j, t].X for t in range(self.N)]
+            q_values = self.flight_values(self.q, j)
             plt.plot(range(self.N), q_values, label=f'Flight {j}')
-            earliest_checkin_index = int(round(self.flight_schedule[j][0] / (self.l * 60)) - self.early_limit)
-            latest_checkin_index = int(round(self.flight_schedule[j][0] / (self.l * 60)) - self.late_limit)
+            earliest_checkin_index, latest_checkin_index = self.windows.start[j], self.windows.end[j]
             plt.axvline(x=earliest_checkin_index, color='r', linestyle='--', label=f'Earliest Check-in Flight {j}')
             plt.axvline(x=latest_checkin_index, color='g', linestyle='--', label=f'Latest Check-in Flight {j}')
-            plt.axvline(x=round(self.flight_schedule[j][0] / (self.l * 60)), color='black', linestyle='--',
+            plt.axvline(x=self.windows.departure[j], color='black', linestyle='--',
                         label=f'Departure Time of Flight {j}')
         plt.xlabel('Time Interval [5 mins]')
         plt.ylabel('Number of Passengers Accepted at Desk')
@@ -205,13 +457,12 @@ class ACP:
         # Plot number of passengers in queue for each flight in one plot
         plt.figure(figsize=(10, 6))
         for j in range(self.J):
-            I_values = [self.I[j, t].X for t in range(self.N)]
+            I_values = self.flight_values(self.I, j)
             plt.plot(range(self.N), I_values, label=f'Flight {j}')
-            earliest_checkin_index = int(round(self.flight_schedule[j][0] / (self.l * 60)) - self.early_limit)
-            latest_checkin_index = int(round(self.flight_schedule[j][0] / (self.l * 60)) - self.late_limit)
+            earliest_checkin_index, latest_checkin_index = self.windows.start[j], self.windows.end[j]
         plt.axvline(x=earliest_checkin_index, color='r', linestyle='--', label=f'Earliest Check-in')
         plt.axvline(x=latest_checkin_index, color='g', linestyle='--', label=f'Latest Check-in')
-        plt.axvline(x=round(self.flight_schedule[j][0] / (self.l * 60)), color='black', linestyle='--', label=f'Departure Time')
+        plt.axvline(x=self.windows.departure[j], color='black', linestyle='--', label=f'Departure Time')
         plt.xlabel('Time Interval [5 mins]')
         plt.ylabel('Number of Passengers in Queue')
         plt.title('Number of Passengers in Queue over Time for Each Flight')
@@ -220,7 +471,7 @@ class ACP:
         plt.show()
 
         # Plot number of passengers in queue for all flights combined
-        I_values_combined = [sum(self.I[j, t].X for j in range(self.J)) for t in range(self.N)]
+        I_values_combined = self.interval_totals(self.I)
         plt.figure(figsize=(10, 6))
         plt.plot(range(self.N), I_values_combined)
         # plt.axvline(x=earliest_checkin_index, color='r', linestyle='--', label=f'Earliest Check-in')
@@ -235,7 +486,7 @@ class ACP:
         plt.show()
 
         # Plot number of passengers accepted at desk for all flights combined
-        q_values_combined = [sum(self.q[j, t].X for j in range(self.J)) for t in range(self.N)]
+        q_values_combined = self.interval_totals(self.q)
         plt.figure(figsize=(10, 6))
         plt.plot(range(self.N), q_values_combined)
         plt.xlabel('Time Interval [5 mins]')
@@ -259,26 +510,94 @@ class ACP:
         #plt.legend()
         plt.show()
 
-    def get_KPI(self):
-        q_values = [sum(self.q[j, t].X for j in range(self.J)) for t in range(self.N)]
-        I_values = [sum(self.I[j, t].X for j in range(self.J)) for t in range(self.N)]
+    def cost_breakdown(self, solution=None):
+        # Waiting, opening and operating costs of the current solution (or of solution(variables), see interval_totals)
+        solution = solution if solution is not None else (lambda variables: self.model.getAttr('X', variables))
+        flight_index, _ = self.windows.indices()
+        waiting_cost = float(self.h[flight_index] @ np.array(solution(list(self.I.values()))))
+        opening_cost = float(np.tile(self.s_open, self.parameter_settings['C']) @ np.array(solution(list(self.y_open.values()))))
+        operating_cost = float(self.s_operate @ np.array(solution(list(self.B.values()))))
+        return waiting_cost, opening_cost, operating_cost
+
+    def extract_results(self):
+        # Compact copy of the solution and KPIs as plain numbers and arrays, which stays valid after dispose()
+        results = {'model_name': self.model_name, 'passenger_scale': self.passenger_scale, 'status': self.model.Status,
+                   'runtime': self.model.Runtime, 'objective': self.objective}
+        if self.model.SolCount > 0:
+            q_values = self.interval_totals(self.q)
+            I_values = self.interval_totals(self.I)
+            waiting_cost, opening_cost, operating_cost = self.cost_breakdown()
+            results.update({
+                'objective': self.model.ObjVal, 'mip_gap': self.model.MIPGap,
+                'waiting_cost': waiting_cost, 'opening_cost': opening_cost, 'operating_cost': operating_cost,
+                'max_waiting_time': (get_longest_queue_time(q_values.tolist(), I_values.tolist(), plot=False) or 0) * self.t_interval,  # [min]
+                'total_passengers': float(q_values.sum()),
+                'B': np.rint(self.model.getAttr('X', list(self.B.values()))).astype(int),
+                'q_total': q_values,
+                'I_total': I_values,
+            })
+            if self.passenger_classes is not None:
+                for name, kpis in self.class_KPIs().items():
+                    results.update({f'{key}_{name}': value for key, value in kpis.items()})
+                if self.B_class:
+                    results['B_class'] = np.rint(self.model.getAttr('X', list(self.B_class.values()))).astype(int).reshape(-1, self.N)
+        return results
+
+    def dispose(self):
+        # Frees the Gurobi model and drops the references to its variables and rows, only the input data is kept
+        if self.model is not None:
+            self.model.dispose()
+        self.model = None
+        self.B = self.q = self.x = self.I = self.desk = self.y_open = self.B_class = None
+        self.rows = None
+        self.A = None
+
+    def get_KPI(self, plot=True):
+        q_values = self.interval_totals(self.q).tolist()
+        I_values = self.interval_totals(self.I).tolist()
 
         print('q (number of people who leave the queue per time step) :    ', q_values)
         print('I (number of people in the queue per time step):    ', I_values)
-        max_waiting_time = get_longest_queue_time(q_values, I_values)
+        max_waiting_time = get_longest_queue_time(q_values, I_values, plot=plot)
         print('longest_queue_time in [min]:', max_waiting_time * self.t_interval)
         print()
 
+        if self.passenger_classes is not None:
+            for name, kpis in self.class_KPIs().items():
+                print(f"Passenger class {name}: waiting cost {kpis['waiting_cost']}, {kpis['passengers']} passengers, "
+                      f"longest queue time {kpis['max_waiting_time']} [min]")
+            print()
+
         objective = self.objective
-        waiting_cost = sum(self.h[j] * self.I[j, t].X for j in range(self.J) for t in range(self.N))
-        opening_cost = sum(self.s_open[t] * sum(self.y_open[i,t].X for i in range(self.parameter_settings['C'])) for t in range(self.N))
-        operating_cost = sum(self.s_operate[t] * self.B[t].X for t in range(self.N))
+        waiting_cost, opening_cost, operating_cost = self.cost_breakdown()
 
 
         return objective, waiting_cost, opening_cost, operating_cost, max_waiting_time
 
 
 
+def solve_sweep(scenarios, profile=None, env=None, on_solved=None, **solver_params):
+    # Solves a sequence of ACPs, given as the keyword arguments of ACP (e.g. a generator, so inputs are only built when
+    # needed), and yields the extract_results() of each. Every model is disposed before the next one is built and all
+    # of them share one Gurobi environment, so memory stays flat over long sweeps. on_solved(acp) is called while the
+    # model is still available, e.g. for plots
+    own_env = env is None
+    env = gp.Env() if own_env else env
+    try:
+        for scenario in scenarios:
+            acp = ACP(**scenario, env=env)
+            acp.optimize(profile, **solver_params)
+            if on_solved is not None and acp.model.SolCount > 0:
+                on_solved(acp)
+            results = acp.extract_results()
+            acp.dispose()
+            del acp
+            yield results
+    finally:
+        if own_env:
+            env.dispose()
+
+
 '''
 model_name options: "static_ACP", "dynamic_ACP"
 '''
@@ -306,20 +625,25 @@ if __name__ == "__main__":
         amount_simulations = 1
         total_passengers_lst = []
         objective_lst, waiting_cost_lst, desk_cost_lst, max_waiting_time_lst = [], [], [], []
-        for passenger_scale in np.linspace(0.5, 1.5, amount_simulations):
-            print("Currently at passenger scale ", passenger_scale)
-            acp_optimization_dynamic_schiphol = ACP(model_name="dynamic_ACP", T=24, l=1 / 12, parameter_settings=parameter_settings, data_schiphol=data(), schiphol_case=True, passenger_scale=passenger_scale)
-            acp_optimization_dynamic_schiphol.optimize()
-            acp_optimization_dynamic_schiphol.plot_queue()
-            objective, waiting_cost, opening_cost, operating_cost, max_waiting_time = acp_optimization_dynamic_schiphol.get_KPI()
+        passenger_scales = np.linspace(0.5, 1.5, amount_simulations)
+        # Only the extracted results are kept, each model is disposed before the next scale is built
+        scenarios = (dict(model_name="dynamic_ACP", T=24, l=1 / 12, parameter_settings=parameter_settings, data_schiphol=data(), schiphol_case=True, passenger_scale=passenger_scale)
+                     for passenger_scale in passenger_scales)
+        for results in solve_sweep(scenarios, on_solved=lambda acp: acp.plot_queue()):
+            passenger_scale = results['passenger_scale']
+            print("Finished passenger scale ", passenger_scale)
+            # A scale without a solution (e.g. infeasible) has no KPIs, it is kept as NaN so the lists stay aligned
+            kpi = lambda key: float('nan') if results.get(key) is None else results[key]
+            objective, waiting_cost, opening_cost, operating_cost = kpi('objective'), kpi('waiting_cost'), kpi('opening_cost'), kpi('operating_cost')
+            max_waiting_time = kpi('max_waiting_time')  # [min]
             total_desk_cost = opening_cost + operating_cost
-            total_passengers = sum(acp_optimization_dynamic_schiphol.q[j, t].X for j in range(acp_optimization_dynamic_schiphol.J) for t in range(acp_optimization_dynamic_schiphol.N))
+            total_passengers = kpi('total_passengers')
 
             total_passengers_lst.append(total_passengers)
             objective_lst.append(objective)
             waiting_cost_lst.append(waiting_cost)
             desk_cost_lst.append(total_desk_cost)
-            max_waiting_time_lst.append(max_waiting_time*5)
+            max_waiting_time_lst.append(max_waiting_time)
 
 
             # Print KPI results...
@@ -329,7 +653,7 @@ if __name__ == "__main__":
             print("Opening costs = ", opening_cost)
             print("Operating costs = ", operating_cost)
             print("Total desk costs = ", total_desk_cost)
-            print("Maximum waiting time = ", max_waiting_time*5)
+            print("Maximum waiting time = ", max_waiting_time)
 
 
         #Present overview of test results Schiphol case -> not sure yet how
@@ -0,0 +1,243 @@
+'''
+Headless batch runner for ACP scenarios. A scenario file (YAML or JSON) describes the schedule source,
+the parameters and the grid of runs: passenger scales, seeds and a sensitivity grid of factors per
+parameter. Every combination is solved, in parallel over the given number of workers, with progress on
+the console and one JSON line per finished run in the output directory, so nightly sweeps can be
+scheduled without editing Model.py or sensitivity.py. Example scenario:
+
+    name: klm_nightly
+    model: dynamic_ACP
+    T: 24
+    l: 0.083333
+    schedule:
+      source: schiphol        # schiphol, synthetic or json (file with {flight: [ETD minutes, passengers]})
+      airline: KLM
+      data_loc: data 30_04_2024.xlsx
+    parameter_settings: {minimum_desk_time: 4, p: 1, C: 400, s_open: 100, s_operate: 10, h0: 10, l: 1}
+    passenger_scales: [0.8, 1.0, 1.2]
+    sensitivity: {s_open: [0.5, 1.5], C: [0.9]}
+    seeds: [0]
+    expected_demand: false    # true plans on the expected arrivals, the same for every seed
+    passenger_classes:        # optional, see data.PassengerClasses
+      priority: {share: 0.1, p: 1.5, h0: 30}
+      economy: {share: 0.9}
+    profile: fast
+    time_limit: 600
+    workers: 2
+    output: batch_results
+
+Usage: python batch.py scenario.yaml [--workers 4] [--output dir] [--resume]
+'''
+import matplotlib
+matplotlib.use('Agg')  # Batches run headless, plots are never shown
+
+import argparse
+import contextlib
+import datetime
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from Model import *
+from solver_profiles import worker_threads
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+scenario_defaults = {
+    'name': 'batch', 'model': 'dynamic_ACP', 'T': 24, 'l': 1/12, 'formulation': 'indicator',
+    'schedule': {'source': 'schiphol', 'airline': 'KLM', 'data_loc': 'data 30_04_2024.xlsx'},
+    'parameter_settings': {'minimum_desk_time': 4, 'p': 1, 'C': 400, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1},
+    'passenger_scales': [1.0], 'sensitivity': {}, 'seeds': [0],
+    'profile': None, 'time_limit': None, 'workers': 1, 'output': 'batch_results', 'expected_demand': False,
+    'passenger_classes': None,
+}
+
+
+def load_scenario(path):
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ImportError("Reading YAML scenarios needs PyYAML (pip install pyyaml), or use a JSON scenario file")
+            scenario = yaml.safe_load(f) or {}
+        else:
+            scenario = json.load(f)
+    unknown = set(scenario) - set(scenario_defaults)
+    if unknown:
+        raise ValueError(f"Unknown scenario keys {sorted(unknown)}, options are {sorted(scenario_defaults)}")
+    scenario = {**scenario_defaults, **scenario}
+    scenario['schedule'] = {**scenario_defaults['schedule'], **scenario['schedule']}
+    scenario['parameter_settings'] = {**scenario_defaults['parameter_settings'], **scenario['parameter_settings']}
+    return scenario
+
+
+def apply_sensitivity_factor(parameter_settings, parameter, factor):
+    # Same rules as Sensitivity.apply_sensitivity_factor: C stays a whole number of desks, the minimum open time is not scaled
+    parameter_settings = dict(parameter_settings)
+    if parameter == 'C':
+        parameter_settings['C'] = int(parameter_settings['C'] * factor)
+    elif parameter != 'minimum_desk_time':
+        parameter_settings[parameter] = parameter_settings[parameter] * factor
+    return parameter_settings
+
+
+def expand_runs(scenario):
+    # The base parameters and every (parameter, factor) of the sensitivity grid, for every passenger scale and seed
+    variants = [(None, 1.0)] + [(parameter, factor) for parameter, factors in scenario['sensitivity'].items() for factor in factors]
+    runs = []
+    for (parameter, factor), passenger_scale, seed in itertools.product(variants, scenario['passenger_scales'], scenario['seeds']):
+        if parameter is not None and parameter not in scenario['parameter_settings']:
+            raise ValueError(f"Sensitivity parameter '{parameter}' is not in parameter_settings")
+        run_id = f"{scenario['name']}_scale{passenger_scale:g}_seed{seed}" + (f"_{parameter}x{factor:g}" if parameter else '')
+        runs.append({'run_id': run_id, 'parameter': parameter, 'factor': factor, 'passenger_scale': passenger_scale, 'seed': seed,
+                     'parameter_settings': apply_sensitivity_factor(scenario['parameter_settings'], parameter, factor) if parameter else scenario['parameter_settings']})
+    return runs
+
+
+worker_env = None  # Gurobi environment shared by all runs of a worker process
+
+
+def get_worker_env():
+    global worker_env
+    if worker_env is None:
+        worker_env = gp.Env()
+    return worker_env
+
+
+def build_acp(scenario, run):
+    schedule = scenario['schedule']
+    np.random.seed(run['seed'])  # The sampled passenger flow depends on the seed
+    if schedule['source'] == 'schiphol':
+        data_schiphol = data(airline=schedule['airline'], data_loc=schedule['data_loc'], t_interval=int(round(scenario['l'] * 60)),
+                             passenger_classes=scenario['passenger_classes'])
+        return ACP(scenario['model'], scenario['T'], scenario['l'], run['parameter_settings'], data_schiphol=data_schiphol, schiphol_case=True,
+                   passenger_scale=run['passenger_scale'], formulation=scenario['formulation'], env=get_worker_env(),
+                   expected_demand=scenario['expected_demand'])
+    if schedule['source'] == 'synthetic':
+        # Departures spread over the horizon, leaving room for the 4 hour check-in window
+        rng = random.Random(run['seed'])
+        flight_schedule = {j: (5 * rng.randint(4 * 12, int(scenario['T'] * 12) - 1), rng.randint(schedule['min_pax'], schedule['max_pax']))
+                           for j in range(schedule['flights'])}
+    elif schedule['source'] == 'json':
+        with open(schedule['path']) as f:
+            flight_schedule = {int(j): tuple(flight) for j, flight in json.load(f).items()}
+    else:
+        raise ValueError(f"Unknown schedule source '{schedule['source']}', options are 'schiphol', 'synthetic' and 'json'")
+    return ACP(scenario['model'], scenario['T'], scenario['l'], run['parameter_settings'], flight_schedule=flight_schedule,
+               passenger_scale=run['passenger_scale'], formulation=scenario['formulation'], env=get_worker_env(),
+               expected_demand=scenario['expected_demand'], passenger_classes=scenario['passenger_classes'])
+
+
+def solve_run(scenario, run, log_dir, threads=None):
+    # Solves one run, all model and solver output goes to the log file of the run
+    start = time.perf_counter()
+    log_path = os.path.join(log_dir, run['run_id'] + '.log')
+    result = {key: run[key] for key in ('run_id', 'parameter', 'factor', 'passenger_scale', 'seed')}
+    with open(log_path, 'w') as log, contextlib.redirect_stdout(log):
+        acp = build_acp(scenario, run)
+        solver_params = {'LogToConsole': 0, 'LogFile': log_path + '.gurobi'}
+        if threads is not None:
+            solver_params['Threads'] = threads  # Over the thread cap of the profile
+        if scenario['time_limit'] is not None:
+            solver_params['TimeLimit'] = scenario['time_limit']
+        acp.optimize(scenario['profile'], **solver_params)
+        results = acp.extract_results()
+        result.update({'num_vars': acp.model.NumVars, 'max_desks': int(results['B'].max()) if 'B' in results else None})
+        result.update({key: value for key, value in results.items() if not isinstance(value, np.ndarray)})
+        acp.dispose()
+    result['wall_time'] = time.perf_counter() - start
+    return result
+
+
+def safe_solve_run(scenario, run, log_dir, threads=None):
+    # A failing run is recorded and does not stop the batch
+    start = time.perf_counter()
+    try:
+        return solve_run(scenario, run, log_dir, threads)
+    except Exception as error:
+        return {**{key: run[key] for key in ('run_id', 'parameter', 'factor', 'passenger_scale', 'seed')},
+                'error': f"{type(error).__name__}: {error}", 'wall_time': time.perf_counter() - start}
+
+
+def completed_runs(results_path):
+    # Run ids with a solution in the results file, skipped with --resume (failed runs and runs without a solution are retried)
+    if not os.path.exists(results_path):
+        return set()
+    with open(results_path) as f:
+        results = [json.loads(line) for line in f if line.strip()]
+    return {result['run_id'] for result in results if 'error' not in result and result.get('objective') is not None}
+
+
+def run_batch(scenario, workers=None, output=None, resume=False):
+    workers = workers or scenario['workers']
+    output = output or scenario['output']
+    log_dir = os.path.join(output, 'logs')
+    os.makedirs(log_dir, exist_ok=True)
+    results_path = os.path.join(output, f"{scenario['name']}_results.jsonl")
+    with open(os.path.join(output, f"{scenario['name']}_scenario.json"), 'w') as f:
+        json.dump(scenario, f, indent=4)
+
+    runs = expand_runs(scenario)
+    if resume:
+        done = completed_runs(results_path)
+        runs = [run for run in runs if run['run_id'] not in done]
+        print(f"Resuming, {len(done)} runs already done")
+    print(f"Scenario {scenario['name']}: {len(runs)} runs on {workers} workers, results in {results_path}")
+    run_at = datetime.datetime.now().isoformat(timespec='seconds')
+    threads = worker_threads(workers) if workers > 1 else None  # Workers share the cores, one worker keeps the cap of the profile
+
+    start = time.perf_counter()
+    n_failed = 0
+
+    def finished(k, result):
+        nonlocal n_failed
+        result['run_at'] = run_at
+        with open(results_path, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+        elapsed = time.perf_counter() - start
+        remaining = elapsed / k * (len(runs) - k)
+        objective = f"objective {result['objective']:.1f}" if result.get('objective') is not None else f"no solution ({result.get('error', result.get('status'))})"
+        n_failed += result.get('objective') is None
+        print(f"[{k}/{len(runs)}] {result['run_id']}: {objective}, {result['wall_time']:.1f}s "
+              f"(elapsed {elapsed:.0f}s, about {remaining:.0f}s left)", flush=True)
+
+    if workers == 1:
+        for k, run in enumerate(runs, start=1):
+            finished(k, safe_solve_run(scenario, run, log_dir, threads))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(safe_solve_run, scenario, run, log_dir, threads) for run in runs]
+            for k, future in enumerate(as_completed(futures), start=1):
+                finished(k, future.result())
+
+    # Summary table of all runs of the scenario, including the ones of earlier (resumed) batches
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            summary = pd.DataFrame([json.loads(line) for line in f if line.strip()])
+        summary = summary.drop_duplicates('run_id', keep='last').sort_values('run_id')
+        summary.to_csv(os.path.join(output, f"{scenario['name']}_summary.csv"), index=False)
+    print(f"Batch finished in {time.perf_counter() - start:.0f}s, {n_failed} of {len(runs)} runs without a solution")
+    return n_failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a batch of ACP scenarios from a YAML or JSON scenario file')
+    parser.add_argument('scenario', help='Scenario file (.yaml, .yml or .json)')
+    parser.add_argument('--workers', type=int, default=None, help='Parallel solves, overrides the scenario file')
+    parser.add_argument('--output', default=None, help='Output directory, overrides the scenario file')
+    parser.add_argument('--resume', action='store_true', help='Skip runs already solved in the results file')
+    args = parser.parse_args()
+
+    scenario = load_scenario(args.scenario)
+    n_failed = run_batch(scenario, args.workers, args.output, args.resume)
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,191 @@
+'''
+Benchmark suite for the ACP stages: demand generation (data.flights_to_d), model construction phases,
+optimize, get_KPI and get_longest_queue_time. Every run appends one JSON line per case to the results
+file, and is compared against the previous run of the same case so changes in model size or solve time
+show up as regressions. Runs offline on synthetic schedules, or on the Schiphol KLM day (case 'schiphol').
+With several --formulations the root gap, node count and solve time of the desk formulations are compared.
+'''
+import matplotlib
+matplotlib.use('Agg')  # Benchmarks run headless, plots are never shown
+
+import argparse
+import datetime
+import json
+import os
+import random
+import subprocess
+import time
+import numpy as np
+from Model import *
+from KPI_calculations import get_longest_queue_time
+from demand_analytics import DemandAnalytics
+
+# Synthetic cases: number of flights, passengers per flight, desk capacity C and interval length l [hrs]
+benchmark_cases = {
+    'tiny': {'flights': 2, 'min_pax': 20, 'max_pax': 60, 'C': 3, 'l': 1/4, 'T': 12},
+    'small': {'flights': 5, 'min_pax': 50, 'max_pax': 150, 'C': 20, 'l': 1/4, 'T': 24},
+    'medium': {'flights': 40, 'min_pax': 80, 'max_pax': 300, 'C': 60, 'l': 1/12, 'T': 24},
+    'large': {'flights': 150, 'min_pax': 80, 'max_pax': 400, 'C': 150, 'l': 1/12, 'T': 24},
+    'schiphol': {'schiphol': True, 'C': 400, 'l': 1/12, 'T': 24},  # KLM day of the workbook in data()
+}
+
+benchmark_parameter_settings = {'minimum_desk_time': 4, 'p': 1, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+
+
+def synthetic_schedule(flights, min_pax, max_pax, T=24, seed=0):
+    # Departures spread over the horizon, leaving room for the 4 hour check-in window
+    rng = random.Random(seed)
+    return {j: (5 * rng.randint(4 * 12, int(T * 12) - 1), rng.randint(min_pax, max_pax)) for j in range(flights)}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def root_bound_callback(model, where):
+    # Keeps the best bound at the end of the root node
+    if where == GRB.Callback.MIPNODE and model.cbGet(GRB.Callback.MIPNODE_NODCNT) == 0:
+        model._root_bound = model.cbGet(GRB.Callback.MIPNODE_OBJBND)
+
+
+def run_case(name, case, model_name="dynamic_ACP", seed=0, profile=None, time_limit=None, formulation='indicator'):
+    np.random.seed(seed)
+    if case.get('schiphol'):
+        schedule = {i: (row['ETD_minutes'], row['MAX_PAX']) for i, row in data().flights.iterrows()}
+    else:
+        schedule = synthetic_schedule(case['flights'], case['min_pax'], case['max_pax'], case['T'], seed)
+    t_interval = int(round(case['l'] * 60))
+    parameter_settings = dict(benchmark_parameter_settings, C=case['C'])
+
+    timings = {}
+    start = time.perf_counter()
+    passenger_flow = data.flights_to_d(schedule, t_interval, int(case['T'] * 60))
+    timings['flights_to_d'] = time.perf_counter() - start
+
+    acp = ACP(model_name, case['T'], case['l'], parameter_settings, flight_schedule=schedule, passenger_flow=passenger_flow,
+              formulation=formulation)
+    start = time.perf_counter()
+    acp.model.update()
+    timings['model_update'] = time.perf_counter() - start
+    timings.update({f'build_{phase}': value for phase, value in acp.build_times.items()})
+
+    solver_params = {'OutputFlag': False}
+    if time_limit is not None:
+        solver_params['TimeLimit'] = time_limit
+    start = time.perf_counter()
+    acp.model._root_bound = None
+    acp.optimize(profile, callback=root_bound_callback, **solver_params)
+    timings['optimize'] = time.perf_counter() - start
+
+    result = {'case': name, 'model_name': model_name, 'formulation': formulation, 'seed': seed, **case,
+              'num_vars': acp.model.NumVars, 'num_constrs': acp.model.NumConstrs,
+              'num_genconstrs': acp.model.NumGenConstrs, 'num_nzs': acp.model.NumNZs,
+              'status': acp.model.Status, 'objective': acp.objective, 'node_count': acp.model.NodeCount}
+    if acp.model.SolCount > 0:
+        # Solved in presolve or at the root without a node callback: the final bound is the root bound
+        root_bound = acp.model._root_bound if acp.model._root_bound is not None else acp.model.ObjBound
+        result['root_bound'] = root_bound
+        result['root_gap'] = abs(acp.objective - root_bound) / max(abs(acp.objective), 1e-9)
+        result['mip_gap'] = acp.model.MIPGap
+        # Gap to the solver-free bound of the demand analytics
+        result['analytic_bound'] = DemandAnalytics.from_acp(acp).lower_bound(model_name)
+        result['analytic_gap'] = (acp.objective - result['analytic_bound']) / max(abs(acp.objective), 1e-9)
+
+    if acp.model.SolCount > 0:
+        start = time.perf_counter()
+        acp.get_KPI(plot=False)
+        timings['get_KPI'] = time.perf_counter() - start
+
+        q_values = acp.interval_totals(acp.q).tolist()
+        I_values = acp.interval_totals(acp.I).tolist()
+        start = time.perf_counter()
+        get_longest_queue_time(q_values, I_values, plot=False)
+        timings['get_longest_queue_time'] = time.perf_counter() - start
+
+    result['timings'] = timings
+    acp.model.dispose()
+    return result
+
+
+def load_previous(output):
+    # Most recent result per (case, model_name) from earlier runs
+    previous = {}
+    if os.path.exists(output):
+        with open(output) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    previous[entry['case'], entry['model_name'], entry.get('formulation', 'indicator')] = entry
+    return previous
+
+
+def compare(result, previous, time_tolerance):
+    # Model size has to match exactly, timings may grow by at most the given factor
+    regressions = []
+    if previous is None:
+        return regressions
+    for key in ('num_vars', 'num_constrs', 'num_genconstrs', 'num_nzs'):
+        if result[key] != previous.get(key):
+            regressions.append(f"{key} changed from {previous.get(key)} to {result[key]}")
+    for stage, value in result['timings'].items():
+        before = previous['timings'].get(stage)
+        if before is not None and value > time_tolerance * before and value - before > 0.05:
+            regressions.append(f"{stage} took {value:.3f}s, was {before:.3f}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ACP build, solve and KPI stages')
+    parser.add_argument('--cases', nargs='+', default=['small', 'medium'], choices=list(benchmark_cases))
+    parser.add_argument('--model', default='dynamic_ACP', choices=['dynamic_ACP', 'static_ACP'])
+    parser.add_argument('--formulations', nargs='+', default=['indicator'], choices=['indicator', 'tight'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--profile', default=None, help='Solver profile, see solver_profiles.py')
+    parser.add_argument('--time-limit', type=float, default=None, help='Gurobi time limit per case [s]')
+    parser.add_argument('--output', default='benchmark_results.jsonl')
+    parser.add_argument('--time-tolerance', type=float, default=1.5, help='Allowed slowdown factor per stage')
+    args = parser.parse_args()
+
+    previous = load_previous(args.output)
+    run_at = datetime.datetime.now().isoformat(timespec='seconds')
+    revision = git_revision()
+    n_regressions = 0
+
+    for name in args.cases:
+        results = []
+        for formulation in args.formulations:
+            print(f"Running benchmark case {name} ({formulation})")
+            result = run_case(name, benchmark_cases[name], args.model, args.seed, args.profile, args.time_limit, formulation)
+            result['run_at'] = run_at
+            result['revision'] = revision
+            regressions = compare(result, previous.get((name, args.model, formulation)), args.time_tolerance)
+            result['regressions'] = regressions
+            n_regressions += len(regressions)
+            results.append(result)
+
+            with open(args.output, 'a') as f:
+                f.write(json.dumps(result) + '\n')
+
+            print(f"  size: {result['num_vars']} vars, {result['num_constrs']} constraints, {result['num_genconstrs']} general constraints")
+            for stage, value in result['timings'].items():
+                print(f"  {stage}: {value:.3f}s")
+            for regression in regressions:
+                print(f"  REGRESSION: {regression}")
+
+        if len(results) > 1:
+            print(f"Formulations on case {name}:")
+            print(f"  {'formulation':<12}{'objective':>14}{'root gap':>10}{'nodes':>10}{'MIP gap':>10}{'solve [s]':>11}")
+            for result in results:
+                objective = float('nan') if result['objective'] is None else result['objective']  # An objective of 0 is kept
+                print(f"  {result['formulation']:<12}{objective:>14.1f}{result.get('root_gap', float('nan')):>10.4f}"
+                      f"{result['node_count']:>10.0f}{result.get('mip_gap', float('nan')):>10.4f}{result['timings']['optimize']:>11.2f}")
+
+    return 1 if n_regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,8 +2,131 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from scipy.interpolate import make_interp_spline
+from scipy.special import ndtr
+import functools
 import itertools
 import random
+import datetime
+
+# Workbook columns with per flight and per interval values of the ACP parameter_settings
+flight_setting_columns = {'SERVICE_TIME': 'p', 'QUEUE_COST': 'h0'}
+interval_setting_columns = {'C': 'C', 'S_OPEN': 's_open', 'S_OPERATE': 's_operate', 'L': 'l'}
+
+# Settings a passenger class can give, see PassengerClasses
+class_setting_names = ('share', 'p', 'h0', 'mean_early_t', 'arrival_std', 'dedicated')
+
+class CheckinWindows:
+	# Check-in window [start, end] (inclusive interval indices) of every flight, built once in vectorized form and
+	# shared by the demand generation, the ACP variables and constraints, the KPIs and the plots
+	def __init__(self, etd_minutes, t_interval = 5, N = 24*60 // 5, earliest_checkin = 4*60, last_checkin = 45):
+		etd_minutes = np.asarray(etd_minutes, dtype=int)
+		self.J = len(etd_minutes)
+		self.N = N
+		self.t_interval = t_interval
+		self.departure = etd_minutes / t_interval  # Departure time in intervals, for plotting
+		self.first = (etd_minutes - earliest_checkin) // t_interval  # Window on the unclipped time axis
+		self.last = (etd_minutes - last_checkin) // t_interval
+		self.start = np.clip(self.first, 0, N)  # Window clipped to the horizon
+		self.end = np.minimum(self.last, N - 1)
+		self.length = np.maximum(0, self.end - self.start + 1)
+		self._indices = None
+
+	@classmethod
+	def from_schedule(cls, flight_schedule, t_interval = 5, N = 24*60 // 5, earliest_checkin = 4*60, last_checkin = 45):
+		return cls([etd for etd, _ in flight_schedule.values()], t_interval, N, earliest_checkin, last_checkin)
+
+	def indices(self):
+		# Flight and interval index of every (j, t) inside a window, ordered by flight and then time
+		if self._indices is None:
+			flight_index = np.repeat(np.arange(self.J), self.length)
+			offsets = np.cumsum(self.length) - self.length
+			time_index = self.start[flight_index] + np.arange(len(flight_index)) - offsets[flight_index]
+			self._indices = (flight_index, time_index)
+		return self._indices
+
+	def keys(self):
+		flight_index, time_index = self.indices()
+		return list(zip(flight_index.tolist(), time_index.tolist()))
+
+	def mask(self):
+		# Dense J x N indicator of the check-in windows
+		t = np.arange(self.N)
+		return (t >= self.start[:, None]) & (t <= self.end[:, None])
+
+	def flights_at(self):
+		# For every interval the flights whose window contains it
+		flight_index, time_index = self.indices()
+		order = np.argsort(time_index, kind='stable')
+		counts = np.bincount(time_index, minlength=self.N)
+		return [flights.tolist() for flights in np.split(flight_index[order], np.cumsum(counts)[:-1])]
+
+	def closes_in_horizon(self, j):
+		# Whether the last check-in of flight j falls inside the horizon (and not in a later one)
+		return self.last[j] <= self.N - 1
+
+
+class PassengerClasses:
+	# Passenger classes of the flights (e.g. priority, bag-drop and economy), each with its share of the passengers of
+	# a flight, its own arrival profile (mean_early_t, arrival_std), service time p and queue cost h0, and optionally
+	# desks that only serve this class (dedicated). The ACP models every flight and class as one queue
+	# j = flight * K + class, so the model builder and the KPIs keep working on flat arrays over the queues:
+	#     PassengerClasses({'priority': {'share': 0.1, 'p': 1.5, 'h0': 30, 'mean_early_t': 90},
+	#                       'bag_drop': {'share': 0.3, 'p': 0.5, 'dedicated': True},
+	#                       'economy': {'share': 0.6}})
+	# Settings a class does not give are those of its flight. A share is one value or one value per flight, one class
+	# can leave it out and takes the rest of the passengers
+	def __init__(self, classes):
+		for name, settings in classes.items():
+			unknown = set(settings) - set(class_setting_names)
+			if unknown:
+				raise ValueError(f"Unknown settings {sorted(unknown)} of passenger class '{name}', options are {class_setting_names}")
+		self.names = list(classes)
+		self.K = len(self.names)
+		self.settings = {name: dict(settings) for name, settings in classes.items()}
+		self.dedicated = np.array([bool(self.settings[name].get('dedicated', False)) for name in self.names])
+
+	def shares(self, J):
+		# K x J share of the passengers of every flight per class, a class without a share takes the rest
+		missing = [k for k, name in enumerate(self.names) if 'share' not in self.settings[name]]
+		if len(missing) > 1:
+			raise ValueError(f"Only one passenger class can leave out its share, not {[self.names[k] for k in missing]}")
+		shares = np.array([np.broadcast_to(np.asarray(self.settings[name].get('share', 0), dtype=float), (J,)) for name in self.names])
+		if missing:
+			shares[missing[0]] = 1 - shares.sum(axis=0)
+		if not np.allclose(shares.sum(axis=0), 1):
+			raise ValueError("The shares of the passenger classes do not add up to 1 for every flight")
+		return shares
+
+	def flight_of(self, J):
+		return np.repeat(np.arange(J), self.K)
+
+	def class_of(self, J):
+		return np.tile(np.arange(self.K), J)
+
+	def expand(self, flight_schedule):
+		# Schedule of the queues: the departure of the flight and its passengers split over the classes, rounded so every
+		# flight keeps its number of passengers
+		etd_minutes = [etd for etd, _ in flight_schedule.values()]
+		total_passengers = np.array([pax for _, pax in flight_schedule.values()], dtype=float)
+		split = data.largest_remainder(self.shares(len(etd_minutes)).T * total_passengers[:, None], total_passengers)
+		return {j * self.K + k: (etd_minutes[j], int(split[j, k])) for j in range(len(etd_minutes)) for k in range(self.K)}
+
+	def queue_values(self, name, J, flight_values):
+		# Setting per queue: of the class where it gives one, else of the flight (flight_values, one value or one per flight)
+		values = np.repeat(np.broadcast_to(np.asarray(flight_values, dtype=float), (J,))[:, None], self.K, axis=1)
+		for k, class_name in enumerate(self.names):
+			if name in self.settings[class_name]:
+				values[:, k] = self.settings[class_name][name]
+		return values.ravel()
+
+	def expand_time_varying(self, time_varying, J):
+		# Per flight settings of ACP (p, h0) become settings per queue, NaN where the scalar of parameter_settings applies
+		expanded = {name: values for name, values in time_varying.items() if name not in flight_setting_columns.values()}
+		for name in flight_setting_columns.values():
+			if name in time_varying or any(name in settings for settings in self.settings.values()):
+				expanded[name] = self.queue_values(name, J, time_varying.get(name, np.nan))
+		return expanded
+
 
 class data:
 	def __init__(self,
@@ -19,25 +142,39 @@ class data:
 
 	             last_checkin = 45,
 	             earliest_checkin = 4*60,
+	             expected_demand = False,
+	             passenger_classes = None,
 
 	             t_interval=5,
-	             tot_m=24 * 60,
+	             tot_m=None,
+	             lead_in_m=0,
 	             airline='KLM',
 	             data_loc = 'data 30_04_2024.xlsx'): # 'data 03_06_2024.xlsx'
+		# data_loc can be a list of workbooks, one per consecutive day, to build a multi-day horizon.
+		# lead_in_m shifts the start of the horizon back (e.g. 4*60) so flights shortly after the first
+		# midnight keep their full check-in window
+		if isinstance(data_loc, str):
+			data_loc = [data_loc]
 		self.airline = airline
 		self.t_interval = t_interval
-		self.tot_m = tot_m
+		self.days = len(data_loc)
+		self.lead_in_m = lead_in_m
+		self.horizon_start = None  # midnight of the first day, only used for absolute timestamps
+		self.tot_m = tot_m if tot_m is not None else self.days * 24 * 60 + lead_in_m
 		self.mean_early_t = mean_early_t
 		self.last_checkin = last_checkin
 		self.earliest_checkin = earliest_checkin
+		self.arrival_std = arrival_std
 		self.arrival_std_dev = last_checkin / arrival_std
+		self.expected_demand = expected_demand  # Expected arrivals instead of a sample, see flights_to_d
 		self.data_loc = data_loc
 
 		self.df = None
 		self.flights = None
+		self.desk_settings = []  # Per day the optional DESK_SETTINGS sheet: desk count and costs from a time of day on
 
 		self.d = None
-		self.T = None
+		self.windows = None
 		self.too_early = None
 
 		self.random_flag = random_flag
@@ -47,8 +184,9 @@ class data:
 		self.full_random_min_pax = full_random_min_pax
 
 		self.prep_data()
+		self.set_passenger_classes(passenger_classes)
+		self.set_windows()
 		self.set_d()
-		self.set_T()
 
 	def prep_data(self):
 		self.organize_rows()
@@ -57,11 +195,23 @@ class data:
 		if self.random_flag:
 			self.vary_time_randomly()
 		self.select_airline(self.airline)
+		if self.full_random_flag:
+			self.randomize_flights()
 		# self.get_pax_dist()
 
 	def organize_rows(self):
-		df = pd.read_excel(self.data_loc)
-		df = df[['AIRCRAFT', 'AIRLINE', 'ETD', 'CARGO']]
+		frames = []
+		for day, loc in enumerate(self.data_loc):
+			workbook = pd.ExcelFile(loc)
+			df_day = pd.read_excel(workbook, sheet_name=0)
+			df_day['DAY'] = day
+			frames.append(df_day)
+			self.desk_settings.append(pd.read_excel(workbook, sheet_name='DESK_SETTINGS') if 'DESK_SETTINGS' in workbook.sheet_names else None)
+		df = pd.concat(frames, ignore_index=True)
+		# Optional per flight settings: service time per passenger and queue cost (e.g. by aircraft type or priority),
+		# and passengers per class in <CLASS>_PAX columns (see set_passenger_classes)
+		class_columns = [column for column in df.columns if str(column).endswith('_PAX') and column != 'MAX_PAX']
+		df = df[['AIRCRAFT', 'AIRLINE', 'ETD', 'CARGO', 'DAY'] + [column for column in flight_setting_columns if column in df.columns] + class_columns]
 		df = df.dropna(subset=['ETD'])
 		df = df[df['CARGO'].isna()]
 		df['AIRCRAFT'] = df['AIRCRAFT'].str.replace(' WINGLET', '', regex=False)
@@ -112,7 +262,22 @@ class data:
 			print(f'{len(unique_aircraft_list)} != {len(max_pax_dict)}')
 
 	def set_time_to_minutes(self):
-		self.df['ETD_minutes'] = self.df['ETD'].apply(lambda x: x.hour * 60 + x.minute)
+		# Minutes since the start of the horizon. Workbooks with times only are placed on their DAY,
+		# full timestamps are taken relative to midnight of the earliest date in the schedule
+		timestamps = [x for x in self.df['ETD'] if isinstance(x, datetime.datetime)]
+		if timestamps:
+			first = min(timestamps)
+			self.horizon_start = datetime.datetime(first.year, first.month, first.day)
+
+		def to_minutes(row):
+			etd = row['ETD']
+			if isinstance(etd, datetime.datetime):
+				minutes = int((etd - self.horizon_start).total_seconds() // 60)
+			else:
+				minutes = row['DAY'] * 24 * 60 + etd.hour * 60 + etd.minute
+			return minutes + self.lead_in_m
+
+		self.df['ETD_minutes'] = self.df.apply(to_minutes, axis=1)
 
 	def vary_time_randomly(self):
 		# Vary the time of each flight randomly
@@ -135,67 +300,81 @@ class data:
 		flights = flights.reset_index(drop=True)
 		self.flights = flights
 
-	def set_d(self):
-		d = {}
-		too_early = []
-		count = 0
+	def randomize_flights(self):
+		# Fully random schedule: random departure time and passenger count for every flight
+		etd_minutes = [self.t_interval * round(random.randint(0, self.tot_m) / self.t_interval) for _ in range(len(self.flights))]
+		total_passengers = [random.randint(self.full_random_min_pax, self.full_random_max_pax) for _ in range(len(self.flights))]  #need to add this as parameters? Maybe not
+		self.flights['ETD_minutes'] = etd_minutes
+		self.flights['MAX_PAX'] = total_passengers
+
+	def set_passenger_classes(self, passenger_classes):
+		# The share of a class per flight comes from a <CLASS>_PAX column of the workbook where there is one (e.g. PRIORITY_PAX)
+		self.passenger_classes = None
+		if passenger_classes is None:
+			return
+		classes = passenger_classes.settings if isinstance(passenger_classes, PassengerClasses) else passenger_classes
+		classes = {name: dict(settings) for name, settings in classes.items()}
+		for name in classes:
+			column = name.upper() + '_PAX'
+			if column in self.flights.columns:
+				classes[name]['share'] = (self.flights[column] / self.flights['MAX_PAX']).to_numpy(dtype=float)
+		self.passenger_classes = PassengerClasses(classes)
+
+	def flight_schedule(self):
+		# Departure and passengers per flight, or per queue (flight and class) with passenger classes
+		flight_schedule = {i: (etd, pax) for i, (etd, pax) in enumerate(zip(self.flights['ETD_minutes'], self.flights['MAX_PAX']))}
+		return flight_schedule if self.passenger_classes is None else self.passenger_classes.expand(flight_schedule)
+
+	def set_windows(self):
+		etd_minutes = self.flights['ETD_minutes'].to_numpy()
+		if self.passenger_classes is not None:
+			etd_minutes = np.repeat(etd_minutes, self.passenger_classes.K)
+		self.windows = CheckinWindows(etd_minutes, self.t_interval, self.tot_m // self.t_interval, self.earliest_checkin, self.last_checkin)
 
-		for index, flight in self.flights.iterrows():
-			valid_pax_dist = []
-			etd_minutes = flight['ETD_minutes']
-			total_passengers = flight['MAX_PAX']
-			if self.full_random_flag:
-				etd_minutes = self.t_interval * round(random.randint(0, self.tot_m) / self.t_interval)
-				total_passengers = random.randint(self.full_random_min_pax, self.full_random_max_pax) #need to add this as parameters? Maybe not
-			mean_checkin_time = etd_minutes - self.mean_early_t
-
-			norm_dist = np.random.normal(loc=mean_checkin_time, scale=self.arrival_std_dev, size=total_passengers)
-			valid_norm_dist = norm_dist[(norm_dist >= 0) & (norm_dist <= self.tot_m)]
-			norm_binned = np.floor(valid_norm_dist / self.t_interval).astype(int)
-			pax_dist, _ = np.histogram(norm_binned, bins=np.arange(0, self.tot_m // self.t_interval + 1))
-
-			# earliest_checkin_index = (etd_minutes - self.earliest_checkin)//self.t_interval
-			# latest_checkin_index = (etd_minutes - self.last_checkin)//self.t_interval
-
-			earliest_checkin_index = max(0, (etd_minutes - self.earliest_checkin) // self.t_interval)
-			latest_checkin_index = min((etd_minutes - self.last_checkin) // self.t_interval, len(pax_dist) - 1)
-
-			# print('checkin avialble from index:', earliest_checkin_index, 'to index:', latest_checkin_index)
-			if earliest_checkin_index >= 0 and latest_checkin_index >= 0:
-				too_early.append(sum(pax_dist[:earliest_checkin_index]))
-				pax_dist[:earliest_checkin_index] = 0
-				pax_dist[latest_checkin_index:] = 0
-				valid_pax_dist = pax_dist
-				# valid_pax_dist.append(pax_dist[earliest_checkin_index:latest_checkin_index])
-				# too_early.append(sum(pax_dist[:earliest_checkin_index]))
-
-			d[count] = valid_pax_dist
-			# print(too_early_pax_dist)
-			# too_early[count] = sum(too_early_pax_dist)
-			count += 1
-
-		# Restructure d so that it works with d[i,j] instead of d[i][j]
-		new_d = {}
-		for i, sublist in d.items():
-			for j in range(len(sublist)):
-				new_d[(i, j)] = sublist[j]
-
-		self.d = new_d
-		self.too_early = too_early
-
-	def set_T(self):
-		T = {}
-		for index, flight in self.flights.iterrows():
-			etd_minutes = flight['ETD_minutes']
-			no_checkin_t = set()
-			for i in range(self.tot_m // self.t_interval):
-				t = i * self.t_interval
-				if t < etd_minutes - self.earliest_checkin:
-					no_checkin_t.add(i)
-				elif t > etd_minutes - self.last_checkin:
-					no_checkin_t.add(i)
-			T[index] = no_checkin_t
-		self.T = T
+	def set_d(self):
+		mean_early_t, arrival_std = self.mean_early_t, self.arrival_std
+		if self.passenger_classes is not None:
+			mean_early_t = self.passenger_classes.queue_values('mean_early_t', len(self.flights), mean_early_t)
+			arrival_std = self.passenger_classes.queue_values('arrival_std', len(self.flights), arrival_std)
+		self.d, self.too_early = data.flights_to_d(self.flight_schedule(), self.t_interval, self.tot_m, mean_early_t, arrival_std,
+		                                           self.last_checkin, self.earliest_checkin, windows=self.windows, expected=self.expected_demand)
+
+	def time_varying_settings(self, t_interval = None, N = None):
+		# Per flight and per interval values of the parameter_settings found in the workbook, as arrays for ACP.
+		# Flights take them from the SERVICE_TIME and QUEUE_COST columns, intervals from the DESK_SETTINGS sheet,
+		# which holds rows with a FROM time of day and the values (C, S_OPEN, S_OPERATE, L) that apply from then on
+		t_interval = t_interval if t_interval is not None else self.t_interval
+		N = N if N is not None else self.tot_m // t_interval
+		settings = {}
+		for column, name in flight_setting_columns.items():
+			if column in self.flights.columns:
+				settings[name] = self.flights[column].to_numpy(dtype=float)
+
+		minutes = np.arange(N) * t_interval - self.lead_in_m
+		day = np.clip(minutes // (24*60), 0, self.days - 1)
+		time_of_day = minutes - day * 24*60
+		for column, name in interval_setting_columns.items():
+			if not any(table is not None and column in table.columns for table in self.desk_settings):
+				continue
+			values = np.full(N, np.nan)
+			carry = np.nan  # Value in effect at the end of the day before
+			for d, table in enumerate(self.desk_settings):
+				table = table.dropna(subset=['FROM', column]) if table is not None and column in table.columns else None
+				if table is None or table.empty:
+					carry = np.nan
+					continue
+				starts = np.array([time.hour * 60 + time.minute for time in table['FROM']])
+				order = np.argsort(starts)
+				starts, table_values = starts[order], table[column].to_numpy(dtype=float)[order]
+				on_day = day == d
+				# Times before the first row of the day keep the value of the day before, or the scalar of
+				# parameter_settings on the first day and after a day without the column
+				index = np.searchsorted(starts, time_of_day[on_day], side='right') - 1
+				values[on_day] = np.where(index >= 0, table_values[np.maximum(index, 0)], carry)
+				carry = table_values[-1]
+			settings[name] = values
+		# Missing values fall back on the scalar of parameter_settings in ACP
+		return {name: values for name, values in settings.items() if not np.isnan(values).all()}
 
 	def get_departure_times(self):
 		departure_times = {}
@@ -204,62 +383,118 @@ class data:
 		return departure_times
 
 	@staticmethod
-	def flights_to_d(flight_schedule, t_interval = 5, tot_m = 24*60, mean_early_t = 2*60, arrival_std = 0.5, last_checkin = 45, earliest_checkin = 4*60):
+	def flights_to_d(flight_schedule, t_interval = 5, tot_m = 24*60, mean_early_t = 2*60, arrival_std = 0.5, last_checkin = 45, earliest_checkin = 4*60, windows = None, expected = False):
 		# flight_schedule = {
 		# 	0: (240, 100),  # Flight 0 departs at interval 16 (4 hours into the day)
 		# 	1: (48, 100),  # Flight 1 departs at interval 48 (12 hours into the day)
 		# 	2: (80, 50)  # Flight 2 departs at interval 80 (20 hours into the day)
 		# }
-		arrival_std_dev = last_checkin / arrival_std
-
-		#valid_pax_dist = []
-		d = {}
-		too_early = []
-		too_late = []
-		count = 0
+		# Returns d[j, t] for the intervals inside the check-in window of each flight, and the passengers per
+		# flight that arrived before their window opened (they are waiting when it opens).
+		# expected = True gives the expected arrivals instead of a sample, see expected_arrivals.
+		# mean_early_t and arrival_std can also be given per flight, e.g. per passenger class (see PassengerClasses)
+		N = tot_m // t_interval
+		if windows is None:
+			windows = CheckinWindows.from_schedule(flight_schedule, t_interval, N, earliest_checkin, last_checkin)
+		mean_early_t = np.broadcast_to(np.asarray(mean_early_t, dtype=float), (windows.J,))
+		arrival_std_dev = last_checkin / np.broadcast_to(np.asarray(arrival_std, dtype=float), (windows.J,))
+		if expected:
+			pax_dist, too_early = data.expected_arrivals(flight_schedule, t_interval, tot_m, mean_early_t, arrival_std, last_checkin, earliest_checkin)
+			flight_index, time_index = windows.indices()
+			return dict(zip(zip(flight_index.tolist(), time_index.tolist()), pax_dist[flight_index, time_index].tolist())), too_early.tolist()
+		etd_minutes = np.array([etd for etd, _ in flight_schedule.values()], dtype=float)
+		total_passengers = np.array([pax for _, pax in flight_schedule.values()], dtype=int)
+
+		# Draw all passengers of all flights at once and bin them per flight and interval
+		flight_of = np.repeat(np.arange(windows.J), total_passengers)
+		norm_dist = np.random.normal(loc=np.repeat(etd_minutes - mean_early_t, total_passengers), scale=np.repeat(arrival_std_dev, total_passengers))
+		valid = (norm_dist >= 0) & (norm_dist <= tot_m)
+		norm_binned = np.minimum(np.floor(norm_dist[valid] / t_interval).astype(int), N - 1)
+		pax_dist = np.bincount(flight_of[valid] * N + norm_binned, minlength=windows.J * N).reshape(windows.J, N)
+
+		t = np.arange(N)
+		too_early = np.where(t < windows.start[:, None], pax_dist, 0).sum(axis=1)
+		too_late = np.where(t > windows.end[:, None], pax_dist, 0).sum(axis=1)
+
+		flight_index, time_index = windows.indices()
+		d = dict(zip(zip(flight_index.tolist(), time_index.tolist()), pax_dist[flight_index, time_index].tolist()))
+
+		print('too late', too_late.tolist())
+		print('total too late', int(too_late.sum()))
+
+		return d, too_early.tolist()
 
-		for index, (etd_minutes, total_passengers) in flight_schedule.items():
-			valid_pax_dist = []
-			# etd_minutes = flight['ETD_minutes']
-			# total_passengers = flight['MAX_PAX']
-			mean_checkin_time = etd_minutes - mean_early_t
-
-			norm_dist = np.random.normal(loc=mean_checkin_time, scale=arrival_std_dev, size=total_passengers)
-			valid_norm_dist = norm_dist[(norm_dist >= 0) & (norm_dist <= tot_m)]
-			norm_binned = np.floor(valid_norm_dist / t_interval).astype(int)
-			pax_dist, _ = np.histogram(norm_binned, bins=np.arange(0, tot_m // t_interval + 1))
-
-			earliest_checkin_index = max(0, (etd_minutes - earliest_checkin) // t_interval)
-			latest_checkin_index = min((etd_minutes - last_checkin) // t_interval, len(pax_dist) - 1)
-
-			# print('checkin avialble from index:', earliest_checkin_index, 'to index:', latest_checkin_index)
-			if earliest_checkin_index >= 0 and latest_checkin_index >= 0:
-				too_early.append(sum(pax_dist[:earliest_checkin_index]))
-				pax_dist[:earliest_checkin_index] = 0
-				too_late.append(sum(pax_dist[latest_checkin_index:]))
-				pax_dist[latest_checkin_index+1:] = 0
-				valid_pax_dist = pax_dist
-				# valid_pax_dist = pax_dist[earliest_checkin_index:latest_checkin_index]
-				# too_early.append(sum(pax_dist[:earliest_checkin_index]))
+	@staticmethod
+	def largest_remainder(values, totals):
+		# Rounds every row of values to integers that add up to the row total, moving the rounding remainder to the
+		# entries with the largest fractions (values should add up to totals per row)
+		floors = np.floor(values + 1e-9)
+		remainder = np.rint(totals - floors.sum(axis=1)).astype(int)
+		fractions = values - floors
+		rank = np.argsort(np.argsort(-fractions, axis=1, kind='stable'), axis=1, kind='stable')
+		return (floors + (rank < remainder[:, None])).astype(int)
 
-			# print('---->', valid_pax_dist)
-			# print(len(valid_pax_dist), latest_checkin_index - earliest_checkin_index)
+	@staticmethod
+	def expected_arrivals(flight_schedule, t_interval = 5, tot_m = 24*60, mean_early_t = 2*60, arrival_std = 0.5, last_checkin = 45, earliest_checkin = 4*60):
+		# Expected arrivals per flight and interval from the normal CDF instead of sampling passengers, rounded so that
+		# every flight keeps its number of passengers and the rounded too early / in window / too late / outside the day
+		# split. Returns the J x N arrivals (zero outside the window) and the too early passengers, cached per schedule
+		mean_early_t = np.broadcast_to(np.asarray(mean_early_t, dtype=float), (len(flight_schedule),))
+		arrival_std = np.broadcast_to(np.asarray(arrival_std, dtype=float), (len(flight_schedule),))
+		pax_dist, too_early = data.cached_expected_arrivals(tuple(flight_schedule.values()), t_interval, tot_m, tuple(mean_early_t.tolist()),
+		                                                     tuple(arrival_std.tolist()), last_checkin, earliest_checkin)
+		return pax_dist.copy(), too_early.copy()
 
-			d[count] = valid_pax_dist
-			# print(too_early_pax_dist)
-			# too_early[count] = sum(too_early_pax_dist)
-			count += 1
+	@staticmethod
+	@functools.lru_cache(maxsize=64)
+	def cached_expected_arrivals(flight_schedule, t_interval, tot_m, mean_early_t, arrival_std, last_checkin, earliest_checkin):
+		# expected_arrivals for hashable inputs, only the most recent schedules are kept so long sweeps do not grow the
+		# memory (data.cached_expected_arrivals.cache_clear() empties it)
+		flight_schedule = dict(enumerate(flight_schedule))
+		mean_early_t, arrival_std = np.array(mean_early_t), np.array(arrival_std)
+		arrival_std_dev = last_checkin / arrival_std
+		N = tot_m // t_interval
+		windows = CheckinWindows.from_schedule(flight_schedule, t_interval, N, earliest_checkin, last_checkin)
+		etd_minutes = np.array([etd for etd, _ in flight_schedule.values()], dtype=float)
+		total_passengers = np.array([pax for _, pax in flight_schedule.values()], dtype=float)
+
+		# Interval t holds the arrivals in [t, t + 1) * t_interval, the last one up to the end of the day like the sampler
+		edges = np.arange(N + 1) * float(t_interval)
+		edges[-1] = tot_m
+		cdf = ndtr((edges[None, :] - (etd_minutes - mean_early_t)[:, None]) / arrival_std_dev[:, None])
+		expected = total_passengers[:, None] * np.diff(cdf, axis=1)
+
+		t = np.arange(N)
+		mask = windows.mask()
+		early = np.where(t < windows.start[:, None], expected, 0).sum(axis=1)
+		late = np.where(t > windows.end[:, None], expected, 0).sum(axis=1)
+		in_window = np.where(mask, expected, 0).sum(axis=1)
+		outside_day = total_passengers - early - late - in_window
+		split = data.largest_remainder(np.column_stack((early, in_window, late, np.maximum(outside_day, 0))), total_passengers)
+
+		# Spread the rounded window total over the intervals of the window
+		window_values = np.where(mask, expected, 0) * np.divide(split[:, 1], in_window, out=np.zeros(len(in_window)), where=in_window > 0)[:, None]
+		pax_dist = data.largest_remainder(window_values, split[:, 1])
+		return pax_dist, split[:, 0]
 
-		# Restructure d so that it works with d[i,j] instead of d[i][j]
-		new_d = {}
-		for i, sublist in d.items():
-			for j in range(len(sublist)):
-				new_d[(i, j)] = sublist[j]
+	@staticmethod
+	def flight_arrivals(etd_minutes, total_passengers, t_interval = 5, mean_early_t = 2*60, arrival_std = 0.5, last_checkin = 45, earliest_checkin = 4*60):
+		# Arrivals of a single flight on the absolute time axis (not clipped to one day), so multi-day
+		# horizons can be streamed block by block. Returns the first interval of the check-in window,
+		# the arrivals per interval inside the window and the passengers arriving too early / too late
+		arrival_std_dev = last_checkin / arrival_std
+		earliest_checkin_index = (etd_minutes - earliest_checkin) // t_interval
+		latest_checkin_index = (etd_minutes - last_checkin) // t_interval
 
-		print('too late', too_late)
-		print('total too late', sum(too_late))
+		norm_dist = np.random.normal(loc=etd_minutes - mean_early_t, scale=arrival_std_dev, size=total_passengers)
+		norm_binned = np.floor(norm_dist / t_interval).astype(int)
+		in_window = (norm_binned >= earliest_checkin_index) & (norm_binned <= latest_checkin_index)
+		pax_dist = np.bincount(norm_binned[in_window] - earliest_checkin_index,
+		                       minlength=latest_checkin_index - earliest_checkin_index + 1)
+		too_early = int(np.sum(norm_binned < earliest_checkin_index))
+		too_late = int(np.sum(norm_binned > latest_checkin_index))
 
-		return new_d, too_early
+		return earliest_checkin_index, pax_dist, too_early, too_late
 
 
 #data = data()
@@ -354,6 +589,7 @@ def tester():
 	plot_data(d, too_early)
 	plot_total_passengers(d, too_early)
 
-tester()
+if __name__ == "__main__":
+	tester()
 
 #print('hello')
\ No newline at end of file
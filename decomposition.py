@@ -0,0 +1,287 @@
+from Model import *
+import time
+import numpy as np
+
+
+class FlightDecomposition:
+    '''
+    Lagrangian decomposition of the ACP per flight. The flights are only coupled through the shared desk
+    capacity (CapacityLimit and CapacityLimit_dynamic); relaxing these rows with multipliers per interval
+    leaves one tiny queue problem per flight, in which every passenger is simply served at the interval where
+    the multiplier plus the waiting cost is lowest, and one problem per desk, solved by dynamic programming.
+    Both are solved for all flights and desks at once in numpy. The multipliers are updated by subgradient
+    steps, which gives a lower bound on the ACP objective. The service plans of the flights found on the way
+    are columns of a master problem with the desk variables, which is extended by column generation on its
+    LP relaxation and then solved as MIP for the desk counts. The queue cost of these desk counts is finally
+    evaluated exactly, which gives the upper bound.
+    '''
+    def __init__(self, model_name, T, l, parameter_settings, flight_schedule, passenger_scale=1, passenger_flow=None,
+                 max_iterations=200, patience=10, column_generation_rounds=20, master_time_limit=60):
+        self.model_name = model_name
+        self.T = T
+        self.l = l
+        self.N = int(round(T / l))
+        self.t_interval = int(round(l * 60))
+        self.parameter_settings = parameter_settings
+        self.flight_schedule = flight_schedule
+        self.J = len(flight_schedule)
+        self.max_iterations = max_iterations
+        self.patience = patience  # Subgradient iterations without improvement before the step size is halved
+        self.column_generation_rounds = column_generation_rounds
+        self.master_time_limit = master_time_limit
+        self.windows = CheckinWindows.from_schedule(flight_schedule, self.t_interval, self.N)
+
+        if passenger_flow is None:
+            d, too_early = data.flights_to_d(flight_schedule, self.t_interval, int(T * 60), windows=self.windows)
+            too_early = [round(passenger_scale * x) for x in too_early]
+            d = {key: round(passenger_scale * value) for key, value in d.items()}
+            passenger_flow = (d, too_early)
+        self.passenger_flow = passenger_flow
+
+        # Same (rescaled) parameters as ACP.initialize_data
+        scale = self.t_interval / 5
+        self.p = parameter_settings['p']
+        self.h = parameter_settings['h0'] * scale
+        self.n_desks = parameter_settings['C']
+        self.C = parameter_settings['C'] * scale
+        self.s_open = parameter_settings['s_open']
+        self.s_operate = parameter_settings['s_operate'] * scale
+        self.l_param = parameter_settings['l'] * scale
+        self.minimum_desk_time = max(1, int(np.ceil(parameter_settings['minimum_desk_time'] / scale)))
+
+        # Arrivals per flight and interval, with the passengers waiting at the opening of the window added to its start
+        d, too_early = passenger_flow
+        self.open_flights = np.flatnonzero(self.windows.length > 0)
+        self.arrivals = np.zeros((self.J, self.N))
+        for (j, t), value in d.items():
+            self.arrivals[j, t] += value
+        self.arrivals[self.open_flights, self.windows.start[self.open_flights]] += np.asarray(too_early, dtype=float)[self.open_flights]
+        # Serving "at N" stands for still waiting at the end of the horizon, only allowed if the window closes later
+        self.serve_cost_mask = np.zeros((self.J, self.N + 1), dtype=bool)
+        self.serve_cost_mask[:, :self.N] = self.windows.mask()
+        self.serve_cost_mask[:, self.N] = [length > 0 and not self.windows.closes_in_horizon(j) for j, length in enumerate(self.windows.length)]
+
+        self.columns = {j: [] for j in self.open_flights.tolist()}  # Service plans (service per interval, queue cost) per flight
+        self.column_keys = {j: set() for j in self.open_flights.tolist()}
+        self.lower_bound = None
+        self.upper_bound = None
+        self.B = None
+        self.report = {}
+
+    def price_flights(self, price):
+        # Cheapest service plan of every flight when serving a passenger at t costs price[t], all flights at once.
+        # A passenger arriving at s is served at the t >= s in the window minimizing price[t] + h * (t - s)
+        cost = np.where(self.serve_cost_mask, np.append(price, 0)[None, :] + self.h * np.arange(self.N + 1)[None, :], np.inf)
+        best = np.full(self.J, np.inf)
+        best_t = np.full(self.J, self.N, dtype=int)
+        serve_at = np.empty((self.J, self.N), dtype=int)
+        best_cost = np.empty((self.J, self.N))
+        for t in range(self.N, -1, -1):
+            take = cost[:, t] <= best  # Ties go to the earliest interval
+            best = np.where(take, cost[:, t], best)
+            best_t = np.where(take, t, best_t)
+            if t < self.N:
+                serve_at[:, t] = best_t
+                best_cost[:, t] = best
+
+        flight_index, arrival_t = np.nonzero(self.arrivals)
+        counts = self.arrivals[flight_index, arrival_t]
+        served_t = serve_at[flight_index, arrival_t]
+        value = np.bincount(flight_index, counts * (best_cost[flight_index, arrival_t] - self.h * arrival_t), minlength=self.J)
+        queue_cost = np.bincount(flight_index, counts * self.h * (served_t - arrival_t), minlength=self.J)
+        service = np.zeros((self.J, self.N + 1))
+        np.add.at(service, (flight_index, served_t), counts)
+        return value, queue_cost, service[:, :self.N]
+
+    def price_desks(self, reduced):
+        # Cheapest schedule of a single desk when being open at t costs reduced[t], by dynamic programming over the
+        # states closed (0) and open with r more intervals it has to stay open (r + 1), following add_desk_constraints
+        m = self.minimum_desk_time
+        value = np.full(m + 1, np.inf)
+        value[0] = 0
+        choices = []
+        for t in range(self.N):
+            new_value = np.full(m + 1, np.inf)
+            choice = np.zeros(m + 1, dtype=int)
+            # Stay closed: from closed or from an open desk without remaining obligation
+            new_value[0], choice[0] = min((value[0], 0), (value[1], 1))
+            # Stay open without obligation, or open now (the minimum open time only applies from t = 1 to N - m - 1)
+            r_open = m - 1 if 1 <= t < self.N - m else 0
+            candidates = [(value[1] + reduced[t], 1), (value[2] + reduced[t], 2) if m > 1 else (np.inf, 0)]
+            if r_open == 0:
+                candidates.append((value[0] + self.s_open + reduced[t], 0))
+            new_value[1], choice[1] = min(candidates)
+            for r in range(1, m):
+                # Obligation r left after t: reached from r + 1 or by opening now
+                candidates = [(value[r + 2] + reduced[t], r + 2)] if r + 2 <= m else []
+                if r == r_open:
+                    candidates.append((value[0] + self.s_open + reduced[t], 0))
+                new_value[r + 1], choice[r + 1] = min(candidates, default=(np.inf, 0))
+            value = new_value
+            choices.append(choice)
+
+        state = int(np.argmin(value[:2]))  # The horizon can not end with an open obligation
+        best = value[state]
+        pattern = np.zeros(self.N)
+        for t in range(self.N - 1, -1, -1):
+            pattern[t] = state > 0
+            state = choices[t][state]
+        return best, pattern
+
+    def add_columns(self, queue_cost, service, flights=None):
+        added = 0
+        for j in (self.open_flights if flights is None else flights).tolist():
+            key = service[j].tobytes()
+            if key not in self.column_keys[j]:
+                self.column_keys[j].add(key)
+                self.columns[j].append((service[j].copy(), queue_cost[j]))
+                added += 1
+        return added
+
+    def lagrangian_bound(self, lam, mu):
+        # Lower bound for multipliers lam (CapacityLimit_dynamic) and mu (CapacityLimit) and the subgradients
+        value, queue_cost, service = self.price_flights(self.p * (lam + mu))
+        self.add_columns(queue_cost, service)
+        load = self.p * service.sum(axis=0)
+        bound = value.sum() - (mu * self.C).sum()
+        g_lam = np.zeros(self.N)
+        if self.model_name == "dynamic_ACP":
+            desk_value, pattern = self.price_desks(self.s_operate - self.l_param * lam)
+            if desk_value < 0:
+                bound += self.n_desks * desk_value
+                B = self.n_desks * pattern
+            else:
+                B = np.zeros(self.N)
+            g_lam = load - self.l_param * B
+        return bound, g_lam, load - self.C
+
+    def subgradient(self):
+        lam, mu = np.zeros(self.N), np.zeros(self.N)
+        best_bound, theta, stall = -np.inf, 2.0, 0
+        for iteration in range(self.max_iterations):
+            bound, g_lam, g_mu = self.lagrangian_bound(lam, mu)
+            if bound > best_bound + 1e-6:
+                best_bound, stall = bound, 0
+            else:
+                stall += 1
+                if stall >= self.patience:
+                    theta, stall = theta / 2, 0
+            # Multipliers of rows that are slack and at zero can not move
+            g_lam = np.where((lam <= 0) & (g_lam < 0), 0, g_lam)
+            g_mu = np.where((mu <= 0) & (g_mu < 0), 0, g_mu)
+            norm = (g_lam ** 2).sum() + (g_mu ** 2).sum()
+            if norm == 0 or theta < 1e-4:
+                break
+            # Polyak step towards an estimate of the optimum a bit above the best bound
+            target = best_bound + 0.05 * abs(best_bound) + 1
+            step = theta * (target - bound) / norm
+            lam = np.maximum(0, lam + step * g_lam)
+            mu = np.maximum(0, mu + step * g_mu)
+        self.lower_bound = float(best_bound)
+        return lam, mu
+
+    def build_master(self):
+        # Desk variables as in the ACP, and a convex combination of the generated service plans per flight
+        master = Model("decomposition_master")
+        master.setParam('OutputFlag', 0)
+        weights = {j: master.addVars(len(columns), lb=0, name=f"w_{j}") for j, columns in self.columns.items()}
+        # Artificial plan per flight, priced above any real plan, so the master stays feasible while columns are missing
+        artificial = master.addVars(list(self.columns), lb=0, name="artificial")
+        convexity = {j: master.addConstr(weights[j].sum() + artificial[j] == 1, f"Convexity_{j}") for j in self.columns}
+        load = [gp.LinExpr() for t in range(self.N)]
+        for j, columns in self.columns.items():
+            for k, (service, _) in enumerate(columns):
+                for t in np.flatnonzero(service):
+                    load[t].add(weights[j][k], self.p * service[t])
+        capacity = [master.addConstr(load[t] <= self.C, f"CapacityLimit_{t}") for t in range(self.N)]
+        objective = gp.quicksum(cost * weights[j][k] for j, columns in self.columns.items() for k, (_, cost) in enumerate(columns))
+        big_m = 10 * (self.h * (self.N + 1) * self.arrivals.sum() + (self.s_open + self.s_operate * self.N) * self.n_desks)
+        objective += big_m * artificial.sum()
+
+        capacity_dynamic, B, y_open = [], None, None
+        if self.model_name == "dynamic_ACP":
+            B = master.addVars(self.N, vtype=GRB.INTEGER, name="B")
+            desk = master.addVars(self.n_desks, self.N, vtype=GRB.BINARY, name="desk")
+            y_open = master.addVars(self.n_desks, self.N, vtype=GRB.BINARY, name="y_open")
+            capacity_dynamic = [master.addConstr(load[t] <= self.l_param * B[t], f"CapacityLimit_dynamic_{t}") for t in range(self.N)]
+            rows = RowStager(master)
+            add_desk_constraints(master, rows, B, desk, y_open, self.n_desks, self.N, self.minimum_desk_time)
+            rows.flush(fix_unused=False)
+            objective += self.s_open * y_open.sum() + self.s_operate * B.sum()
+        master.setObjective(objective, GRB.MINIMIZE)
+        master.update()
+        return master, convexity, capacity, capacity_dynamic, B, y_open, artificial
+
+    def column_generation(self):
+        # Adds the service plans with negative reduced cost for the duals of the master LP relaxation
+        for _ in range(self.column_generation_rounds):
+            master, convexity, capacity, capacity_dynamic, _, _, _ = self.build_master()
+            relaxed = master.relax()
+            relaxed.optimize()
+            pi = -np.array([relaxed.getConstrByName(c.ConstrName).Pi for c in capacity])
+            if capacity_dynamic:
+                pi -= np.array([relaxed.getConstrByName(c.ConstrName).Pi for c in capacity_dynamic])
+            sigma = np.zeros(self.J)
+            for j, c in convexity.items():
+                sigma[j] = relaxed.getConstrByName(c.ConstrName).Pi
+            value, queue_cost, service = self.price_flights(self.p * pi)
+            improving = value - sigma < -1e-6
+            relaxed.dispose()
+            master.dispose()
+            if not improving[self.open_flights].any():
+                break
+            added = self.add_columns(queue_cost, service, self.open_flights[improving[self.open_flights]])
+            if added == 0:
+                break
+
+    def evaluate(self, B):
+        # Exact queue cost of a desk plan: the static ACP with the capacity of every interval limited by the open desks
+        static = ACP("static_ACP", self.T, self.l, self.parameter_settings, flight_schedule=self.flight_schedule,
+                     passenger_flow=self.passenger_flow, hygiene=False)  # Keeps every capacity row for the new right hand sides
+        static.model.update()
+        for t in range(self.N):
+            capacity = static.model.getConstrByName(f"CapacityLimit[{t}]")
+            if capacity is not None:  # The builder adds no capacity row for intervals without flights
+                capacity.RHS = min(self.C, self.l_param * B[t])
+        static.optimize(OutputFlag=0)
+        queue_cost = static.objective
+        static.model.dispose()
+        return queue_cost
+
+    def solve(self):
+        start = time.time()
+        self.subgradient()
+        subgradient_time = time.time() - start
+        self.column_generation()
+
+        master, _, _, _, B, y_open, artificial = self.build_master()
+        master.setParam('TimeLimit', self.master_time_limit)
+        master.optimize()
+        if master.SolCount == 0 or any(a.X > 1e-6 for a in artificial.values()):
+            print("Master problem has no feasible plan with the generated columns")
+            master.dispose()
+            return None
+        if self.model_name == "dynamic_ACP":
+            self.B = np.array([round(B[t].X) for t in range(self.N)])
+            desk_cost = self.s_open * sum(round(v.X) for v in y_open.values()) + self.s_operate * self.B.sum()
+        else:
+            self.B = np.full(self.N, self.n_desks)
+            desk_cost = 0
+        master_objective = master.ObjVal
+        master.dispose()
+
+        queue_cost = self.evaluate(self.B)
+        self.upper_bound = None if queue_cost is None else float(queue_cost + desk_cost)
+        self.report = {'lower_bound': self.lower_bound, 'upper_bound': self.upper_bound, 'master_objective': master_objective,
+                       'gap': None if self.upper_bound is None else (self.upper_bound - self.lower_bound) / max(abs(self.upper_bound), 1e-9),
+                       'columns': sum(len(columns) for columns in self.columns.values()),
+                       'subgradient_time': subgradient_time, 'total_time': time.time() - start}
+        print("Decomposition report: ", self.report)
+        return self.upper_bound
+
+
+if __name__ == "__main__":
+    data_schiphol = data()
+    schedule = {i: (row['ETD_minutes'], row['MAX_PAX']) for i, row in data_schiphol.flights.iterrows()}
+    decomposition = FlightDecomposition("dynamic_ACP", 24, 1/12, parameter_settings, schedule)
+    decomposition.solve()
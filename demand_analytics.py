@@ -0,0 +1,164 @@
+from data import *
+import numpy as np
+import matplotlib.pyplot as plt
+
+
+class DemandAnalytics:
+    '''
+    Analytics of the passenger demand of a day before any model is solved, with NumPy only. Demand is the
+    arrivals d[j, t] of data.flights_to_d, with the passengers waiting before the window opens added at the
+    window start. From it follow the cumulative demand, deadline and capacity curves, the work that has to be
+    done within every time window [a, b] (arrivals from a on of the flights whose last check-in is at or
+    before b), the desks needed for the busiest window, and lower bounds on the ACP objective that hold
+    for every feasible plan, e.g. to pre-screen scenarios, size C and report the gap of a solve.
+    '''
+    def __init__(self, flight_schedule, passenger_flow, parameter_settings, T=24, l=1/12, initial_desks=0, time_varying=None):
+        self.flight_schedule = flight_schedule
+        self.parameter_settings = parameter_settings
+        self.T = T
+        self.l = l
+        self.N = int(round(T / l))
+        self.t_interval = int(round(l * 60))
+        self.J = len(flight_schedule)
+        self.initial_desks = initial_desks
+        self.windows = CheckinWindows.from_schedule(flight_schedule, self.t_interval, self.N)
+
+        # Settings per flight and interval, scaled to the interval length like ACP.initialize_data
+        time_varying = time_varying if time_varying is not None else {}
+        scale = self.t_interval / 5
+
+        def settings_array(name, size):
+            values = np.asarray(time_varying.get(name, np.full(size, np.nan)), dtype=float)
+            return np.where(np.isnan(values), float(parameter_settings[name]), values)
+
+        self.p = settings_array('p', self.J)
+        self.h = settings_array('h0', self.J) * scale
+        self.desks_available = settings_array('C', self.N)
+        self.C = self.desks_available * scale
+        self.s_open = settings_array('s_open', self.N)
+        self.s_operate = settings_array('s_operate', self.N) * scale
+        self.l_param = settings_array('l', self.N) * scale
+        self.minimum_desk_time = max(1, int(np.ceil(parameter_settings['minimum_desk_time'] / scale)))
+
+        # Demand per flight and interval, the passengers waiting before the window opens arrive at its start
+        d, too_early = passenger_flow
+        self.D = np.zeros((self.J, self.N))
+        for (j, t), value in d.items():
+            self.D[j, t] += value
+        in_horizon = np.flatnonzero(self.windows.length > 0)
+        self.D[in_horizon, self.windows.start[in_horizon]] += np.asarray(too_early, dtype=float)[in_horizon]
+        # Flights whose queue has to be empty at the last check-in (EnterQueueLimit)
+        self.deadline = (self.windows.length > 0) & (self.windows.last <= self.N - 1)
+        self._window_work = None
+
+    @classmethod
+    def from_acp(cls, acp):
+        # Same demand and settings as a built ACP (d and I0 already scaled with the passenger scale)
+        return cls(acp.flight_schedule, (acp.d, [acp.I0[j] for j in range(acp.J)]), acp.parameter_settings, acp.T, acp.l,
+                   acp.initial_desks, acp.time_varying)
+
+    def curves(self):
+        # Cumulative arrivals, cumulative passengers that have to be served (deadlines passed) and cumulative capacity per interval
+        arrivals = self.D.sum(axis=0).cumsum()
+        due = np.bincount(self.windows.end[self.deadline], weights=self.D[self.deadline].sum(axis=1), minlength=self.N).cumsum()
+        capacity = (np.minimum(self.C, self.l_param * self.desks_available) / self.p.min()).cumsum()
+        return arrivals, due, capacity
+
+    def window_work(self):
+        # work[a, b]: service time p * passengers that arrive from a on and have to be served by b, for every window [a, b]
+        if self._window_work is None:
+            suffix = (self.p[:, None] * self.D)[:, ::-1].cumsum(axis=1)[:, ::-1]  # Work of flight j arriving from a on
+            flights = np.flatnonzero(self.deadline)
+            work = np.zeros((self.N, self.N))
+            np.add.at(work.T, self.windows.end[flights], suffix[flights])
+            work = np.triu(work.cumsum(axis=1))
+            self._window_work = work
+        return self._window_work
+
+    def required_desks(self):
+        # Fewest desks that can serve the work of every window [a, b] in time, and the busiest window
+        work = self.window_work()
+        service = np.concatenate(([0], self.l_param.cumsum()))
+        window_service = np.triu(service[None, 1:] - service[:-1, None])  # Desk service time in [a, b] per desk
+        desks = np.divide(work, window_service, out=np.zeros_like(work), where=window_service > 0)
+        a, b = np.unravel_index(np.argmax(desks), desks.shape)
+        return int(np.ceil(desks[a, b] - 1e-9)), (int(a), int(b))
+
+    def capacity_shortfall(self):
+        # Windows in which more work is due than the desks available can serve, (a, b, shortfall); infeasible if any
+        work = self.window_work()
+        capacity = np.concatenate(([0], np.minimum(self.C, self.l_param * self.desks_available).cumsum()))
+        shortfall = np.triu(work - (capacity[None, 1:] - capacity[:-1, None]))
+        a, b = np.nonzero(shortfall > 1e-9)
+        return [(int(i), int(k), float(shortfall[i, k])) for i, k in zip(a, b)]
+
+    def size_C(self, margin=0.1):
+        # Suggested desk count: the desks of the busiest window plus a margin for the queueing and opening costs
+        desks, _ = self.required_desks()
+        return int(np.ceil(desks * (1 + margin)))
+
+    def operating_bound(self):
+        # Disjoint windows each need their work served by desks at the cheapest operating cost per service time inside the
+        # window, the best set of disjoint windows follows from a dynamic program over the window end
+        work = self.window_work()
+        rate = self.s_operate / self.l_param
+        best = np.zeros(self.N + 1)  # best[b + 1]: bound for intervals 0..b
+        for b in range(self.N):
+            cheapest = np.minimum.accumulate(rate[:b + 1][::-1])[::-1]  # Cheapest rate in [a, b] for every a
+            best[b + 1] = max(best[b], np.max(best[:b + 1] + work[:b + 1, b] * cheapest))
+        return float(best[-1])
+
+    def opening_bound(self):
+        # The desks of the busiest window have to be opened at some point, apart from the ones still open from before
+        desks, _ = self.required_desks()
+        return float(max(0, desks - self.initial_desks) * self.s_open.min())
+
+    def waiting_bound(self):
+        # Passengers in the queue at the end of interval t are at least the arrivals so far minus the most that can be served
+        arrivals = self.D.sum(axis=0).cumsum()
+        served = np.floor(np.minimum(self.C, self.l_param * self.desks_available) / self.p.min() + 1e-9).cumsum()
+        return float(self.h.min() * np.maximum(0, arrivals - served).sum())
+
+    def lower_bound(self, model_name="dynamic_ACP"):
+        # Valid lower bound on the objective, the sum of bounds on the separate (non-negative) cost terms
+        if model_name == "static_ACP":
+            return self.waiting_bound()
+        return self.waiting_bound() + self.operating_bound() + self.opening_bound()
+
+    def report(self, model_name="dynamic_ACP", objective=None):
+        desks, (a, b) = self.required_desks()
+        shortfall = self.capacity_shortfall()
+        bound = self.lower_bound(model_name)
+        print("Demand analytics: ")
+        print("Total passengers = ", self.D.sum())
+        print(f"Desks needed in the busiest window = {desks} (intervals {a} to {b})")
+        print("Suggested C = ", self.size_C())
+        print("Infeasible windows (capacity shortfall) = ", len(shortfall))
+        print("Lower bound on the objective = ", bound)
+        if objective is not None:
+            print("Gap of the objective to the bound = ", (objective - bound) / max(abs(objective), 1e-9))
+        return {'total_passengers': float(self.D.sum()), 'required_desks': desks, 'peak_window': (a, b),
+                'suggested_C': self.size_C(), 'infeasible_windows': len(shortfall), 'lower_bound': bound}
+
+    def plot_curves(self):
+        arrivals, due, capacity = self.curves()
+        plt.figure(figsize=(10, 6))
+        plt.plot(range(self.N), arrivals, label='Cumulative arrivals')
+        plt.plot(range(self.N), due, label='Cumulative passengers due (last check-in passed)')
+        plt.plot(range(self.N), capacity, label='Cumulative capacity (all desks open)')
+        plt.xlabel(f'Time Interval [{self.t_interval} mins]')
+        plt.ylabel('Number of Passengers')
+        plt.title('Cumulative Demand versus Capacity')
+        plt.legend()
+        plt.grid(True)
+        plt.show()
+
+
+if __name__ == "__main__":
+    parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 400, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+    data_schiphol = data()
+    schedule = {i: (row['ETD_minutes'], row['MAX_PAX']) for i, row in data_schiphol.flights.iterrows()}
+    analytics = DemandAnalytics(schedule, (data_schiphol.d, data_schiphol.too_early), parameter_settings,
+                                time_varying=data_schiphol.time_varying_settings(5, 24 * 12))
+    analytics.report()
+    analytics.plot_curves()
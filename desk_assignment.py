@@ -0,0 +1,207 @@
+import time
+import numpy as np
+import pandas as pd
+
+
+class DeskRoster:
+    '''
+    Turns an ACP solution into a roster of check-in counters per flight. The ACP decides the number of open
+    desks B[t] and the passengers q[j, t] served per flight, this stage assigns every flight a contiguous
+    block of counters in each interval, large enough to serve q[j, t] at the desk service rate. Blocks are
+    kept in place from one interval to the next where possible, so a flight keeps its counters while it is
+    checking in; new or growing flights take the first free run of counters (first fit), and only when the
+    counters are too fragmented all blocks are laid out again. Open desks that no flight needs are listed
+    as unassigned. The result is a table per interval and a roster with one row per counter block.
+    '''
+    def __init__(self, acp, labels=None):
+        if acp.model_name != "dynamic_ACP":
+            raise ValueError("The desk roster needs the desks B of a solved dynamic_ACP")
+        if acp.B_class:
+            raise ValueError("The desk roster assigns counters from the pooled desks B, it does not support classes with dedicated desks")
+        self.acp = acp
+        self.N = acp.N
+        self.J = acp.J
+        self.t_interval = acp.t_interval
+        self.n_counters = acp.parameter_settings['C']
+        labels = labels if labels is not None else {j: f"Flight {j}" for j in range(len(acp.flights))}  # e.g. airline and ETD
+        if acp.passenger_classes is not None:
+            # One block per flight and passenger class
+            labels = {j: f"{labels[acp.flight_of[j]]} {acp.passenger_classes.names[acp.class_of[j]]}" for j in range(self.J)}
+        self.labels = labels
+
+        model = acp.model
+        self.B = np.rint(model.getAttr('X', [acp.B[t] for t in range(self.N)])).astype(int)
+        flight_index, time_index = acp.windows.indices()
+        self.q = np.zeros((self.J, self.N))
+        self.q[flight_index, time_index] = model.getAttr('X', list(acp.q.values()))
+        self.q = np.rint(self.q)
+        # Desks a flight needs per interval, as a fraction of a desk
+        self.desk_share = acp.p[:, None] * self.q / np.asarray(acp.l_param)[None, :]
+        self.assignments = None
+
+    def desks_needed(self, t):
+        # Whole desks per flight served at t: rounded up, then trimmed back to the open desks where rounding overshoots
+        flights = np.flatnonzero(self.q[:, t] > 0)
+        share = self.desk_share[flights, t]
+        needed = np.maximum(1, np.ceil(share - 1e-9)).astype(int)
+        excess = needed.sum() - self.B[t]
+        if excess > 0:
+            # Take desks from the flights that are furthest above their fractional need first, keeping at least one
+            for k in np.argsort(-(needed - share), kind='stable'):
+                take = min(excess, needed[k] - 1)
+                needed[k] -= take
+                excess -= take
+                if excess == 0:
+                    break
+            # More flights than open desks: the smallest ones get no desk of their own and share one
+            for k in np.argsort(share, kind='stable')[:max(0, excess)]:
+                needed[k] = 0
+        return flights, needed
+
+    @staticmethod
+    def first_fit(occupied, width):
+        # First counter of the first free run of the given width, None if there is none
+        run = 0
+        for counter, used in enumerate(occupied):
+            run = 0 if used else run + 1
+            if run == width:
+                return counter - width + 1
+        return None
+
+    def assign(self):
+        start_time = time.perf_counter()
+        rows = []
+        blocks = {}  # Last (first counter, width) of every flight that is checking in
+        for t in range(self.N):
+            flights, needed = self.desks_needed(t)
+            occupied = np.zeros(self.n_counters, dtype=bool)
+            placed = {}
+            shared = []
+            # Flights that keep checking in first hold on to (part of) their counters, unless another flight took them
+            # while they were not served
+            for k, j in enumerate(flights):
+                if j in blocks:
+                    start, width = blocks[j][0], min(blocks[j][1], needed[k])
+                    if width > 0 and not occupied[start:start + width].any():
+                        occupied[start:start + width] = True
+                        placed[j] = (start, width)
+            # Then they grow in place or move, and new flights take the first free run, in the order of their counters
+            order = sorted(range(len(flights)), key=lambda k: (flights[k] not in blocks, blocks.get(flights[k], (0,))[0], flights[k]))
+            for k in order:
+                j, width = flights[k], needed[k]
+                if width == 0:
+                    placed.pop(j, None)  # Held no counters in the first pass either
+                    shared.append(k)
+                    continue
+                if j in placed:
+                    start, kept = placed[j]
+                    if kept == width:
+                        continue
+                    if start + width <= self.n_counters and not occupied[start + kept:start + width].any():
+                        occupied[start + kept:start + width] = True
+                        placed[j] = (start, width)
+                        continue
+                    occupied[start:start + kept] = False
+                    del placed[j]
+                start = self.first_fit(occupied, width)
+                if start is None:
+                    shared.append(k)  # More flights than open desks or too fragmented, handled below
+                    continue
+                occupied[start:start + width] = True
+                placed[j] = (start, width)
+
+            if any(needed[k] > 0 for k in shared):
+                # Fragmented: lay out all blocks again from the first counter, in the same order
+                occupied[:] = False
+                placed, shared, position = {}, [], 0
+                for k in order:
+                    if needed[k] == 0 or position + needed[k] > self.n_counters:
+                        shared.append(k)
+                        continue
+                    placed[flights[k]] = (position, needed[k])
+                    occupied[position:position + needed[k]] = True
+                    position += needed[k]
+            shared_flights = set()
+            for k in shared:
+                # No counter left: the flight is served at the last counter of the largest block (the first counter if
+                # no flight has a block of its own)
+                if placed:
+                    host = max(placed, key=lambda j: placed[j][1])
+                    placed[flights[k]] = (placed[host][0] + placed[host][1] - 1, 1)
+                else:
+                    placed[flights[k]] = (0, 1)
+                    occupied[0] = True
+                shared_flights.add(flights[k])
+
+            for j, (start, width) in placed.items():
+                for counter in range(start, start + width):
+                    rows.append((t, counter, j, self.labels[j], self.q[j, t] / width))
+            # Open desks no flight needs (e.g. kept open for the minimum open time)
+            idle = self.B[t] - occupied.sum()
+            for counter in np.flatnonzero(~occupied)[:max(0, idle)]:
+                rows.append((t, int(counter), None, 'unassigned', 0.0))
+            # Flights keep their counters as preferred place while their window is open, also in intervals without service.
+            # A shared counter is not a place of its own
+            blocks.update({j: block for j, block in placed.items() if j not in shared_flights})
+            blocks = {j: block for j, block in blocks.items() if self.acp.windows.end[j] > t}
+
+        self.assignments = pd.DataFrame(rows, columns=['interval', 'counter', 'flight', 'label', 'passengers'])
+        self.assignments['flight'] = self.assignments['flight'].astype('Int64')
+        self.assignments['start'] = [self.clock(t) for t in self.assignments['interval']]
+        print(f"Desk assignment of {len(self.assignments)} counter intervals took {time.perf_counter() - start_time:.3f}s")
+        return self.assignments
+
+    def roster(self):
+        # One row per flight and counter block, merging the consecutive intervals in which the block does not change
+        if self.assignments is None:
+            self.assign()
+        blocks = (self.assignments.groupby(['interval', 'flight', 'label'], dropna=False)
+                  .agg(first_counter=('counter', 'min'), last_counter=('counter', 'max'), passengers=('passengers', 'sum'))
+                  .reset_index().sort_values(['label', 'flight', 'interval'], na_position='last'))
+        rows = []
+        for (flight, label), group in blocks.groupby(['flight', 'label'], dropna=False, sort=False):
+            current = None
+            for interval, first, last, passengers in zip(group['interval'], group['first_counter'], group['last_counter'], group['passengers']):
+                if current is not None and current['end_interval'] == interval - 1 and (current['first_counter'], current['last_counter']) == (first, last):
+                    current['end_interval'] = interval
+                    current['passengers'] += passengers
+                    continue
+                if current is not None:
+                    rows.append(current)
+                current = {'flight': flight, 'label': label, 'first_counter': first, 'last_counter': last,
+                           'start_interval': interval, 'end_interval': interval, 'passengers': passengers}
+            rows.append(current)
+        roster = pd.DataFrame(rows)
+        # Counters are numbered from 1 in the roster, times are the start and end of the block
+        roster['first_counter'] += 1
+        roster['last_counter'] += 1
+        roster['start'] = [self.clock(t) for t in roster['start_interval']]
+        roster['end'] = [self.clock(t + 1) for t in roster['end_interval']]
+        roster['passengers'] = roster['passengers'].round().astype(int)
+        return roster.sort_values(['start_interval', 'first_counter']).reset_index(drop=True)
+
+    def clock(self, t):
+        # Start of interval t as hh:mm (hours continue past 24 on multi-day horizons)
+        minutes = int(t) * self.t_interval
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def export(self, path):
+        # Writes the roster (and the assignment per interval) to .xlsx or .csv
+        roster = self.roster()
+        if path.endswith('.xlsx'):
+            with pd.ExcelWriter(path) as writer:
+                roster.to_excel(writer, sheet_name='roster', index=False)
+                self.assignments.to_excel(writer, sheet_name='per_interval', index=False)
+        else:
+            roster.to_csv(path, index=False)
+        print(f"Roster with {len(roster)} counter blocks written to {path}")
+        return roster
+
+
+if __name__ == "__main__":
+    from Model import *
+    data_schiphol = data()
+    acp = ACP(model_name="dynamic_ACP", T=24, l=1 / 12, parameter_settings=parameter_settings, data_schiphol=data_schiphol, schiphol_case=True)
+    acp.optimize()
+    labels = {j: f"{row['AIRLINE']} {str(row['ETD'])[:5]}" for j, (_, row) in enumerate(data_schiphol.flights.iterrows())}
+    DeskRoster(acp, labels=labels).export('desk_roster.xlsx')
@@ -0,0 +1,68 @@
+from Model import *
+import hashlib
+import json
+import os
+import numpy as np
+
+
+# Version of the cached files, raise it when the builder or the saved metadata change so old entries are not reused
+cache_format = 1
+
+
+class ModelCache:
+    '''
+    On-disk cache of built ACP models, keyed by everything that goes into the build (model variant, horizon,
+    parameters, schedule, passenger scale, the seed of the sampled passenger flow, the build options of ACP
+    and the cache format). The first request builds and saves the model, later requests (e.g. from the
+    workers of a parallel sweep) load it from the MPS file and metadata instead of reconstructing it in Python.
+    '''
+    def __init__(self, cache_dir='model_cache'):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(model_name, T, l, parameter_settings, flight_schedule, passenger_scale=1, seed=0, formulation='indicator', hygiene=False,
+            time_varying=None, expected_demand=False, passenger_classes=None, initial_queue=None, initial_desks=0):
+        if isinstance(passenger_classes, PassengerClasses):
+            passenger_classes = passenger_classes.settings
+        inputs = {
+            'cache_format': cache_format,
+            'model_name': model_name, 'T': T, 'l': l, 'passenger_scale': passenger_scale, 'seed': seed,
+            'parameter_settings': {key: float(value) for key, value in sorted(parameter_settings.items())},
+            'flight_schedule': [[int(etd), int(pax)] for etd, pax in flight_schedule.values()],
+            'formulation': formulation, 'hygiene': bool(hygiene), 'expected_demand': bool(expected_demand),
+            'time_varying': {name: np.asarray(values, dtype=float).tolist() for name, values in (time_varying or {}).items()},
+            'passenger_classes': None if passenger_classes is None else
+            {name: {key: np.asarray(value).tolist() for key, value in settings.items()} for name, settings in passenger_classes.items()},
+            'initial_queue': sorted([int(j), int(value)] for j, value in (initial_queue or {}).items()),
+            'initial_desks': int(initial_desks),
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:16]
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, model_name, T, l, parameter_settings, flight_schedule, passenger_scale=1, seed=0, formulation='indicator', hygiene=False,
+            time_varying=None, expected_demand=False, passenger_classes=None, initial_queue=None, initial_desks=0, env=None):
+        options = dict(formulation=formulation, hygiene=hygiene, time_varying=time_varying, expected_demand=expected_demand,
+                       passenger_classes=passenger_classes, initial_queue=initial_queue, initial_desks=initial_desks)
+        key = self.key(model_name, T, l, parameter_settings, flight_schedule, passenger_scale, seed, **options)
+        path = self.path(key)
+        if os.path.exists(path + '.mps') and os.path.exists(path + '.json'):
+            print(f"Loading cached model {key}")
+            return ACP.load(path, env)
+
+        print(f"Building model {key}")
+        # The sampled passenger flow is part of the model, seed it without touching the caller's random stream
+        state = np.random.get_state()
+        np.random.seed(seed)
+        try:
+            acp = ACP(model_name, T, l, parameter_settings, flight_schedule=flight_schedule, passenger_scale=passenger_scale, env=env, **options)
+        finally:
+            np.random.set_state(state)
+        # Write to a temporary name first, so concurrent workers never read a half-written model
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        acp.save(tmp_path)
+        os.replace(tmp_path + '.mps', path + '.mps')
+        os.replace(tmp_path + '.json', path + '.json')
+        return acp
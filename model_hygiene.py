@@ -0,0 +1,146 @@
+from gurobipy import GRB
+import gurobipy as gp
+import numpy as np
+
+
+class RowStager:
+    '''
+    Collects the linear rows of a model before they are added, so a hygiene pass can leave out the rows that
+    add nothing: empty rows, duplicates of another row, rows dominated by another row and the bounds of the
+    variables, and rows on a single variable, which become bounds of that variable. Columns that end up in
+    no row and that are not declared to be in a general constraint are fixed at their best bound. What was left out is kept in report.
+    The pass rebuilds every row in Python, so it is an opt-in check: without hygiene the rows are added as they are.
+    '''
+    def __init__(self, model, hygiene=False):
+        self.model = model
+        self.hygiene = hygiene
+        self.staged = []  # (family, key, expression, sense, rhs)
+        self.in_general_constraints = []  # Variables used in general constraints, these are never fixed
+        self.report = {}
+
+    def mark_used(self, variables):
+        # Declares variables that appear in general (e.g. indicator) constraints, which the pass does not inspect
+        self.in_general_constraints.extend(variables)
+
+    def add(self, family, rows):
+        # rows yields (key, lhs, sense, rhs), the row is named family[key] like Model.addConstrs would
+        for key, lhs, sense, rhs in rows:
+            self.staged.append((family, key, lhs, sense, rhs))
+
+    @staticmethod
+    def row_name(family, key):
+        return f"{family}[{','.join(str(k) for k in key) if isinstance(key, tuple) else key}]"
+
+    def count(self, kind, family):
+        self.report.setdefault(kind, {})
+        self.report[kind][family] = self.report[kind].get(family, 0) + 1
+
+    def canonical(self, lhs, rhs):
+        # Row as sorted (variable index, coefficient) terms and right hand side, merging repeated variables
+        expr = gp.LinExpr(lhs) - rhs
+        terms = {}
+        for i in range(expr.size()):
+            index = expr.getVar(i).index
+            terms[index] = terms.get(index, 0) + expr.getCoeff(i)
+        terms = tuple(sorted((index, coeff) for index, coeff in terms.items() if coeff != 0))
+        return terms, -expr.getConstant()
+
+    def flush(self, fix_unused=True):
+        if not self.hygiene:
+            for family, key, lhs, sense, rhs in self.staged:
+                self.model.addLConstr(lhs, sense, rhs, self.row_name(family, key))
+            self.report = {'rows_staged': len(self.staged), 'rows_added': len(self.staged)}
+            self.staged = []
+            return self.report
+        self.model.update()
+        variables = self.model.getVars()
+        lb = np.array(self.model.getAttr('LB', variables))
+        ub = np.array(self.model.getAttr('UB', variables))
+        rows = [(family, key, *self.canonical(lhs, rhs), sense) for family, key, lhs, sense, rhs in self.staged]
+        self.staged = []
+        self.report = {'rows_staged': len(rows)}
+
+        keep = [True] * len(rows)
+        if self.hygiene:
+            signatures = {}
+            for r, (family, key, terms, rhs, sense) in enumerate(rows):
+                if not terms:
+                    # Empty row, either always satisfied or left for Gurobi to report the infeasibility
+                    if (sense == GRB.LESS_EQUAL and rhs >= 0) or (sense == GRB.GREATER_EQUAL and rhs <= 0) or (sense == GRB.EQUAL and rhs == 0):
+                        keep[r] = False
+                        self.count('empty_rows', family)
+                    continue
+                if len(terms) == 1:
+                    # Single variable row, tighten the bounds instead
+                    (index, coeff), = terms
+                    value = rhs / coeff
+                    upper = sense == GRB.EQUAL or (sense == GRB.LESS_EQUAL) == (coeff > 0)
+                    lower = sense == GRB.EQUAL or not upper
+                    new_lb = max(lb[index], value) if lower else lb[index]
+                    new_ub = min(ub[index], value) if upper else ub[index]
+                    if new_lb <= new_ub:
+                        lb[index], ub[index] = new_lb, new_ub
+                        keep[r] = False
+                        self.count('rows_to_bounds', family)
+                    continue
+                # Duplicates: the same terms and sense, keep the tightest right hand side
+                signature = (terms, sense)
+                if signature in signatures:
+                    other = signatures[signature]
+                    other_rhs = rows[other][3]
+                    if sense == GRB.EQUAL and other_rhs != rhs:
+                        continue  # Conflicting equalities, keep both for the infeasibility report
+                    if (sense == GRB.LESS_EQUAL and rhs < other_rhs) or (sense == GRB.GREATER_EQUAL and rhs > other_rhs):
+                        keep[other] = False
+                        self.count('duplicate_rows', rows[other][0])
+                        signatures[signature] = r
+                    else:
+                        keep[r] = False
+                        self.count('duplicate_rows', family)
+                    continue
+                signatures[signature] = r
+
+            # Dominated rows: a <= row is implied by a <= row with the same terms and one extra term c * v when
+            # rhs + max(-c * v) over the bounds of v is at most its own right hand side
+            less_equal = {terms: r for (terms, sense), r in signatures.items() if sense == GRB.LESS_EQUAL and keep[r]}
+            for terms, r in list(less_equal.items()):
+                if not keep[r] or len(terms) < 2:
+                    continue
+                rhs = rows[r][3]
+                for position, (index, coeff) in enumerate(terms):
+                    other = less_equal.get(terms[:position] + terms[position + 1:])
+                    if other is None or not keep[other]:
+                        continue
+                    implied_rhs = rhs - (coeff * lb[index] if coeff > 0 else coeff * ub[index])
+                    if implied_rhs <= rows[other][3] + 1e-9:
+                        keep[other] = False
+                        self.count('dominated_rows', rows[other][0])
+
+        self.model.setAttr('LB', variables, lb.tolist())
+        self.model.setAttr('UB', variables, ub.tolist())
+        for r, (family, key, terms, rhs, sense) in enumerate(rows):
+            if keep[r]:
+                self.model.addLConstr(gp.LinExpr([coeff for _, coeff in terms], [variables[index] for index, _ in terms]),
+                                      sense, rhs, self.row_name(family, key))
+        self.report['rows_added'] = sum(keep)
+
+        if self.hygiene and fix_unused:
+            self.fix_unused_columns(variables, rows, keep, lb, ub)
+        return self.report
+
+    def fix_unused_columns(self, variables, rows, keep, lb, ub):
+        # Columns in no row and no general constraint only matter through the objective, fix them at the best bound.
+        # The objective has to be set before the flush
+        used = np.zeros(len(variables), dtype=bool)
+        for r, (_, _, terms, _, _) in enumerate(rows):
+            if keep[r]:
+                used[[index for index, _ in terms]] = True
+        used[[var.index for var in self.in_general_constraints]] = True
+        objective = np.array(self.model.getAttr('Obj', variables))
+        fixed_value = np.where(objective >= 0, lb, ub)
+        fixable = ~used & np.isfinite(fixed_value)
+        fixed = [variables[index] for index in np.flatnonzero(fixable)]
+        self.model.setAttr('LB', fixed, fixed_value[fixable].tolist())
+        self.model.setAttr('UB', fixed, fixed_value[fixable].tolist())
+        for name in self.model.getAttr('VarName', fixed):
+            self.count('columns_fixed', name.partition('[')[0])
@@ -0,0 +1,124 @@
+from Model import *
+import time
+import numpy as np
+
+
+class CoarseToFineACP:
+    '''
+    Solves the ACP first on a coarse time grid (e.g. 15 or 30 minutes) and then refines it to the fine grid.
+    The fine model only gets full freedom around the peaks of the coarse plan; in quiet periods the desk
+    count B[t] is bounded around the coarse value, and the coarse plan is given to Gurobi as a MIP start.
+    Both resolutions use the same sampled passenger flow, re-binned for the coarse grid.
+    '''
+    def __init__(self, model_name, T, parameter_settings, flight_schedule, l_fine=1/12, l_coarse=1/4, passenger_scale=1,
+                 peak_fraction=0.5, peak_margin=1, desk_slack=1):
+        self.model_name = model_name
+        self.T = T
+        self.parameter_settings = parameter_settings
+        self.flight_schedule = flight_schedule
+        self.l_fine = l_fine
+        self.l_coarse = l_coarse
+        self.passenger_scale = passenger_scale
+        self.factor = int(round(l_coarse / l_fine))  # Fine intervals per coarse interval
+        self.peak_fraction = peak_fraction  # Coarse intervals with B >= peak_fraction * max(B) count as peak
+        self.peak_margin = peak_margin  # Coarse intervals added around each peak
+        self.desk_slack = desk_slack  # Desks the fine plan may deviate from the coarse plan in quiet periods
+
+        self.coarse = None
+        self.fine = None
+        self.objective = None
+        self.report = {}
+
+    def sample_passenger_flow(self):
+        t_interval = int(round(self.l_fine * 60))
+        d, too_early = data.flights_to_d(self.flight_schedule, t_interval, int(self.T * 60))
+        too_early = [round(self.passenger_scale * x) for x in too_early]
+        for key in d:
+            d[key] = round(self.passenger_scale * d[key])
+        return d, too_early
+
+    def rebin(self, d):
+        # Sum the fine arrivals of every flight into the coarse intervals
+        N_coarse = int(round(self.T / self.l_coarse))
+        d_coarse = {(j, t): 0 for j in range(len(self.flight_schedule)) for t in range(N_coarse)}
+        for (j, t), value in d.items():
+            if t // self.factor < N_coarse:
+                d_coarse[j, t // self.factor] += value
+        return d_coarse
+
+    def peak_intervals(self, B_coarse):
+        # Coarse intervals around peaks, where the fine model is left free
+        peak = B_coarse >= self.peak_fraction * B_coarse.max()
+        for _ in range(self.peak_margin):
+            widened = peak.copy()
+            widened[1:] |= peak[:-1]
+            widened[:-1] |= peak[1:]
+            peak = widened
+        return peak
+
+    def solve(self, compare=False):
+        d, too_early = self.sample_passenger_flow()
+
+        start = time.time()
+        self.coarse = ACP(self.model_name, self.T, self.l_coarse, self.parameter_settings, flight_schedule=self.flight_schedule,
+                          passenger_flow=(self.rebin(d), too_early))
+        self.coarse.optimize()
+        coarse_time = time.time() - start
+
+        start = time.time()
+        self.fine = ACP(self.model_name, self.T, self.l_fine, self.parameter_settings, flight_schedule=self.flight_schedule,
+                        passenger_flow=(d, too_early))
+        n_bounded = 0
+        if self.coarse.model.SolCount == 0:
+            # No coarse plan (time limit or infeasible), the fine model is solved without start or bounds
+            print("Coarse model has no solution, solving the fine model without bounds")
+        else:
+            B_coarse = np.array([self.coarse.B[t].X for t in range(self.coarse.N)])
+            peak = self.peak_intervals(B_coarse)
+            for t in range(self.fine.N):
+                coarse_t = min(t // self.factor, self.coarse.N - 1)
+                B_start = round(B_coarse[coarse_t])
+                # MIP start from the coarse plan, desks opened at the start of each coarse block
+                self.fine.B[t].Start = B_start
+                for i in range(self.parameter_settings['C']):
+                    self.fine.desk[i, t].Start = int(i < B_start)
+                if not peak[coarse_t]:
+                    self.fine.B[t].LB = max(0, B_start - self.desk_slack)
+                    self.fine.B[t].UB = min(B_start + self.desk_slack, self.fine.desks_available[t])
+                    n_bounded += 1
+        self.fine.optimize()
+        if self.fine.objective is None and n_bounded > 0:
+            # The bounds cut off every feasible plan, fall back to the fine model with the desks available per interval
+            print("Bounded fine model has no solution, solving without bounds")
+            for t in range(self.fine.N):
+                self.fine.B[t].LB = 0
+                self.fine.B[t].UB = self.fine.desks_available[t]
+            self.fine.optimize()
+        fine_time = time.time() - start
+        self.objective = self.fine.objective
+
+        self.report = {'coarse_objective': self.coarse.objective, 'fine_objective': self.fine.objective,
+                       'coarse_time': coarse_time, 'fine_time': fine_time, 'bounded_intervals': n_bounded,
+                       'fine_mip_gap': self.fine.model.MIPGap if self.fine.model.SolCount > 0 else None}
+
+        if compare:
+            # Reference solve on the full fine model, to report the tolerance of the refined objective
+            start = time.time()
+            reference = ACP(self.model_name, self.T, self.l_fine, self.parameter_settings, flight_schedule=self.flight_schedule,
+                            passenger_flow=(d, too_early))
+            reference.optimize()
+            self.report['reference_objective'] = reference.objective
+            self.report['reference_time'] = time.time() - start
+            if self.objective is not None and reference.objective is not None:
+                self.report['tolerance'] = abs(self.objective - reference.objective) / max(abs(reference.objective), 1e-9)
+            reference.model.dispose()
+
+        print("Coarse-to-fine report: ", self.report)
+        return self.objective
+
+
+if __name__ == "__main__":
+    data_schiphol = data()
+    schedule = {i: (row['ETD_minutes'], row['MAX_PAX']) for i, row in data_schiphol.flights.iterrows()}
+    multi_resolution = CoarseToFineACP(model_name="dynamic_ACP", T=24, parameter_settings=parameter_settings, flight_schedule=schedule)
+    multi_resolution.solve(compare=True)
@@ -0,0 +1,210 @@
+from Model import *
+import csv
+import time
+import numpy as np
+
+
+def file_feed(path, N):
+    # Stand-in for the live feed: a CSV file with lines 'interval,flight,count', ordered by interval.
+    # Yields (t, {flight: count}) for every interval, also the ones without arrivals
+    with open(path) as f:
+        reader = csv.reader(f)
+        current, arrivals = 0, {}
+        for row in reader:
+            if not row or not row[0].strip().lstrip('-').isdigit():
+                continue  # header or empty line
+            t, flight, count = int(row[0]), int(row[1]), int(row[2])
+            while t > current:
+                yield current, arrivals
+                current, arrivals = current + 1, {}
+            arrivals[flight] = arrivals.get(flight, 0) + count
+    while current < N:
+        yield current, arrivals
+        current, arrivals = current + 1, {}
+
+
+def write_simulated_feed(path, flight_schedule, T=24, l=1/12, passenger_scale=1):
+    # Samples one day of arrivals and writes it in the format read by file_feed, for testing the online mode
+    t_interval = int(round(l * 60))
+    N = int(round(T / l))
+    windows = CheckinWindows.from_schedule(flight_schedule, t_interval, N)
+    d, too_early = data.flights_to_d(flight_schedule, t_interval, int(T * 60), windows=windows)
+    flights = list(flight_schedule)  # The feed names flights by their key in the schedule
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['interval', 'flight', 'count'])
+        for (j, t), count in sorted(d.items(), key=lambda item: (item[0][1], item[0][0])):
+            # Passengers who came before the window opened are seen when it opens
+            count = round(passenger_scale * (count + (too_early[j] if t == windows.start[j] else 0)))
+            if count > 0:
+                writer.writerow([t, flights[j], count])
+
+
+class OnlineACP:
+    '''
+    Online re-optimization of the ACP on live arrival counts. A day-ahead plan is made from the forecast,
+    then for every interval the observed arrivals are served with the desks of the current plan, the
+    queues and the forecast of the remaining arrivals are updated, and the remaining horizon is solved
+    again within the latency budget. Desks that are open keep their minimum open time and no new opening
+    cost, and the previous plan is used as MIP start. The feed counts passengers per flight, so the online
+    mode has one passenger class per flight; passenger_classes are rejected instead of being pooled.
+    '''
+    def __init__(self, model_name, parameter_settings, flight_schedule, T=24, l=1/12, passenger_scale=1,
+                 latency_budget=5, resolve_every=1, profile='fast', forecast=None, passenger_classes=None):
+        if passenger_classes is not None:
+            raise ValueError("The online mode serves one passenger class per flight, passenger classes are not supported")
+        self.model_name = model_name
+        self.parameter_settings = parameter_settings
+        self.flight_schedule = flight_schedule
+        self.flights = list(flight_schedule)
+        self.flight_index = {flight: j for j, flight in enumerate(self.flights)}  # Position of every flight of the feed
+        self.T = T
+        self.l = l
+        self.N = int(round(T / l))
+        self.t_interval = int(round(l * 60))
+        self.J = len(flight_schedule)
+        self.latency_budget = latency_budget  # Seconds available for each re-optimization (build + solve)
+        self.resolve_every = resolve_every  # Re-optimize every this many intervals
+        self.profile = profile
+        self.windows = CheckinWindows.from_schedule(flight_schedule, self.t_interval, self.N)
+
+        # Forecast of the arrivals per flight and interval, sampled like the day-ahead model if not given
+        if forecast is None:
+            forecast = data.flights_to_d(flight_schedule, self.t_interval, int(T * 60), windows=self.windows)
+        d, too_early = forecast
+        self.forecast = np.zeros((self.J, self.N))
+        for (j, t), value in d.items():
+            self.forecast[j, t] = passenger_scale * value
+        self.forecast_early = passenger_scale * np.array(too_early, dtype=float)
+        self.observed = np.zeros((self.J, self.N))
+
+        scale = self.t_interval / 5  # parameter_settings are per 5-minute interval, as in ACP
+        self.desk_capacity = parameter_settings['l'] * scale / parameter_settings['p']  # Passengers per desk per interval
+        self.minimum_desk_time = max(1, int(np.ceil(parameter_settings['minimum_desk_time'] / scale)))
+
+        self.queue = np.zeros(self.J)  # Passengers waiting per flight
+        self.waiting_early = np.zeros(self.J)  # Arrived before the window opened
+        self.missed = np.zeros(self.J)  # Arrived after the last check-in or still waiting at it
+        self.desk_opened_at = []  # Interval at which each currently open desk was opened
+        self.plan_B = np.zeros(self.N)  # Current desk plan over the whole horizon
+        self.B_executed = np.zeros(self.N)
+        self.served = np.zeros((self.J, self.N))
+        self.queue_executed = np.zeros((self.J, self.N))
+        self.latencies = []
+        self.overruns = []  # Intervals whose re-optimization took longer than the latency budget
+
+    def remaining_forecast(self, t0):
+        # Forecast from t0 on, scaled per flight with the ratio of observed to forecast arrivals so far
+        seen = self.observed[:, :t0].sum(axis=1) + np.where(self.windows.start < t0, self.waiting_early, 0)
+        expected = self.forecast[:, :t0].sum(axis=1) + np.where(self.windows.start < t0, self.forecast_early, 0)
+        ratio = np.where(expected > 0, seen / np.maximum(expected, 1e-9), 1.0)
+        ratio = np.clip(ratio, 0.5, 2.0)
+        return self.forecast[:, t0:] * ratio[:, None], self.forecast_early * ratio
+
+    def solve_remaining(self, t0):
+        # Re-optimizes the horizon [t0, N) starting from the current queues and open desks
+        start_time = time.time()
+        remaining, early = self.remaining_forecast(t0)
+        local_flights = [j for j in range(self.J) if self.windows.last[j] >= t0 and self.windows.start[j] < self.N]
+        schedule, too_early, initial_queue, d = {}, [], {}, {}
+        for local_j, j in enumerate(local_flights):
+            etd_minutes, total_passengers = self.flight_schedule[self.flights[j]]
+            schedule[local_j] = (etd_minutes - t0 * self.t_interval, total_passengers)
+            if self.windows.start[j] < t0:
+                initial_queue[local_j] = int(round(self.queue[j]))  # Flight already checking in
+            too_early.append(int(round(max(early[j], self.waiting_early[j]))))
+            for t in range(max(t0, self.windows.start[j]), self.windows.end[j] + 1):
+                d[local_j, t - t0] = int(round(remaining[j, t - t0]))
+
+        acp = ACP(self.model_name, (self.N - t0) * self.l, self.l, self.parameter_settings, flight_schedule=schedule,
+                  passenger_flow=(d, too_early), initial_queue=initial_queue, initial_desks=len(self.desk_opened_at))
+
+        if self.model_name == "dynamic_ACP":
+            # Desks that are open stay open until their minimum open time has passed, in the order they were opened
+            for i, opened_at in enumerate(self.desk_opened_at):
+                for t in range(max(0, opened_at + self.minimum_desk_time - t0)):
+                    if t < acp.N:
+                        acp.desk[i, t].LB = 1
+            # Warm start from the previous plan
+            for t in range(acp.N):
+                B_start = int(round(self.plan_B[t0 + t]))
+                acp.B[t].Start = B_start
+                for i in range(self.parameter_settings['C']):
+                    acp.desk[i, t].Start = int(i < B_start)
+
+        # The budget covers the build and the solve, an infeasible remaining horizon is not analysed (no time bound)
+        solve_time = self.latency_budget - (time.time() - start_time)
+        if solve_time > 0:
+            acp.optimize(self.profile, compute_iis=False, TimeLimit=solve_time, OutputFlag=0)
+        if solve_time > 0 and acp.model.SolCount > 0:
+            self.plan_B[t0:] = [acp.B[t].X for t in range(acp.N)]
+        else:
+            print(f"No plan found within the latency budget at interval {t0}, keeping the previous plan")
+        acp.dispose()
+        self.latencies.append(time.time() - start_time)
+        if self.latencies[-1] > self.latency_budget:
+            self.overruns.append(t0)
+            print(f"Re-optimization at interval {t0} took {self.latencies[-1]:.2f}s, over the budget of {self.latency_budget}s")
+
+    def execute_interval(self, t, arrivals):
+        # Observed arrivals join the queues and are served with the desks planned for interval t
+        for flight, count in arrivals.items():
+            j = self.flight_index[flight]
+            if t < self.windows.start[j]:
+                self.waiting_early[j] += count  # Counted once in remaining_forecast, not in observed
+                continue
+            self.observed[j, t] += count
+            if t > self.windows.end[j]:
+                self.missed[j] += count
+            else:
+                self.queue[j] += count
+        opening = self.windows.start == t
+        self.queue[opening] += self.waiting_early[opening]
+
+        B_t = int(round(self.plan_B[t]))
+        while len(self.desk_opened_at) < B_t:
+            self.desk_opened_at.append(t)
+        while len(self.desk_opened_at) > B_t:
+            self.desk_opened_at.pop()  # Close the most recently opened desk
+        self.B_executed[t] = B_t
+
+        # Serve earliest departure first within the desk capacity
+        capacity = self.desk_capacity * B_t if self.model_name == "dynamic_ACP" else self.parameter_settings['C'] * self.t_interval / 5 / self.parameter_settings['p']
+        for j in np.argsort(self.windows.last, kind='stable'):
+            if capacity <= 0:
+                break
+            served = min(self.queue[j], np.floor(capacity))
+            self.queue[j] -= served
+            self.served[j, t] = served
+            capacity -= served
+        closing = self.windows.end == t
+        self.missed[closing] += self.queue[closing]
+        self.queue[closing] = 0
+        self.queue_executed[:, t] = self.queue
+
+    def run(self, feed):
+        self.solve_remaining(0)  # Day-ahead plan
+        for t, arrivals in feed:
+            if t >= self.N:
+                break
+            self.execute_interval(t, arrivals)
+            if t + 1 < self.N and (t + 1) % self.resolve_every == 0:
+                self.solve_remaining(t + 1)
+                print(f"Interval {t}: queue {self.queue.sum():.0f}, desks {self.B_executed[t]:.0f}, re-solve took {self.latencies[-1]:.2f}s")
+
+        waiting_cost = self.parameter_settings['h0'] * self.t_interval / 5 * self.queue_executed.sum()
+        print("Executed plan: ")
+        print("Passengers served = ", self.served.sum())
+        print("Passengers missed = ", self.missed.sum())
+        print("Waiting costs = ", waiting_cost)
+        print("Maximum re-solve latency = ", max(self.latencies))
+        print(f"Re-solves over the latency budget = {len(self.overruns)} of {len(self.latencies)}")
+        return self.B_executed, self.served
+
+
+if __name__ == "__main__":
+    data_schiphol = data()
+    schedule = {i: (row['ETD_minutes'], row['MAX_PAX']) for i, row in data_schiphol.flights.iterrows()}
+    write_simulated_feed('arrivals_feed.csv', schedule)
+    online = OnlineACP("dynamic_ACP", parameter_settings, schedule, latency_budget=5, resolve_every=3)
+    online.run(file_feed('arrivals_feed.csv', online.N))
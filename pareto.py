@@ -0,0 +1,163 @@
+from Model import *
+import time
+from concurrent.futures import ProcessPoolExecutor
+from solver_profiles import worker_threads
+import numpy as np
+import pandas as pd
+
+
+def trace_chunk(acp_arguments, epsilon, bounds, profile=None, solver_params=None):
+    # Solves the epsilon-constrained points of bounds in the given (relaxing) order on one model, each warm started from
+    # the plan of the point before. Used for the whole frontier or, with several workers, for a contiguous part of it
+    frontier = ParetoFrontier(**acp_arguments)
+    frontier.build()
+    points = [frontier.solve_point(epsilon, bound, profile, **(solver_params or {})) for bound in bounds]
+    frontier.acp.dispose()
+    return points
+
+
+class ParetoFrontier:
+    '''
+    Traces the trade-off between the waiting cost and the desk (opening plus operating) cost of the ACP with
+    the epsilon-constraint method, instead of a grid of weighted solves as in Sensitivity. With epsilon
+    'desk_cost' the waiting cost is minimized under a budget on the desk cost, between the cheapest plan and
+    the plan without avoidable waiting; with epsilon 'max_wait' the desk cost is minimized when no passenger
+    waits longer than a given number of intervals. Points are solved from the tightest to the loosest bound,
+    so the plan of each point is a feasible MIP start for the next one. With several workers the bounds are
+    split in contiguous parts that are traced in parallel, all on the same sampled passenger flow.
+    '''
+    def __init__(self, model_name, T, l, parameter_settings, flight_schedule, passenger_flow=None, passenger_scale=1,
+                 time_varying=None, formulation='indicator'):
+        if model_name != "dynamic_ACP":
+            raise ValueError("The desk cost of the frontier needs the desks of the dynamic_ACP")
+        self.acp_arguments = dict(model_name=model_name, T=T, l=l, parameter_settings=parameter_settings, flight_schedule=flight_schedule,
+                                  passenger_flow=passenger_flow, passenger_scale=passenger_scale, time_varying=time_varying,
+                                  formulation=formulation)
+        self.acp = None
+        self.waiting_cost = None
+        self.desk_cost = None
+        self.budget = None
+        self.previous_start = None
+        self.points = []
+
+    def build(self):
+        # Builds the ACP once, its passenger flow is fixed for all points (and for the workers)
+        self.acp = ACP(**self.acp_arguments)
+        self.acp_arguments['passenger_flow'] = (self.acp.d, [self.acp.I0[j] for j in range(self.acp.J)])
+        self.acp_arguments['passenger_scale'] = 1  # The flow above is already scaled
+        waiting_cost, opening_cost, operating_cost = self.acp.cost_expressions()
+        self.waiting_cost = waiting_cost
+        self.desk_cost = opening_cost + operating_cost
+        self.acp.model.update()
+
+    def max_wait_rows(self, max_wait):
+        # Passengers in the queue at t arrived in the last max_wait intervals: I[j, t] <= arrivals of j in (t - max_wait, t]
+        rows = []
+        for j, t in self.acp.I.keys():
+            start = self.acp.windows.start[j]
+            arrived = sum(self.acp.d.get((j, s), 0) for s in range(max(start, t - max_wait + 1), t + 1))
+            arrived += self.acp.I0[j] if t - max_wait + 1 <= start else 0
+            rows.append(self.acp.model.addLConstr(self.acp.I[j, t], GRB.LESS_EQUAL, arrived, f"MaxWait[{j},{t}]"))
+        return rows
+
+    def solve_point(self, epsilon, bound, profile=None, **solver_params):
+        model = self.acp.model
+        if epsilon == 'desk_cost':
+            if self.budget is None:
+                self.budget = model.addLConstr(self.desk_cost, GRB.LESS_EQUAL, bound, "DeskCostBudget")
+            self.budget.RHS = bound
+            first, second = self.waiting_cost, None
+        elif epsilon == 'max_wait':
+            if self.budget is not None:
+                model.remove(self.budget)
+            self.budget = self.max_wait_rows(int(bound))
+            first, second = self.desk_cost, self.waiting_cost  # Least waiting among the cheapest plans, else the point can be dominated
+        else:
+            raise ValueError(f"Unknown epsilon '{epsilon}', options are 'desk_cost' and 'max_wait'")
+
+        variables = model.getVars()
+        if self.previous_start is not None:
+            model.setAttr('Start', variables, self.previous_start)
+        start_time = time.perf_counter()
+        self.lexicographic(first, second, profile, compute_iis=False, **solver_params)  # Too tight bounds are expected
+        point = {'epsilon': epsilon, 'bound': bound, 'status': model.Status, 'runtime': time.perf_counter() - start_time}
+        if model.SolCount > 0:
+            self.previous_start = model.getAttr('X', variables)
+            results = self.acp.extract_results()
+            point.update({'waiting_cost': results['waiting_cost'], 'desk_cost': results['opening_cost'] + results['operating_cost'],
+                          'max_waiting_time': results['max_waiting_time'], 'mip_gap': model.MIPGap,
+                          'B': results['B'], 'q_total': results['q_total'], 'I_total': results['I_total']})
+        return point
+
+    def lexicographic(self, first, second=None, profile=None, compute_iis=True, **solver_params):
+        # Minimizes first, then second while first stays at its optimum
+        model = self.acp.model
+        model.setObjective(first, GRB.MINIMIZE)
+        self.acp.optimize(profile, compute_iis=compute_iis, **{'OutputFlag': 0, **solver_params})
+        if second is None or model.SolCount == 0:
+            return
+        fix = model.addLConstr(first, GRB.LESS_EQUAL, model.ObjVal + 1e-6 * max(1, abs(model.ObjVal)))
+        variables = model.getVars()
+        model.setAttr('Start', variables, model.getAttr('X', variables))
+        model.setObjective(second, GRB.MINIMIZE)
+        self.acp.optimize(profile, compute_iis=compute_iis, **{'OutputFlag': 0, **solver_params})
+        model.remove(fix)
+
+    def anchors(self, profile=None, **solver_params):
+        # Desk cost of the cheapest plan and of the plan with the least waiting
+        ends = []
+        for first, second in ((self.desk_cost, self.waiting_cost), (self.waiting_cost, self.desk_cost)):
+            self.lexicographic(first, second, profile, **solver_params)
+            ends.append(self.desk_cost.getValue())
+        return ends[0], ends[1]
+
+    def trace(self, epsilon='desk_cost', n_points=10, bounds=None, workers=1, profile=None, **solver_params):
+        # Returns the frontier as a table (one row per point, non-dominated points marked) and keeps the plans in self.points
+        start_time = time.perf_counter()
+        self.build()
+        if bounds is None:
+            if epsilon == 'desk_cost':
+                cheapest, least_waiting = self.anchors(profile, **solver_params)
+                bounds = np.linspace(cheapest, least_waiting, n_points).tolist()
+            else:
+                bounds = list(range(1, n_points + 1))  # Maximum wait of 1 to n_points intervals
+        bounds = sorted(bounds)  # Tightest first, so every plan is a feasible start for the next bound
+
+        if workers == 1:
+            self.points = [self.solve_point(epsilon, bound, profile, **solver_params) for bound in bounds]
+            self.acp.dispose()
+        else:
+            self.acp.dispose()
+            chunks = [chunk.tolist() for chunk in np.array_split(bounds, workers) if len(chunk)]
+            solver_params = {'Threads': worker_threads(len(chunks)), **solver_params}  # Workers share the cores
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(trace_chunk, self.acp_arguments, epsilon, chunk, profile, solver_params) for chunk in chunks]
+                self.points = [point for future in futures for point in future.result()]
+
+        frontier = pd.DataFrame([{key: value for key, value in point.items() if not isinstance(value, np.ndarray)} for point in self.points])
+        if 'waiting_cost' in frontier:
+            # A point is dominated if another one is at least as good in both costs and better in one
+            costs = frontier[['waiting_cost', 'desk_cost']].to_numpy()
+            dominated = [bool(np.any(np.all(costs <= cost + 1e-6, axis=1) & np.any(costs < cost - 1e-6, axis=1))) for cost in costs]
+            frontier['dominated'] = np.array(dominated) | frontier['waiting_cost'].isna().to_numpy()
+        print(f"Pareto frontier of {len(bounds)} points traced in {time.perf_counter() - start_time:.1f}s")
+        return frontier
+
+    def plot(self, frontier):
+        efficient = frontier[~frontier['dominated']]
+        plt.figure(figsize=(10, 6))
+        plt.plot(efficient['desk_cost'], efficient['waiting_cost'], marker='o')
+        plt.xlabel('Desk Cost (opening + operating)')
+        plt.ylabel('Waiting Cost')
+        plt.title('Pareto Frontier of Waiting Cost versus Desk Cost')
+        plt.grid(True)
+        plt.show()
+
+
+if __name__ == "__main__":
+    data_schiphol = data()
+    schedule = {i: (row['ETD_minutes'], row['MAX_PAX']) for i, row in data_schiphol.flights.iterrows()}
+    pareto = ParetoFrontier("dynamic_ACP", 24, 1 / 12, parameter_settings, schedule)
+    frontier = pareto.trace('desk_cost', n_points=8, workers=2, profile='fast')
+    print(frontier)
+    pareto.plot(frontier)
@@ -0,0 +1,171 @@
+from Model import *
+from static_solver import StaticSolver
+import contextlib
+import io
+import time
+import numpy as np
+import pandas as pd
+
+
+def perturbed_etds(etd_minutes, n_samples, random_scale=10, t_interval=5, seed=0):
+    # n_samples x J departure times, every ETD moved uniformly within +- random_scale minutes and rounded to the
+    # interval grid like data.vary_time_randomly (draws that end before the start of the day are drawn again)
+    rng = np.random.default_rng(seed)
+    etd_minutes = np.asarray(etd_minutes, dtype=float)
+    shifted = etd_minutes + rng.uniform(-random_scale, random_scale, (n_samples, len(etd_minutes)))
+    redraw = shifted <= 0
+    while redraw.any():
+        shifted[redraw] = (etd_minutes + rng.uniform(-random_scale, random_scale, (n_samples, len(etd_minutes))))[redraw]
+        redraw = shifted <= 0
+    return (t_interval * np.round(shifted / t_interval)).astype(int)
+
+
+class RobustnessAnalysis:
+    '''
+    How fragile a solved ACP desk plan is to flights departing earlier or later than planned. Many perturbed
+    schedules are drawn at once (as data.vary_time_randomly, but for all samples together), the passenger
+    arrivals of each are sampled, and the fixed desk plan B[t] is evaluated against them with the fast
+    earliest-last-check-in-first evaluator of StaticSolver instead of a MIP per sample. The result is the
+    distribution of the waiting cost, missed passengers and longest wait, and their degradation from the
+    nominal schedule. Optionally only the worst samples are re-solved, which gives the cost of having kept
+    the plan compared to re-planning for that schedule. With passenger classes the flights are shifted (all
+    classes of a flight together), and classes with dedicated desks are evaluated on their own desks.
+    '''
+    def __init__(self, acp, random_scale=10, n_samples=200, seed=0):
+        if acp.model.SolCount == 0:
+            raise ValueError("The robustness analysis needs a solved ACP")
+        self.acp = acp
+        self.random_scale = random_scale  # Largest shift of an ETD [min]
+        self.n_samples = n_samples
+        self.seed = seed
+        results = acp.extract_results()
+        self.B = results['B']
+        # Desks per desk group (see ACP.set_queue_index): the shared desks, then those of every class with dedicated desks
+        B_class = results.get('B_class', np.zeros((0, acp.N), dtype=int))
+        self.group_desks = [self.B - B_class.sum(axis=0)] + list(B_class)
+        self.desk_cost = results['opening_cost'] + results['operating_cost']
+        self.etds = None
+        self.passenger_flows = []
+        self.nominal = None
+        self.samples = None
+
+    def evaluator(self, flight_schedule, passenger_flow, time_varying):
+        return StaticSolver(flight_schedule, passenger_flow, self.acp.parameter_settings, self.acp.T, self.acp.l, time_varying)
+
+    def evaluate_plan(self, flight_schedule, passenger_flow):
+        # KPIs of the desk plan for the queues of flight_schedule, every desk group served by its own desks
+        d, too_early = passenger_flow
+        kpis = []
+        for group, desks in enumerate(self.group_desks):
+            queues = np.flatnonzero(self.acp.desk_group == group)
+            if len(queues) == 0:
+                continue
+            if len(queues) == self.acp.J:
+                kpis.append(self.evaluator(flight_schedule, passenger_flow, self.acp.time_varying).evaluate_plan(desks))
+                continue
+            local = {j: k for k, j in enumerate(queues.tolist())}
+            schedule = {k: flight_schedule[j] for j, k in local.items()}
+            flow = ({(local[j], t): value for (j, t), value in d.items() if j in local}, [too_early[j] for j in queues])
+            time_varying = {name: np.asarray(values)[queues] if name in flight_setting_columns.values() else values
+                            for name, values in self.acp.time_varying.items()}
+            kpis.append(self.evaluator(schedule, flow, time_varying).evaluate_plan(desks))
+        return {'waiting_cost': sum(k['waiting_cost'] for k in kpis), 'missed': sum(k['missed'] for k in kpis),
+                'max_waiting_time': max(k['max_waiting_time'] for k in kpis)}
+
+    def flight_schedule(self, etds):
+        # Schedule per flight with the perturbed departures
+        return {i: (int(etd), pax) for i, (etd, (_, pax)) in enumerate(zip(etds, self.acp.flights.values()))}
+
+    def schedule(self, etds):
+        # Schedule per queue, all classes of a flight depart at the perturbed time of the flight
+        return {j: (int(etds[self.acp.flight_of[j]]), pax) for j, (_, pax) in enumerate(self.acp.flight_schedule.values())}
+
+    def sample_passenger_flow(self, flight_schedule):
+        # Arrivals for a perturbed schedule, with the arrival profile of every class and scaled like ACP.create_passenger_flow
+        mean_early_t, arrival_std = 2 * 60, 0.5
+        if self.acp.passenger_classes is not None:
+            mean_early_t = self.acp.passenger_classes.queue_values('mean_early_t', len(self.acp.flights), mean_early_t)
+            arrival_std = self.acp.passenger_classes.queue_values('arrival_std', len(self.acp.flights), arrival_std)
+        with contextlib.redirect_stdout(io.StringIO()):
+            d, too_early = data.flights_to_d(flight_schedule, self.acp.t_interval, int(self.acp.T * 60), mean_early_t, arrival_std)
+        scale = self.acp.passenger_scale
+        return {key: round(scale * value) for key, value in d.items()}, [round(scale * value) for value in too_early]
+
+    def evaluate(self):
+        start_time = time.perf_counter()
+        nominal_etds = [etd for etd, _ in self.acp.flights.values()]
+        self.etds = perturbed_etds(nominal_etds, self.n_samples, self.random_scale, self.acp.t_interval, self.seed)
+        # The arrivals are sampled from the global stream (data.flights_to_d), seeded without touching the caller's state
+        state = np.random.get_state()
+        np.random.seed(self.seed)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                nominal = self.evaluate_plan(self.acp.flight_schedule, (self.acp.d, [self.acp.I0[j] for j in range(self.acp.J)]))
+                rows = []
+                self.passenger_flows = []
+                for k, etds in enumerate(self.etds):
+                    flight_schedule = self.schedule(etds)
+                    passenger_flow = self.sample_passenger_flow(flight_schedule)
+                    self.passenger_flows.append(passenger_flow)
+                    kpis = self.evaluate_plan(flight_schedule, passenger_flow)
+                    rows.append({'sample': k, **kpis, 'mean_shift': float(np.mean(np.abs(etds - nominal_etds)))})
+        finally:
+            np.random.set_state(state)
+        self.samples = pd.DataFrame(rows)
+        self.samples['total_cost'] = self.samples['waiting_cost'] + self.desk_cost
+        self.samples['waiting_degradation'] = self.samples['waiting_cost'] - nominal['waiting_cost']
+        self.samples['missed_increase'] = self.samples['missed'] - nominal['missed']
+        self.nominal = nominal
+        print(f"Evaluated the desk plan on {self.n_samples} perturbed schedules in {time.perf_counter() - start_time:.2f}s")
+        return self.samples
+
+    def resolve_worst(self, n_worst=5, profile=None, **solver_params):
+        # Re-solves the samples with the highest waiting cost, the regret is the cost of keeping the plan over re-planning
+        if self.samples is None:
+            self.evaluate()
+        worst = self.samples.nlargest(n_worst, 'waiting_cost')['sample'].tolist()
+        scenarios = (dict(model_name=self.acp.model_name, T=self.acp.T, l=self.acp.l, parameter_settings=self.acp.parameter_settings,
+                          flight_schedule=self.flight_schedule(self.etds[k]), passenger_flow=self.passenger_flows[k],
+                          time_varying=self.acp.flight_time_varying, formulation=self.acp.formulation,
+                          passenger_classes=self.acp.passenger_classes)
+                     for k in worst)
+        # A re-solve is infeasible when not all passengers of the sample can make their last check-in with C desks
+        self.samples['resolved_cost'] = np.nan
+        for k, results in zip(worst, solve_sweep(scenarios, profile, compute_iis=False, **{'OutputFlag': 0, **solver_params})):
+            self.samples.loc[self.samples['sample'] == k, 'resolved_cost'] = results['objective'] if results['objective'] is not None else np.nan
+        self.samples['regret'] = self.samples['total_cost'] - self.samples['resolved_cost']
+        return self.samples.loc[self.samples['sample'].isin(worst)]
+
+    def report(self):
+        if self.samples is None:
+            self.evaluate()
+        print(f"Robustness of the desk plan to ETD shifts of up to {self.random_scale} min ({self.n_samples} samples): ")
+        print("Nominal waiting cost = ", self.nominal['waiting_cost'])
+        for column in ('waiting_cost', 'waiting_degradation', 'missed', 'max_waiting_time'):
+            values = self.samples[column]
+            print(f"{column}: mean {values.mean():.1f}, p50 {values.quantile(0.5):.1f}, p90 {values.quantile(0.9):.1f}, "
+                  f"p99 {values.quantile(0.99):.1f}, max {values.max():.1f}")
+        if 'regret' in self.samples:
+            print("Regret of keeping the plan in the re-solved samples = ", self.samples['regret'].dropna().tolist())
+        return self.samples.describe()
+
+    def plot(self):
+        plt.figure(figsize=(10, 6))
+        plt.hist(self.samples['waiting_degradation'], bins=30)
+        plt.axvline(0, color='black', linestyle='--', label='Nominal schedule')
+        plt.xlabel('Increase in Waiting Cost')
+        plt.ylabel('Number of Perturbed Schedules')
+        plt.title(f'Waiting Cost of the Desk Plan under ETD Shifts of up to {self.random_scale} min')
+        plt.legend()
+        plt.grid(True)
+        plt.show()
+
+
+if __name__ == "__main__":
+    acp = ACP(model_name="dynamic_ACP", T=24, l=1 / 12, parameter_settings=parameter_settings, data_schiphol=data(), schiphol_case=True)
+    acp.optimize('fast')
+    robustness = RobustnessAnalysis(acp, random_scale=15, n_samples=500)
+    robustness.evaluate()
+    robustness.resolve_worst(3, 'fast')
+    robustness.report()
+    robustness.plot()
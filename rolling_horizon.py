@@ -0,0 +1,118 @@
+from Model import *
+import numpy as np
+
+
+class RollingHorizon:
+    '''
+    Solves a multi-day schedule as a sequence of day blocks instead of one J x N model. Flight ETDs are
+    absolute minutes since the start of the horizon (see data(data_loc=[...]) for multi-day workbooks).
+    Queues and open desks at the end of a block are carried over into the next one, and arrivals are
+    only sampled while a flight's check-in window overlaps the current block, so memory grows linearly
+    with the number of days.
+    '''
+    def __init__(self, model_name, parameter_settings, flight_schedule, days, l=1/12, block_hours=24, passenger_scale=1,
+                 mean_early_t=2 * 60, arrival_std=0.5, last_checkin=45, earliest_checkin=4 * 60):
+        self.model_name = model_name
+        self.parameter_settings = parameter_settings
+        self.flight_schedule = flight_schedule  # Dictionary of flight index as key and (absolute ETD [min], passengers)
+        self.days = days
+        self.l = l  # Length of the considered time interval [hrs]
+        self.block_hours = block_hours
+        self.passenger_scale = passenger_scale
+        self.t_interval = int(round(self.l * 60))
+        self.N_block = int(round(block_hours / self.l))  # Number of intervals per block
+        self.n_blocks = int(np.ceil(days * 24 / block_hours))
+        self.arrival_settings = dict(t_interval=self.t_interval, mean_early_t=mean_early_t, arrival_std=arrival_std,
+                                     last_checkin=last_checkin, earliest_checkin=earliest_checkin)
+        self.windows = CheckinWindows.from_schedule(flight_schedule, self.t_interval, self.n_blocks * self.N_block,
+                                                    earliest_checkin, last_checkin)
+
+        self.B = []  # Desks open per interval, concatenated over the blocks
+        self.q_total = []  # Passengers accepted per interval, all flights combined
+        self.I_total = []  # Passengers in queue per interval, all flights combined
+        self.block_objectives = []
+        self.objective = None
+
+    def flight_windows(self, block):
+        # Flights whose check-in window overlaps the block, with the window relative to the block start
+        block_start = block * self.N_block
+        for j, flight in enumerate(self.flight_schedule):
+            earliest_checkin_index = self.windows.first[j] - block_start
+            latest_checkin_index = self.windows.last[j] - block_start
+            if latest_checkin_index >= 0 and earliest_checkin_index < self.N_block:
+                yield flight, earliest_checkin_index, latest_checkin_index
+
+    def solve(self):
+        arrivals = {}  # Sampled arrivals of the flights that are currently active
+        carry_queue = {}  # Queue per flight at the end of the previous block
+        carry_desks = 0
+        total_objective = 0
+
+        for block in range(self.n_blocks):
+            block_start = block * self.N_block
+            print(f"Solving block {block + 1}/{self.n_blocks}")
+
+            schedule, d, too_early, initial_queue = {}, {}, [], {}
+            active = []
+            for local_j, (j, earliest_checkin_index, latest_checkin_index) in enumerate(self.flight_windows(block)):
+                active.append(j)
+                etd_minutes, total_passengers = self.flight_schedule[j]
+                if j not in arrivals:
+                    first_index, pax_dist, early, _ = data.flight_arrivals(etd_minutes, total_passengers, **self.arrival_settings)
+                    pax_dist = np.round(self.passenger_scale * pax_dist).astype(int)
+                    arrivals[j] = (first_index, pax_dist, round(self.passenger_scale * early))
+                first_index, pax_dist, early = arrivals[j]
+
+                schedule[local_j] = (etd_minutes - block_start * self.t_interval, total_passengers)
+                absolute = np.arange(block_start, block_start + self.N_block) - first_index
+                inside = (absolute >= 0) & (absolute < len(pax_dist))
+                block_d = np.zeros(self.N_block, dtype=int)
+                block_d[inside] = pax_dist[absolute[inside]]
+                for t in range(max(0, earliest_checkin_index), min(latest_checkin_index + 1, self.N_block)):
+                    d[local_j, t] = int(block_d[t])
+                too_early.append(early)
+
+                if j in carry_queue:
+                    initial_queue[local_j] = carry_queue[j]
+                elif earliest_checkin_index < 0:
+                    # Window already open at the block start: everyone who arrived before it is waiting
+                    initial_queue[local_j] = early + int(pax_dist[:block_start - first_index].sum())
+
+            acp = ACP(self.model_name, self.block_hours, self.l, self.parameter_settings, flight_schedule=schedule,
+                      passenger_flow=(d, too_early), initial_queue=initial_queue, initial_desks=carry_desks)
+            acp.optimize()
+            if acp.model.SolCount == 0:
+                # The next blocks start from the queues and desks of this one, so the horizon cannot be continued
+                status = acp.model.Status
+                acp.model.dispose()
+                raise RuntimeError(f"Block {block + 1}/{self.n_blocks} (from hour {block * self.block_hours}) has no solution, "
+                                   f"Gurobi status {status}; the blocks before it are kept in block_objectives")
+
+            # Keep only the per-interval aggregates and the state needed by the next block
+            self.B.extend(round(acp.B[t].X) for t in range(acp.N))
+            self.q_total.extend(acp.interval_totals(acp.q).tolist())
+            self.I_total.extend(acp.interval_totals(acp.I).tolist())
+            self.block_objectives.append(acp.objective)
+            total_objective += acp.objective
+            carry_queue = {j: round(acp.I[local_j, acp.N - 1].X) for local_j, j in enumerate(active) if (local_j, acp.N - 1) in acp.I}
+            carry_desks = round(acp.B[acp.N - 1].X) if self.model_name == "dynamic_ACP" else 0
+
+            # Flights that have departed are no longer needed
+            next_start = (block + 1) * self.N_block
+            for j in list(arrivals):
+                if arrivals[j][0] + len(arrivals[j][1]) <= next_start:
+                    del arrivals[j]
+            acp.model.dispose()
+            del acp
+
+        self.objective = total_objective
+        return self.objective
+
+
+if __name__ == "__main__":
+    # Two consecutive days of the Schiphol KLM schedule, with the first day's early flights keeping their window
+    data_schiphol = data(data_loc=['data 30_04_2024.xlsx', 'data 30_04_2024.xlsx'])
+    schedule = {i: (row['ETD_minutes'], row['MAX_PAX']) for i, row in data_schiphol.flights.iterrows()}
+    rolling = RollingHorizon(model_name="dynamic_ACP", parameter_settings=parameter_settings, flight_schedule=schedule,
+                             days=data_schiphol.days)
+    print("Objective over all days = ", rolling.solve())
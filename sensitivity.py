@@ -12,6 +12,7 @@ class Sensitivity:
         self.l = l  # Length of the considered time interval [hrs]
         self.parameter_settings = parameter_settings
         self.passenger_scale = passenger_scale
+        self.env = gp.Env()  # One Gurobi environment for all models of the analysis
 
     def sensitivity_analysis(self):
         # Define the range for sensitivity analysis
@@ -31,21 +32,18 @@ class Sensitivity:
             operating_cost_list = []
             max_waiting_time_list = []
 
-            for factor in sensitivity_range:
-                # Apply sensitivity factor to the current parameter
-                parameter_settings_sensitivity = self.apply_sensitivity_factor(param, factor)
-
-                # Initialize and optimize the model
-                acp_optimization = ACP(self.model_name, self.T, self.l, parameter_settings_sensitivity, flight_schedule=flight_schedule, data_schiphol=data(), schiphol_case=True, passenger_scale=self.passenger_scale)
-                
-                acp_optimization.optimize()
-
-                objective, waiting_cost, opening_cost, operating_cost, max_waiting_time = acp_optimization.get_KPI()
-                objective_list.append(objective)
-                waiting_cost_list.append(waiting_cost)
-                opening_cost_list.append(opening_cost)
-                operating_cost_list.append(operating_cost)
-                max_waiting_time_list.append(max_waiting_time)
+            # The models are solved one after the other on a shared environment and disposed once their KPIs are extracted
+            scenarios = (dict(model_name=self.model_name, T=self.T, l=self.l, parameter_settings=self.apply_sensitivity_factor(param, factor),
+                              flight_schedule=flight_schedule, data_schiphol=data(), schiphol_case=True, passenger_scale=self.passenger_scale)
+                         for factor in sensitivity_range)
+            for results in solve_sweep(scenarios, env=self.env):
+                # Scenarios without a solution (e.g. infeasible) have no KPIs, they are kept as NaN so the lists stay aligned with the factors
+                kpi = lambda key: float('nan') if results.get(key) is None else results[key]
+                objective_list.append(kpi('objective'))
+                waiting_cost_list.append(kpi('waiting_cost'))
+                opening_cost_list.append(kpi('opening_cost'))
+                operating_cost_list.append(kpi('operating_cost'))
+                max_waiting_time_list.append(kpi('max_waiting_time'))
 
             print('KPI values for factors:', sensitivity_range)
             print('objective:', objective_list)
@@ -140,3 +138,4 @@ if __name__ == "__main__":
     sensitivity_analysis = Sensitivity(model_name="dynamic_ACP", T=24, l=1/12, parameter_settings=parameter_settings, passenger_scale=passenger_scale)
 
     sensitivity_analysis.sensitivity_analysis()
+    sensitivity_analysis.env.dispose()
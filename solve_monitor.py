@@ -0,0 +1,87 @@
+from Model import *
+import json
+import time
+import numpy as np
+
+# Values of an incumbent (see SolveMonitor.incumbent_KPIs), stop_when takes upper limits on any of them
+KPI_names = ('runtime', 'solution', 'objective', 'bound', 'gap', 'waiting_cost', 'desk_cost', 'max_desks', 'max_queue', 'max_waiting_time')
+
+class SolveMonitor:
+    '''
+    Gurobi callback for ACP.optimize that reports progress while the solve runs. Every new incumbent is
+    streamed with its objective, the best bound, the gap and the KPIs of the plan (waiting and desk costs,
+    longest queue, longest waiting time) to a JSON lines file and/or a Python function. With stop_when the
+    solve is stopped as soon as the incumbent meets all targets, each an upper limit on one of these values,
+    e.g. SolveMonitor(acp, stop_when={'max_waiting_time': 20, 'gap': 0.02}). The best plan found is kept,
+    as for a time limit.
+
+        acp.optimize(callback=SolveMonitor(acp, log_path='progress.jsonl', on_incumbent=print))
+    '''
+    def __init__(self, acp, log_path=None, on_incumbent=None, stop_when=None):
+        self.acp = acp
+        self.log_path = log_path
+        self.on_incumbent = on_incumbent
+        self.stop_when = stop_when if stop_when is not None else {}
+        unknown = [name for name in self.stop_when if name not in KPI_names]
+        if unknown:
+            raise ValueError(f"Unknown stop_when targets {unknown}, options are {', '.join(KPI_names)}")
+        self.incumbents = []
+        self.latest = None  # KPIs of the current incumbent, the gap is updated when the bound moves
+        self.stopped = None
+        if log_path is not None:
+            open(log_path, 'w').close()
+
+    def __call__(self, model, where):
+        if where == GRB.Callback.MIPSOL:
+            objective = model.cbGet(GRB.Callback.MIPSOL_OBJ)
+            bound = model.cbGet(GRB.Callback.MIPSOL_OBJBND)
+            self.latest = self.incumbent_KPIs(model, objective, bound)
+            self.incumbents.append(self.latest)
+            self.report(self.latest)
+            self.check_targets(model, self.latest)
+        elif where == GRB.Callback.MIP and self.latest is not None and 'gap' in self.stop_when:
+            # The bound also moves between incumbents, which can bring the gap under its target
+            bound = model.cbGet(GRB.Callback.MIP_OBJBND)
+            if bound > self.latest['bound'] + 1e-9:
+                self.latest = dict(self.latest, bound=bound, gap=self.gap(self.latest['objective'], bound),
+                                   runtime=model.cbGet(GRB.Callback.RUNTIME))
+                self.check_targets(model, self.latest)
+
+    @staticmethod
+    def gap(objective, bound):
+        return abs(objective - bound) / max(abs(objective), 1e-10)
+
+    def incumbent_KPIs(self, model, objective, bound):
+        waiting_cost, opening_cost, operating_cost = self.acp.cost_breakdown(model.cbGetSolution)
+        q_values = self.acp.interval_totals(self.acp.q, model.cbGetSolution)
+        I_values = self.acp.interval_totals(self.acp.I, model.cbGetSolution)
+        return {
+            'runtime': model.cbGet(GRB.Callback.RUNTIME),
+            'solution': model.cbGet(GRB.Callback.MIPSOL_SOLCNT),
+            'objective': objective, 'bound': bound, 'gap': self.gap(objective, bound),
+            'waiting_cost': waiting_cost, 'desk_cost': opening_cost + operating_cost,
+            'max_desks': float(max(model.cbGetSolution(list(self.acp.B.values())))),
+            'max_queue': float(I_values.max()),
+            'max_waiting_time': (get_longest_queue_time(np.rint(q_values).tolist(), np.rint(I_values).tolist(), plot=False) or 0) * self.acp.t_interval,  # [min]
+        }
+
+    def report(self, kpis):
+        if self.log_path is not None:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(kpis) + '\n')
+        if self.on_incumbent is not None:
+            self.on_incumbent(kpis)
+
+    def check_targets(self, model, kpis):
+        if self.stop_when and self.stopped is None and all(kpis[name] <= target for name, target in self.stop_when.items()):
+            self.stopped = dict(kpis, reason='targets met')
+            print(f"Targets {self.stop_when} met after {kpis['runtime']:.1f}s, stopping the solve")
+            model.terminate()
+
+
+if __name__ == "__main__":
+    acp = ACP(model_name="dynamic_ACP", T=24, l=1 / 12, parameter_settings=parameter_settings, data_schiphol=data(), schiphol_case=True)
+    monitor = SolveMonitor(acp, log_path='solve_progress.jsonl', stop_when={'max_waiting_time': 20, 'gap': 0.02},
+                           on_incumbent=lambda kpis: print(f"Incumbent {kpis['objective']:.0f}, gap {kpis['gap']:.2%}, "
+                                                           f"longest wait {kpis['max_waiting_time']} min"))
+    acp.optimize(callback=monitor)
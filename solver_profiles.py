@@ -0,0 +1,162 @@
+'''
+Named Gurobi solve profiles for ACP.optimize and an autotuner that picks the best settings for a set of
+representative ACP instances. Tuned profiles are stored in solver_profiles.json and can be used by name
+afterwards, e.g. acp.optimize(profile='tuned').
+'''
+import argparse
+import itertools
+import json
+import os
+import time
+from gurobipy import GRB
+
+cpu_threads = os.cpu_count() or 1  # Cores of this machine
+
+solver_profiles = {
+    # Quick answer for daily planning, stops at a 5% gap or after one minute
+    'fast': {'TimeLimit': 60, 'MIPGap': 0.05, 'Threads': min(4, cpu_threads), 'MIPFocus': 1, 'Heuristics': 0.2},
+    # Default for scenario runs
+    'balanced': {'TimeLimit': 300, 'MIPGap': 0.01, 'Threads': min(8, cpu_threads), 'MIPFocus': 0, 'Heuristics': 0.05},
+    # Proven optimum, no time limit
+    'exact': {'TimeLimit': GRB.INFINITY, 'MIPGap': 1e-4, 'Threads': cpu_threads, 'MIPFocus': 2, 'Heuristics': 0.05},
+}
+
+profiles_loc = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'solver_profiles.json')
+
+# Parameters searched by the local grid search
+tuning_grid = {
+    'MIPFocus': [0, 1, 2, 3],
+    'Heuristics': [0.05, 0.2, 0.5],
+    'Cuts': [-1, 2],
+}
+
+
+def load_stored_profiles(path=profiles_loc):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def worker_threads(workers):
+    # Gurobi threads for each of workers parallel solves on this machine, so together they use the cores once
+    return max(1, cpu_threads // max(1, workers))
+
+
+def get_profile(profile, path=profiles_loc, threads=None):
+    # Parameters of a named profile (built-in or stored by the tuner), a dict is used as is. threads overrides the
+    # thread cap of the profile, e.g. worker_threads(workers) for parallel workers
+    if profile is None:
+        params = {}
+    elif isinstance(profile, dict):
+        params = dict(profile)
+    else:
+        stored = load_stored_profiles(path)
+        if profile in stored:
+            params = dict(stored[profile])
+        elif profile in solver_profiles:
+            params = dict(solver_profiles[profile])
+        else:
+            raise ValueError(f"Unknown solver profile '{profile}', options are {sorted(set(solver_profiles) | set(stored))}")
+    if threads is not None:
+        params['Threads'] = threads
+    return params
+
+
+def store_profile(name, params, path=profiles_loc):
+    stored = load_stored_profiles(path)
+    stored[name] = params
+    with open(path, 'w') as f:
+        json.dump(stored, f, indent=4)
+
+
+def grid_search(acps, base_params, grid=tuning_grid):
+    # Runs every combination of the grid on every instance within the base time limit
+    results = []
+    names = list(grid)
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(base_params, **dict(zip(names, values)))
+        runs = []
+        for acp in acps:
+            acp.model.reset()
+            for name, value in params.items():
+                acp.model.setParam(name, value)
+            acp.model.optimize()
+            runs.append((acp, acp.model.ObjVal if acp.model.SolCount else None, acp.model.Runtime))
+        results.append((params, runs))
+        print(f"Tried {dict(zip(names, values))}")
+
+    # Best objective per instance over the whole grid is the reference for scoring
+    references = [min((runs[i][1] for _, runs in results if runs[i][1] is not None), default=None) for i in range(len(acps))]
+    best_params, best_score = None, None
+    for params, runs in results:
+        gaps = [float('inf') if objective is None or reference is None else abs(objective - reference) / max(abs(reference), 1e-9)
+                for (_, objective, _), reference in zip(runs, references)]
+        score = (sum(gaps) / len(gaps), sum(runtime for _, _, runtime in runs) / len(runs))
+        if best_score is None or score < best_score:
+            best_params, best_score = params, score
+    print(f"Best grid settings {best_params} with mean gap to best {best_score[0]:.4f} and mean runtime {best_score[1]:.1f}s")
+    return best_params
+
+
+def gurobi_tune(acp, base_params, tune_time_limit):
+    # Gurobi's own tuner on one representative instance
+    for name, value in base_params.items():
+        acp.model.setParam(name, value)
+    acp.model.setParam('TuneTimeLimit', tune_time_limit)
+    acp.model.setParam('TuneResults', 1)
+    acp.model.tune()
+    if acp.model.TuneResultCount == 0:
+        print("Gurobi tuner found no improvement, keeping the base profile")
+        return dict(base_params)
+    acp.model.getTuneResult(0)
+    tuned = dict(base_params)
+    for name in ('MIPFocus', 'Heuristics', 'Cuts', 'Presolve', 'Symmetry', 'VarBranch', 'NoRelHeurTime', 'Method'):
+        value = acp.model.getParamInfo(name)
+        if value[2] != value[5]:  # current value differs from the default
+            tuned[name] = value[2]
+    return tuned
+
+
+def autotune(acps, base_profile='fast', method='grid', name='tuned', tune_time_limit=600, path=profiles_loc):
+    start = time.time()
+    base_params = get_profile(base_profile)
+    base_params['OutputFlag'] = 0
+    if method == 'gurobi':
+        best = gurobi_tune(acps[0], base_params, tune_time_limit)
+    else:
+        best = grid_search(acps, base_params)
+    best.pop('OutputFlag', None)
+    store_profile(name, best, path)
+    print(f"Stored profile '{name}' = {best} after {time.time() - start:.0f}s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Autotune Gurobi parameters for representative ACP instances')
+    parser.add_argument('--instances', nargs='+', default=['schiphol'], help="'schiphol' and/or benchmark case names")
+    parser.add_argument('--model', default='dynamic_ACP', choices=['dynamic_ACP', 'static_ACP'])
+    parser.add_argument('--base-profile', default='fast')
+    parser.add_argument('--method', default='grid', choices=['grid', 'gurobi'])
+    parser.add_argument('--name', default='tuned')
+    parser.add_argument('--tune-time-limit', type=float, default=600, help='Total time for the Gurobi tuner [s]')
+    args = parser.parse_args()
+
+    import matplotlib
+    matplotlib.use('Agg')
+    from Model import ACP, data, parameter_settings
+    from benchmark import benchmark_cases, benchmark_parameter_settings, synthetic_schedule
+
+    acps = []
+    for instance in args.instances:
+        if instance == 'schiphol':
+            acps.append(ACP(args.model, 24, 1 / 12, parameter_settings, data_schiphol=data(), schiphol_case=True))
+        else:
+            case = benchmark_cases[instance]
+            schedule = synthetic_schedule(case['flights'], case['min_pax'], case['max_pax'], case['T'])
+            acps.append(ACP(args.model, case['T'], case['l'], dict(benchmark_parameter_settings, C=case['C']), flight_schedule=schedule))
+    autotune(acps, args.base_profile, args.method, args.name, args.tune_time_limit)
+
+
+if __name__ == "__main__":
+    main()
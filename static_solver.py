@@ -0,0 +1,144 @@
+from demand_analytics import DemandAnalytics
+from KPI_calculations import get_longest_queue_time
+from scipy.optimize import linprog
+from scipy.sparse import coo_matrix
+import time
+import numpy as np
+
+
+class StaticSolver:
+    '''
+    Solves the static_ACP without Gurobi. The static model only has the queue dynamics of every flight under
+    the capacity C[t] of each interval; x[j, t] is in no constraint and is 0 in every optimum. With one service
+    time p for all flights the capacity is a whole number of passengers floor(C[t] / p) per interval, and:
+    - with one queue cost h for all flights, earliest last check-in first (EDF) with all capacity used is
+      optimal: it serves the most passengers possible by every interval, so the total queue is the smallest
+      possible in every interval, and EDF meets all last check-ins whenever any plan does;
+    - with queue costs per flight it is a min-cost flow (queue arcs between the intervals of a flight, service
+      arcs into the capacity of each interval), so the LP has integral vertices and the simplex solution is
+      an optimal integer plan.
+    Service times per flight make the capacity rows weighted and the LP fractional, that case needs the MIP.
+    A fixed desk plan can still be evaluated with them (evaluate_plan): EDF then serves service time.
+    '''
+    def __init__(self, flight_schedule, passenger_flow, parameter_settings, T=24, l=1/12, time_varying=None):
+        self.analytics = DemandAnalytics(flight_schedule, passenger_flow, parameter_settings, T, l, time_varying=time_varying)
+        self.J = self.analytics.J
+        self.N = self.analytics.N
+        self.windows = self.analytics.windows
+        self.q = None
+        self.I = None
+        self.objective = None
+        self.status = None
+        self.runtime = None
+
+    @classmethod
+    def from_acp(cls, acp):
+        # Same demand and settings as a built ACP, e.g. to compare with the MIP
+        return cls(acp.flight_schedule, (acp.d, [acp.I0[j] for j in range(acp.J)]), acp.parameter_settings, acp.T, acp.l,
+                   acp.time_varying)
+
+    def capacity(self, desks=None):
+        # Service time per interval, of C or, for a given desk plan, of the desks open (as in CapacityLimit_dynamic)
+        return self.analytics.C if desks is None else np.minimum(self.analytics.C, self.analytics.l_param * np.asarray(desks))
+
+    def solve(self, method='auto'):
+        # method 'edf' (one queue cost), 'flow' (queue costs per flight) or 'auto' to pick the fastest exact one
+        start_time = time.perf_counter()
+        h = self.analytics.h
+        p = self.analytics.p
+        if not np.allclose(p, p[0]):
+            raise ValueError("StaticSolver needs one service time p for all flights, solve this static_ACP with the MIP")
+        if method == 'auto':
+            method = 'edf' if np.allclose(h, h[0]) else 'flow'
+        if method == 'edf':
+            self.solve_edf()
+        elif method == 'flow':
+            self.solve_flow()
+        else:
+            raise ValueError(f"Unknown method '{method}', options are 'auto', 'edf' and 'flow'")
+        self.runtime = time.perf_counter() - start_time
+        if self.status == 'optimal':
+            self.objective = float((h[:, None] * self.I).sum())
+        return self.objective
+
+    def solve_edf(self, desks=None):
+        capacity = self.capacity(desks)
+        D = self.analytics.D
+        order = np.lexsort((np.arange(self.J), self.windows.end))  # Earliest last check-in first, then flight index
+        p = self.analytics.p[order]
+        mask = self.windows.mask()[order]
+        end = self.windows.end[order]
+        queue = np.zeros(self.J)
+        self.q = np.zeros((self.J, self.N))
+        self.I = np.zeros((self.J, self.N))
+        for t in range(self.N):
+            queue += D[order, t]
+            work = np.where(mask[:, t], p * queue, 0)
+            before = np.cumsum(work) - work  # Service time of flights with an earlier last check-in
+            served = np.where(mask[:, t], np.minimum(queue, np.floor(np.maximum(0, capacity[t] - before) / p + 1e-9)), 0)
+            queue -= served
+            self.q[order, t] = served
+            self.I[order, t] = np.where(mask[:, t], queue, 0)
+            # Passengers still waiting at the last check-in of their flight miss it and no longer take capacity
+            queue[end == t] = 0
+        # EDF misses a last check-in only if no plan can meet it
+        self.status = 'infeasible' if (self.I[self.analytics.deadline, self.windows.end[self.analytics.deadline]] > 0).any() else 'optimal'
+
+    def solve_flow(self):
+        capacity = np.floor(self.capacity() / self.analytics.p[0] + 1e-9)  # Passengers per interval
+        flight_index, time_index = self.windows.indices()
+        K = len(flight_index)
+        first = np.r_[True, flight_index[1:] != flight_index[:-1]]  # First interval of each window
+        previous = np.flatnonzero(~first)
+
+        # Variables [q, I] per window key; I[k] - I[k - 1] + q[k] = D[k]
+        rows = np.concatenate((np.arange(K), np.arange(K), previous))
+        cols = np.concatenate((np.arange(K), K + np.arange(K), K + previous - 1))
+        values = np.concatenate((np.ones(K), np.ones(K), -np.ones(len(previous))))
+        A_eq = coo_matrix((values, (rows, cols)), shape=(K, 2 * K)).tocsr()
+        b_eq = self.analytics.D[flight_index, time_index]
+        A_ub = coo_matrix((np.ones(K), (time_index, np.arange(K))), shape=(self.N, 2 * K)).tocsr()
+
+        # The queue is empty at the last check-in of flights that close in the horizon
+        last = np.r_[first[1:], True]  # Last interval of each window
+        upper = np.full(2 * K, np.inf)
+        upper[K + np.flatnonzero(last & self.analytics.deadline[flight_index])] = 0
+        cost = np.concatenate((np.zeros(K), self.analytics.h[flight_index]))
+
+        # Dual simplex returns a vertex, which is integral for this network matrix
+        result = linprog(cost, A_ub=A_ub, b_ub=capacity, A_eq=A_eq, b_eq=b_eq, bounds=np.column_stack((np.zeros(2 * K), upper)),
+                         method='highs-ds')
+        if result.status != 0:
+            self.status = 'infeasible'
+            return
+        solution = np.rint(result.x)
+        self.q = np.zeros((self.J, self.N))
+        self.I = np.zeros((self.J, self.N))
+        self.q[flight_index, time_index] = solution[:K]
+        self.I[flight_index, time_index] = solution[K:]
+        self.status = 'optimal'
+
+    def evaluate_plan(self, desks):
+        # Serves the demand with a fixed desk plan B[t], earliest last check-in first. Passengers still waiting at the
+        # last check-in of their flight miss it instead of making the plan infeasible
+        self.solve_edf(desks)
+        deadline = self.analytics.deadline
+        missed = float(self.I[deadline, self.windows.end[deadline]].sum())
+        waiting_cost = float((self.analytics.h[:, None] * self.I).sum())
+        max_waiting_time = get_longest_queue_time(self.q.sum(axis=0).tolist(), self.I.sum(axis=0).tolist(), plot=False)
+        return {'waiting_cost': waiting_cost, 'missed': missed, 'max_waiting_time': (max_waiting_time or 0) * self.analytics.t_interval}
+
+    def get_KPI(self, plot=False):
+        # Same values as ACP.get_KPI of the static model, the opening costs of x are always 0
+        max_waiting_time = get_longest_queue_time(self.q.sum(axis=0).tolist(), self.I.sum(axis=0).tolist(), plot=plot)
+        return self.objective, self.objective, 0.0, 0.0, max_waiting_time
+
+
+if __name__ == "__main__":
+    from data import data
+    parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 400, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+    data_schiphol = data()
+    schedule = {i: (row['ETD_minutes'], row['MAX_PAX']) for i, row in data_schiphol.flights.iterrows()}
+    static = StaticSolver(schedule, (data_schiphol.d, data_schiphol.too_early), parameter_settings)
+    static.solve()
+    print(f"Static plan: {static.status}, objective {static.objective} in {static.runtime:.3f}s")
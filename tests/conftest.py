@@ -0,0 +1,9 @@
+import os
+import sys
+import matplotlib
+matplotlib.use('Agg')  # Plots of the modules under test are never shown
+
+# The modules live in the repository root and read their workbook relative to it
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root)
@@ -0,0 +1,18 @@
+import json
+from batch import completed_runs, expand_runs, scenario_defaults
+
+
+def test_resume_retries_failed_runs(tmp_path):
+    path = str(tmp_path / 'results.jsonl')
+    with open(path, 'w') as f:
+        for result in ({'run_id': 'solved', 'objective': 10.0}, {'run_id': 'failed', 'error': 'boom'},
+                       {'run_id': 'no_solution', 'objective': None, 'status': 3}):
+            f.write(json.dumps(result) + '\n')
+    assert completed_runs(path) == {'solved'}
+    assert completed_runs(str(tmp_path / 'missing.jsonl')) == set()
+
+
+def test_expand_runs_covers_the_grid():
+    scenario = {**scenario_defaults, 'passenger_scales': [0.8, 1.0], 'seeds': [0, 1], 'sensitivity': {'s_open': [0.5, 1.5]}}
+    runs = expand_runs(scenario)
+    assert len({run['run_id'] for run in runs}) == len(runs) == 3 * 2 * 2
@@ -0,0 +1,88 @@
+import datetime
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from data import CheckinWindows, data
+
+
+def test_checkin_windows_are_clipped_to_the_horizon():
+    # Departures at 02:00 (window opens before the horizon), 10:00 and 23:50 (last check-in after the horizon end at 20:00)
+    windows = CheckinWindows([120, 600, 1430], t_interval=5, N=240)
+    assert windows.first.tolist() == [-24, 72, 238]
+    assert windows.start.tolist() == [0, 72, 238]
+    assert windows.end.tolist() == [15, 111, 239]
+    assert windows.length.tolist() == [16, 40, 2]
+    assert [windows.closes_in_horizon(j) for j in range(3)] == [True, True, False]
+
+
+def test_checkin_window_index_views_agree():
+    windows = CheckinWindows([120, 600, 1430], t_interval=5, N=240)
+    flight_index, time_index = windows.indices()
+    assert len(flight_index) == windows.length.sum()
+    assert windows.keys() == sorted(windows.keys())  # By flight, then time
+    mask = windows.mask()
+    assert mask.sum() == len(flight_index) and mask[flight_index, time_index].all()
+    flights_at = windows.flights_at()
+    assert len(flights_at) == 240
+    assert all(mask[j, t] for t, flights in enumerate(flights_at) for j in flights)
+    assert sum(len(flights) for flights in flights_at) == mask.sum()
+
+
+def test_largest_remainder_keeps_the_row_totals():
+    values = np.array([[0.5, 0.5, 1.0], [1.4, 1.4, 0.2], [2.0, 0.0, 0.0]])
+    rounded = data.largest_remainder(values, values.sum(axis=1))
+    assert rounded.tolist() == [[1, 0, 1], [2, 1, 0], [2, 0, 0]]
+    assert rounded.dtype.kind == 'i'
+
+
+def test_expected_arrivals_keep_the_passengers_of_every_flight():
+    schedule = {0: (30, 120), 1: (600, 250), 2: (1435, 200), 3: (900, 0)}
+    pax_dist, too_early = data.expected_arrivals(schedule)
+    windows = CheckinWindows.from_schedule(schedule)
+    assert (pax_dist[~windows.mask()] == 0).all()
+    for j, (_, passengers) in schedule.items():
+        assert pax_dist[j].sum() + too_early[j] <= passengers
+    # Flight 1: arrivals N(480, 90) minutes, window [360, 560), rounded within one passenger
+    assert abs(too_early[1] - 250 * norm.cdf(-120 / 90)) < 1
+    assert abs(pax_dist[1].sum() - 250 * (norm.cdf(80 / 90) - norm.cdf(-120 / 90))) < 1
+    assert pax_dist[3].sum() == 0 and too_early[3] == 0
+
+
+def test_expected_demand_is_cached_and_copied():
+    schedule = {0: (600, 100), 1: (700, 80)}
+    d, too_early = data.flights_to_d(schedule, expected=True)
+    d[next(iter(d))] += 1000
+    again, _ = data.flights_to_d(schedule, expected=True)
+    assert sum(again.values()) == sum(d.values()) - 1000
+    # Per flight arrival profiles, e.g. of passenger classes
+    early, _ = data.flights_to_d(schedule, mean_early_t=[180, 120], expected=True)
+    assert early != again
+    # Only the most recent schedules are kept
+    for etd in range(300, 400):
+        data.expected_arrivals({0: (etd, 50)})
+    assert data.cached_expected_arrivals.cache_info().currsize <= data.cached_expected_arrivals.cache_info().maxsize
+    data.cached_expected_arrivals.cache_clear()
+    assert data.cached_expected_arrivals.cache_info().currsize == 0
+
+
+def test_expected_demand_is_the_mean_of_the_samples():
+    schedule = {0: (600, 200)}
+    expected, _ = data.flights_to_d(schedule, expected=True)
+    np.random.seed(0)
+    samples = [data.flights_to_d(schedule)[0] for _ in range(300)]
+    mean = {key: np.mean([sample[key] for sample in samples]) for key in expected}
+    assert max(abs(mean[key] - expected[key]) for key in expected) < 1.5
+
+
+def test_desk_settings_before_the_first_row_keep_the_day_before():
+    # Two days without lead-in: day 0 sets C from 06:00 and 18:00, day 1 only from 08:00
+    workbook = data.__new__(data)
+    workbook.flights = pd.DataFrame()
+    workbook.lead_in_m, workbook.days, workbook.t_interval, workbook.tot_m = 0, 2, 60, 2 * 24 * 60
+    workbook.desk_settings = [pd.DataFrame({'FROM': [datetime.time(18), datetime.time(6)], 'C': [2, 5]}),
+                              pd.DataFrame({'FROM': [datetime.time(8)], 'C': [7]})]
+    C = workbook.time_varying_settings()['C']
+    assert np.isnan(C[:6]).all()  # Before the first row of the first day: the scalar of parameter_settings
+    assert (C[6:18] == 5).all() and (C[18:24] == 2).all()
+    assert (C[24:32] == 2).all()  # Carried over from the evening before, not wrapped to the same day
+    assert (C[32:] == 7).all()
@@ -0,0 +1,45 @@
+import contextlib
+import io
+import numpy as np
+import pytest
+from Model import ACP
+from demand_analytics import DemandAnalytics
+
+parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 1, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+
+
+def test_window_work_sums_the_demand_due_in_the_window():
+    # Windows 12-51 and 26-65, 5 minute intervals, one passenger per interval per desk
+    schedule = {0: (300, 20), 1: (370, 10)}
+    d = {(0, 20): 5, (1, 30): 4, (1, 60): 6}
+    analytics = DemandAnalytics(schedule, (d, [15, 0]), parameter_settings)
+    work = analytics.window_work()
+    assert work[0, analytics.N - 1] == pytest.approx(30)
+    assert work[0, 51] == pytest.approx(20)  # Flight 1 is not due yet
+    assert work[13, 51] == pytest.approx(5)  # The 15 early passengers arrive at the window start 12
+    assert work[31, 65] == pytest.approx(6)
+    assert not np.tril(work, -1).any()
+
+
+def test_required_desks_of_the_busiest_window():
+    # 20 passengers in the last 10 intervals of a window need two desks
+    schedule = {0: (300, 20)}
+    analytics = DemandAnalytics(schedule, ({(0, 42): 20}, [0]), dict(parameter_settings, C=3))
+    desks, (a, b) = analytics.required_desks()
+    assert desks == 2
+    assert (a, b) == (42, 51)
+    assert analytics.capacity_shortfall() == []
+    assert DemandAnalytics(schedule, ({(0, 42): 20}, [0]), parameter_settings).capacity_shortfall()
+
+
+@pytest.mark.parametrize('model_name', ['static_ACP', 'dynamic_ACP'])
+def test_lower_bound_is_below_the_mip_objective(model_name):
+    settings = dict(parameter_settings, C=3)
+    np.random.seed(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        acp = ACP(model_name, 12, 1 / 4, settings, flight_schedule={0: (400, 40), 1: (450, 60), 2: (600, 30)})
+        acp.optimize(OutputFlag=0)
+    analytics = DemandAnalytics.from_acp(acp)
+    bound = analytics.lower_bound(model_name)
+    assert 0 <= bound <= acp.objective + 1e-6
+    assert analytics.D.sum() == pytest.approx(sum(acp.d.values()) + sum(acp.I0[j] for j in range(acp.J)))
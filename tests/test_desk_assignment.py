@@ -0,0 +1,39 @@
+import contextlib
+import io
+import numpy as np
+import pytest
+from Model import ACP
+from desk_assignment import DeskRoster
+
+parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 6, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+flight_schedule = {0: (400, 40), 1: (450, 60), 2: (600, 30)}
+
+
+def solved_acp(model_name):
+    np.random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        acp = ACP(model_name, 12, 1 / 4, parameter_settings, flight_schedule=flight_schedule)
+        acp.optimize(OutputFlag=0)
+    return acp
+
+
+def test_roster_never_double_books_a_counter():
+    acp = solved_acp('dynamic_ACP')
+    roster = DeskRoster(acp)
+    with contextlib.redirect_stdout(io.StringIO()):
+        assignments = roster.assign()
+    assert assignments['counter'].between(0, parameter_settings['C'] - 1).all()
+    # Every open desk is rostered once, to a flight or as unassigned
+    counters = assignments.groupby('interval')['counter'].nunique().reindex(range(acp.N), fill_value=0).to_numpy()
+    assert (counters == roster.B).all()
+    # Flights only share a counter in intervals with more flights checking in than open desks
+    flights = assignments.dropna(subset=['flight']).groupby('interval')['flight'].nunique().reindex(range(acp.N), fill_value=0).to_numpy()
+    shared = assignments[assignments.duplicated(['interval', 'counter'], keep=False)]['interval'].unique()
+    assert (flights[shared] > roster.B[shared]).all()
+    served = assignments.dropna(subset=['flight']).groupby('flight')['passengers'].sum()
+    assert np.allclose(served.to_numpy(), roster.q.sum(axis=1)[served.index.to_numpy()])
+
+
+def test_roster_rejects_static_models():
+    with pytest.raises(ValueError):
+        DeskRoster(solved_acp('static_ACP'))
@@ -0,0 +1,14 @@
+import contextlib
+import io
+from Model import solve_sweep
+
+parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 3, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+
+
+def test_sweep_scenario_without_passengers_has_no_waiting_time():
+    scenarios = [dict(model_name='dynamic_ACP', T=12, l=1 / 4, parameter_settings=parameter_settings,
+                      flight_schedule={0: (400, 0)})]
+    with contextlib.redirect_stdout(io.StringIO()):
+        results, = solve_sweep(scenarios, OutputFlag=0)
+    assert results['objective'] == 0
+    assert results['max_waiting_time'] == 0
@@ -0,0 +1,39 @@
+import contextlib
+import io
+import numpy as np
+import pytest
+from model_cache import ModelCache
+
+parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 3, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+schedule = {0: (400, 40), 1: (450, 60)}
+
+
+def test_cached_model_keeps_the_callers_random_stream(tmp_path):
+    cache = ModelCache(str(tmp_path))
+    np.random.seed(7)
+    expected = np.random.rand(3)
+    np.random.seed(7)
+    with contextlib.redirect_stdout(io.StringIO()):
+        built = cache.get('dynamic_ACP', 12, 1 / 4, parameter_settings, schedule, seed=3)
+    assert np.random.rand(3) == pytest.approx(expected)
+
+    # A second request loads the same model from disk
+    with contextlib.redirect_stdout(io.StringIO()):
+        loaded = cache.get('dynamic_ACP', 12, 1 / 4, parameter_settings, schedule, seed=3)
+    assert loaded.d == built.d
+    assert loaded.model.NumConstrs == built.model.NumConstrs
+
+
+def test_build_options_are_part_of_the_key(tmp_path):
+    base = ModelCache.key('dynamic_ACP', 12, 1 / 4, parameter_settings, schedule)
+    options = [dict(formulation='tight'), dict(hygiene=True), dict(time_varying={'p': np.array([1.0, 2.0])}),
+               dict(expected_demand=True), dict(passenger_classes={'priority': {'share': 0.2}, 'economy': {}}),
+               dict(initial_queue={0: 5}), dict(initial_desks=2)]
+    keys = {ModelCache.key('dynamic_ACP', 12, 1 / 4, parameter_settings, schedule, **option) for option in options}
+    assert len(keys) == len(options) and base not in keys
+
+    cache = ModelCache(str(tmp_path))
+    with contextlib.redirect_stdout(io.StringIO()):
+        acp = cache.get('dynamic_ACP', 12, 1 / 4, parameter_settings, schedule, initial_desks=2)
+        loaded = cache.get('dynamic_ACP', 12, 1 / 4, parameter_settings, schedule, initial_desks=2)
+    assert acp.initial_desks == loaded.initial_desks == 2
@@ -0,0 +1,35 @@
+import contextlib
+import io
+import numpy as np
+import pytest
+from Model import ACP
+
+parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 6, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+flight_schedule = {0: (400, 40), 1: (450, 60), 2: (600, 30)}
+
+
+def solve(model_name, hygiene, **kwargs):
+    np.random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        acp = ACP(model_name, 12, 1 / 4, parameter_settings, flight_schedule=flight_schedule, hygiene=hygiene, **kwargs)
+        acp.optimize(OutputFlag=0)
+    return acp
+
+
+@pytest.mark.parametrize('model_name', ['static_ACP', 'dynamic_ACP'])
+@pytest.mark.parametrize('formulation', ['indicator', 'tight'])
+def test_hygiene_pass_keeps_the_optimum(model_name, formulation):
+    checked = solve(model_name, True, formulation=formulation)
+    plain = solve(model_name, False, formulation=formulation)
+    assert checked.objective == pytest.approx(plain.objective)
+    assert checked.model.NumConstrs <= plain.model.NumConstrs
+
+
+def test_builder_leaves_out_the_redundant_rows():
+    # The known duplicate, dominated and single variable families are not emitted at all
+    acp = solve('dynamic_ACP', False)
+    names = {constr.ConstrName.partition('[')[0] for constr in acp.model.getConstrs()}
+    assert not names & {'OperatingCost', 'CapacityLimit', 'EnterQueueLimit'}
+    checked = solve('dynamic_ACP', True)
+    removed = {kind: families for kind, families in checked.hygiene_report.items() if isinstance(families, dict) and kind != 'columns_fixed'}
+    assert not removed
@@ -0,0 +1,19 @@
+import numpy as np
+from online import OnlineACP
+
+parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 3, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+
+
+def test_early_arrivals_count_once_in_the_forecast_ratio():
+    # Window 12-51: the forecast has 10 passengers before it opens and 10 at the start, the feed sees exactly that
+    forecast = ({(0, 12): 10, (0, 30): 20}, [10])
+    online = OnlineACP('dynamic_ACP', parameter_settings, {'KL1001': (300, 40)}, forecast=forecast)
+    online.execute_interval(5, {'KL1001': 10})
+    remaining, early = online.remaining_forecast(12)
+    assert early[0] == 10  # The window has not opened, no ratio yet
+    for t in range(6, 13):
+        online.execute_interval(t, {'KL1001': 10} if t == 12 else {})
+    remaining, early = online.remaining_forecast(13)
+    assert early[0] == 10
+    assert remaining[0, 30 - 13] == 20
+    assert online.queue[0] == 20
@@ -0,0 +1,98 @@
+import contextlib
+import datetime
+import io
+import numpy as np
+import openpyxl
+import pytest
+from Model import ACP
+from data import data, PassengerClasses
+from desk_assignment import DeskRoster
+from robustness import RobustnessAnalysis
+
+classes = {'priority': {'share': 0.2, 'p': 0.5, 'h0': 40, 'mean_early_t': 90},
+           'bag_drop': {'share': 0.3, 'dedicated': True, 'arrival_std': 1},
+           'economy': {}}
+parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 6, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+flight_schedule = {0: (400, 31), 1: (500, 47), 2: (600, 20)}
+
+
+def test_expand_keeps_the_passengers_of_every_flight():
+    passenger_classes = PassengerClasses(classes)
+    queues = passenger_classes.expand(flight_schedule)
+    assert len(queues) == 3 * len(flight_schedule)
+    for i, (etd, pax) in flight_schedule.items():
+        assert sum(queues[3 * i + k][1] for k in range(3)) == pax
+        assert all(queues[3 * i + k][0] == etd for k in range(3))
+    assert np.allclose(passenger_classes.shares(3)[2], 0.5)  # economy takes the rest
+    assert passenger_classes.class_of(2).tolist() == [0, 1, 2, 0, 1, 2]
+    assert passenger_classes.flight_of(2).tolist() == [0, 0, 0, 1, 1, 1]
+
+
+def test_queue_settings_fall_back_to_the_flight():
+    passenger_classes = PassengerClasses(classes)
+    assert passenger_classes.queue_values('p', 2, [2.0, 3.0]).tolist() == [0.5, 2.0, 2.0, 0.5, 3.0, 3.0]
+    time_varying = passenger_classes.expand_time_varying({'C': np.ones(4)}, 2)
+    assert np.isnan(time_varying['p'][1]) and time_varying['h0'][0] == 40
+    assert time_varying['C'].tolist() == [1, 1, 1, 1]
+
+
+def test_invalid_classes_are_rejected():
+    with pytest.raises(ValueError):
+        PassengerClasses({'priority': {'shares': 0.2}})
+    with pytest.raises(ValueError):
+        PassengerClasses({'priority': {'share': 0.5}, 'economy': {'share': 0.6}}).shares(1)
+    with pytest.raises(ValueError):
+        PassengerClasses({'priority': {}, 'economy': {}}).shares(1)
+
+
+def test_class_shares_from_workbook_columns(tmp_path):
+    # Departure times as time cells, like the Schiphol workbooks
+    path = str(tmp_path / 'schedule.xlsx')
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.append(['CARGO', 'AIRCRAFT', 'AIRLINE', 'ETD', 'PRIORITY_PAX'])
+    sheet.append([None, 'AIRBUS A321 NEO', 'KLM', datetime.time(8, 0), 22])
+    sheet.append([None, 'EMBRAER170', 'KLM', datetime.time(12, 30), 19])
+    for cell in sheet['D'][1:]:
+        cell.number_format = 'hh:mm'
+    workbook.save(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        schiphol = data(data_loc=path, passenger_classes={'priority': {'h0': 40}, 'economy': {}})
+    assert schiphol.flights['PRIORITY_PAX'].tolist() == [22, 19]
+    assert schiphol.flight_schedule() == {0: (480, 22), 1: (480, 198), 2: (750, 19), 3: (750, 57)}
+    assert schiphol.windows.J == 4
+
+
+def solved_acp():
+    np.random.seed(0)
+    with contextlib.redirect_stdout(io.StringIO()):
+        acp = ACP('dynamic_ACP', 12, 1 / 4, parameter_settings, flight_schedule=flight_schedule, passenger_classes=classes)
+        acp.optimize(OutputFlag=0)
+    return acp
+
+
+def test_robustness_moves_the_classes_of_a_flight_together():
+    acp = solved_acp()
+    robustness = RobustnessAnalysis(acp, random_scale=15, n_samples=4)
+    with contextlib.redirect_stdout(io.StringIO()):
+        robustness.evaluate()
+        worst = robustness.resolve_worst(1)
+    schedule = robustness.schedule(robustness.etds[0])
+    assert all(schedule[j][0] == robustness.etds[0][acp.flight_of[j]] for j in schedule)
+    # Every desk group is served by its own desks. EDF is one way to serve the plan, the MIP the cheapest for the
+    # class service times and queue costs
+    results = acp.extract_results()
+    assert robustness.nominal['waiting_cost'] >= results['waiting_cost'] - 1e-6
+    assert robustness.nominal['missed'] == 0
+    assert robustness.samples[['waiting_cost', 'missed', 'max_waiting_time']].notna().all().all()
+    assert (robustness.samples['total_cost'] >= robustness.samples['waiting_cost']).all()
+    assert acp.p.tolist() == [0.5, 1, 1] * 3 and acp.h.tolist() == [40 * 3, 10 * 3, 10 * 3] * 3  # 15 minute intervals
+    assert len(worst) == 1
+    with pytest.raises(ValueError):
+        DeskRoster(acp)
+
+
+def test_acp_without_flights_builds():
+    with contextlib.redirect_stdout(io.StringIO()):
+        acp = ACP('dynamic_ACP', 2, 1 / 4, parameter_settings, flight_schedule={}, passenger_flow=({}, []))
+    assert acp.J == 0 and len(acp.B_class) == 0
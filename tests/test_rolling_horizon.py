@@ -0,0 +1,16 @@
+import contextlib
+import io
+import numpy as np
+import pytest
+from rolling_horizon import RollingHorizon
+
+parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 2, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+
+
+def test_block_without_a_solution_is_reported():
+    # Two desks cannot check in 300 passengers of the evening flight before its last check-in
+    np.random.seed(0)
+    rolling = RollingHorizon('dynamic_ACP', parameter_settings, {0: (400, 20), 1: (1000, 300)}, days=1, l=1 / 4, block_hours=12)
+    with contextlib.redirect_stdout(io.StringIO()), pytest.raises(RuntimeError, match='Block 2/2'):
+        rolling.solve()
+    assert len(rolling.block_objectives) == 1
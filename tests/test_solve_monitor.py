@@ -0,0 +1,21 @@
+import contextlib
+import io
+import pytest
+from solve_monitor import SolveMonitor
+
+
+def test_unknown_stop_targets_are_rejected():
+    # A misspelled KPI would otherwise fail with a KeyError inside the Gurobi callback at the first incumbent
+    with pytest.raises(ValueError, match='max_wait'):
+        SolveMonitor(None, stop_when={'max_wait': 20, 'gap': 0.02})
+    assert SolveMonitor(None, stop_when={'max_waiting_time': 20, 'gap': 0.02}).stop_when['gap'] == 0.02
+
+
+def test_incumbent_without_a_queue_has_no_waiting_time():
+    from Model import ACP
+    settings = {'minimum_desk_time': 4, 'p': 1, 'C': 3, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+    with contextlib.redirect_stdout(io.StringIO()):
+        acp = ACP('dynamic_ACP', 12, 1 / 4, settings, flight_schedule={0: (400, 0)})
+        monitor = SolveMonitor(acp)
+        acp.optimize(callback=monitor, OutputFlag=0)
+    assert monitor.incumbents and monitor.incumbents[-1]['max_waiting_time'] == 0
@@ -0,0 +1,14 @@
+import pytest
+from solver_profiles import cpu_threads, get_profile, solver_profiles, worker_threads
+
+
+def test_profiles_cap_the_threads():
+    # Threads 0 would let Gurobi take every core in each parallel worker
+    for name in solver_profiles:
+        assert 1 <= get_profile(name)['Threads'] <= cpu_threads
+    assert get_profile('fast', threads=2)['Threads'] == 2
+    assert get_profile(None, threads=3) == {'Threads': 3}
+    assert worker_threads(cpu_threads * 2) == 1
+    assert worker_threads(1) == cpu_threads
+    with pytest.raises(ValueError):
+        get_profile('quick')
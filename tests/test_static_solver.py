@@ -0,0 +1,74 @@
+import contextlib
+import io
+import numpy as np
+import pytest
+from Model import ACP
+from static_solver import StaticSolver
+
+parameter_settings = {'minimum_desk_time': 4, 'p': 1, 'C': 1, 's_open': 100, 's_operate': 10, 'h0': 10, 'l': 1}
+
+
+def test_missed_passengers_do_not_block_later_flights():
+    # One passenger per interval: flight 0 (window 12-51) gets 46 passengers and leaves 6 behind at its last
+    # check-in, flight 1 (window 26-65) gets 5 passengers at 52 and has 14 intervals left to serve them
+    schedule = {0: (300, 46), 1: (370, 5)}
+    passenger_flow = ({(1, 52): 5}, [46, 0])
+    static = StaticSolver(schedule, passenger_flow, parameter_settings)
+    kpis = static.evaluate_plan([1] * static.N)
+    assert kpis['missed'] == 6
+    assert static.q[1].sum() == 5
+    assert static.I[1, static.windows.end[1]] == 0
+
+
+@pytest.mark.parametrize('h0', [None, [10, 30, 5]])
+def test_matches_the_static_mip(h0):
+    # EDF (one queue cost) and the min-cost flow (queue costs per flight) give the optimum of the static_ACP MIP
+    settings = dict(parameter_settings, C=3)
+    time_varying = {'h0': np.array(h0, dtype=float)} if h0 is not None else None
+    np.random.seed(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        acp = ACP('static_ACP', 12, 1 / 4, settings, flight_schedule={0: (400, 40), 1: (450, 60), 2: (600, 30)}, time_varying=time_varying)
+        acp.optimize(OutputFlag=0)
+    static = StaticSolver.from_acp(acp)
+    assert static.solve() == pytest.approx(acp.objective)
+    assert static.status == 'optimal'
+    if h0 is None:
+        flow = StaticSolver.from_acp(acp)
+        assert flow.solve('flow') == pytest.approx(acp.objective)
+
+
+def test_evaluating_a_plan_counts_its_waiting_cost():
+    static = StaticSolver({0: (300, 10)}, ({}, [10]), parameter_settings)
+    kpis = static.evaluate_plan([1] * 288)  # One passenger per interval from the window start at 12
+    assert kpis == {'waiting_cost': 10 * sum(range(10)), 'missed': 0.0, 'max_waiting_time': 9 * 5}
+
+
+def test_evaluating_a_plan_serves_service_time_with_unequal_p():
+    # Two desks serve 2 minutes per interval: one passenger of flight 0 (p = 2) or two of flight 1 (p = 1)
+    settings = dict(parameter_settings, C=4)
+    static = StaticSolver({0: (300, 10), 1: (370, 5)}, ({(1, 52): 5}, [10, 0]), settings, time_varying={'p': np.array([2.0, 1.0])})
+    kpis = static.evaluate_plan([2] * static.N)
+    assert kpis['waiting_cost'] == 10 * sum(range(10)) + 10 * (3 + 1)
+    assert kpis['missed'] == 0
+    assert static.q[1, 52:55].tolist() == [2, 2, 1]
+    with pytest.raises(ValueError):
+        static.solve()
+
+
+def test_robustness_of_a_plan_with_service_times_per_flight():
+    from robustness import RobustnessAnalysis
+    settings = dict(parameter_settings, C=3)
+    np.random.seed(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        acp = ACP('dynamic_ACP', 12, 1 / 4, settings, flight_schedule={0: (400, 40), 1: (450, 60), 2: (600, 30)},
+                  time_varying={'p': np.array([1.0, 0.5, 2.0])})
+        acp.optimize(OutputFlag=0)
+        robustness = RobustnessAnalysis(acp, random_scale=15, n_samples=4)
+        np.random.seed(7)
+        expected = np.random.rand(3)
+        np.random.seed(7)
+        samples = robustness.evaluate()
+    assert np.random.rand(3) == pytest.approx(expected)  # The caller's random stream is left alone
+    # EDF is one feasible way to serve the fixed plan, the MIP serves it at the least waiting cost
+    assert robustness.nominal['waiting_cost'] >= acp.extract_results()['waiting_cost'] - 1e-6
+    assert len(samples) == 4 and samples['waiting_cost'].notna().all()
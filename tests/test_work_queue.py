@@ -0,0 +1,41 @@
+import time
+from batch import scenario_defaults
+from work_queue import WorkQueue
+
+scenario = {**scenario_defaults, 'name': 'queue_test', 'seeds': [0, 1]}
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), lease=0.05, max_attempts=3)
+    assert queue.enqueue(scenario) == 2
+    assert queue.enqueue(scenario) == 0  # Runs already in the queue are kept
+    run_id, _, _ = queue.claim('worker_a')
+    time.sleep(0.1)
+    assert queue.status()['expired_leases'] == 1
+    claimed = {queue.claim('worker_b')[0], queue.claim('worker_b')[0]}
+    assert run_id in claimed
+    # The result of the worker that lost its lease is dropped
+    assert queue.finish(run_id, 'worker_a', {'run_id': run_id, 'objective': 1.0}) is None
+    assert queue.finish(run_id, 'worker_b', {'run_id': run_id, 'objective': 2.0}) == 'done'
+    assert queue.results()['objective'].tolist() == [2.0]
+
+
+def test_failed_runs_are_retried_until_max_attempts(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), lease=60, max_attempts=2)
+    queue.enqueue({**scenario, 'seeds': [0]})
+    for expected in ('pending', 'failed'):
+        run_id, _, _ = queue.claim('worker')
+        assert queue.finish(run_id, 'worker', {'run_id': run_id, 'error': 'boom'}) == expected
+    assert queue.claim('worker') is None
+    assert queue.status()['failed'] == 1
+
+
+def test_lease_expired_on_last_attempt_fails_the_run(tmp_path):
+    queue = WorkQueue(str(tmp_path / 'queue.sqlite'), lease=0.05, max_attempts=1)
+    queue.enqueue({**scenario, 'seeds': [0]})
+    assert queue.claim('worker_a') is not None
+    time.sleep(0.1)
+    assert queue.status()['expired_failed'] == 1
+    assert queue.claim('worker_b') is None
+    status = queue.status()
+    assert status['failed'] == 1 and status.get('running', 0) == 0
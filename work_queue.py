@@ -0,0 +1,182 @@
+'''
+Work queue for spreading batch scenarios over several machines. The runs of a scenario file (see batch.py)
+are enqueued in a SQLite database on a shared location; any number of worker processes, on this or other
+servers, claim one run at a time under a lease, solve it and write the result back. A worker renews its
+lease while solving, so a run whose worker died is claimed again once the lease expires, and failed runs
+are retried up to max_attempts times. The coordinator commands report the progress and collect the KPI
+table. SQLite needs working file locks, on network filesystems without them use one queue per machine.
+
+    python work_queue.py enqueue scenario.yaml --db queue.sqlite
+    python work_queue.py worker --db queue.sqlite          (start one per core / server)
+    python work_queue.py status --db queue.sqlite
+    python work_queue.py collect --db queue.sqlite --output summary.csv
+'''
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import pandas as pd
+from batch import load_scenario, expand_runs, safe_solve_run
+
+
+class WorkQueue:
+    def __init__(self, path, lease=600, max_attempts=3):
+        self.path = path
+        self.lease = lease  # Seconds a claimed run stays with its worker without a renewal
+        self.max_attempts = max_attempts
+        with contextlib.closing(self.connect()) as connection:
+            connection.execute('''CREATE TABLE IF NOT EXISTS runs (
+                run_id TEXT PRIMARY KEY, scenario TEXT, run TEXT, status TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0,
+                worker TEXT, lease_until REAL, result TEXT, error TEXT, enqueued_at REAL, finished_at REAL)''')
+
+    def connect(self):
+        # Autocommit connection, transactions that claim or update runs are started explicitly
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        connection.execute('PRAGMA busy_timeout = 60000')
+        return connection
+
+    def enqueue(self, scenario):
+        # Adds the runs of a scenario, runs that are already in the queue (e.g. from an earlier enqueue) are kept as they are
+        runs = expand_runs(scenario)
+        with contextlib.closing(self.connect()) as connection:
+            before = connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+            connection.executemany('INSERT OR IGNORE INTO runs (run_id, scenario, run, enqueued_at) VALUES (?, ?, ?, ?)',
+                                   [(run['run_id'], json.dumps(scenario), json.dumps(run), time.time()) for run in runs])
+            added = connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0] - before
+        print(f"Enqueued {added} of {len(runs)} runs of scenario {scenario['name']}")
+        return added
+
+    def claim(self, worker):
+        # Takes a pending run, or a running one whose lease expired, in one transaction so no two workers get the same run
+        connection = self.connect()
+        try:
+            connection.execute('BEGIN IMMEDIATE')
+            now = time.time()
+            # A run whose worker died on its last attempt is not claimed again but failed
+            connection.execute('''UPDATE runs SET status = 'failed', error = 'lease expired on the last attempt', finished_at = ?, lease_until = NULL
+                                  WHERE status = 'running' AND lease_until < ? AND attempts >= ?''', (now, now, self.max_attempts))
+            row = connection.execute('''SELECT run_id, scenario, run FROM runs
+                                        WHERE (status = 'pending' OR (status = 'running' AND lease_until < ?)) AND attempts < ?
+                                        ORDER BY enqueued_at, run_id LIMIT 1''', (now, self.max_attempts)).fetchone()
+            if row is None:
+                connection.execute('COMMIT')
+                return None
+            connection.execute("UPDATE runs SET status = 'running', worker = ?, lease_until = ?, attempts = attempts + 1 WHERE run_id = ?",
+                               (worker, now + self.lease, row[0]))
+            connection.execute('COMMIT')
+            return row[0], json.loads(row[1]), json.loads(row[2])
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        finally:
+            connection.close()
+
+    def renew(self, run_id, worker):
+        with contextlib.closing(self.connect()) as connection:
+            connection.execute("UPDATE runs SET lease_until = ? WHERE run_id = ? AND worker = ? AND status = 'running'",
+                               (time.time() + self.lease, run_id, worker))
+
+    def finish(self, run_id, worker, result):
+        # Stores the result; a failed run goes back to the queue until it used all its attempts.
+        # Only the worker that holds the run can finish it, a late result after the lease was taken over is dropped
+        failed = 'error' in result
+        with contextlib.closing(self.connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            attempts, = connection.execute('SELECT attempts FROM runs WHERE run_id = ?', (run_id,)).fetchone()
+            status = ('pending' if attempts < self.max_attempts else 'failed') if failed else 'done'
+            updated = connection.execute('''UPDATE runs SET status = ?, result = ?, error = ?, finished_at = ?, lease_until = NULL
+                                            WHERE run_id = ? AND worker = ? AND status = 'running' ''',
+                                         (status, json.dumps(result), result.get('error'), time.time(), run_id, worker)).rowcount
+            connection.execute('COMMIT')
+        return status if updated else None
+
+    def status(self):
+        with contextlib.closing(self.connect()) as connection:
+            counts = dict(connection.execute('SELECT status, COUNT(*) FROM runs GROUP BY status').fetchall())
+            expired, exhausted = connection.execute('''SELECT COUNT(*), COALESCE(SUM(attempts >= ?), 0) FROM runs
+                                                       WHERE status = 'running' AND lease_until < ?''', (self.max_attempts, time.time())).fetchone()
+        counts['expired_leases'] = expired
+        # Expired on their last attempt, failed by the next claim
+        counts['expired_failed'] = exhausted
+        return counts
+
+    def results(self):
+        # KPI table of the finished runs
+        with contextlib.closing(self.connect()) as connection:
+            rows = connection.execute("SELECT result, worker, attempts FROM runs WHERE status = 'done' ORDER BY run_id").fetchall()
+        return pd.DataFrame([{**json.loads(result), 'worker': worker, 'attempts': attempts} for result, worker, attempts in rows])
+
+    def work(self, worker=None, threads=None, max_runs=None, idle_exit=True, poll=10):
+        # Worker loop: claim, solve with a lease renewal in the background, write back. Stops when the queue is empty
+        # (idle_exit) or after max_runs runs
+        worker = worker or f"{socket.gethostname()}:{os.getpid()}"
+        n_runs = 0
+        while max_runs is None or n_runs < max_runs:
+            claimed = self.claim(worker)
+            if claimed is None:
+                if idle_exit:
+                    break
+                time.sleep(poll)
+                continue
+            run_id, scenario, run = claimed
+            solving = threading.Event()
+            renewer = threading.Thread(target=self.keep_lease, args=(run_id, worker, solving), daemon=True)
+            renewer.start()
+            log_dir = os.path.join(scenario['output'], 'logs')
+            os.makedirs(log_dir, exist_ok=True)
+            try:
+                result = safe_solve_run(scenario, run, log_dir, threads)
+            finally:
+                solving.set()
+                renewer.join()
+            result['worker'] = worker
+            status = self.finish(run_id, worker, result)
+            n_runs += 1
+            objective = result.get('objective')
+            print(f"{worker} {run_id}: {status or 'lease lost, result dropped'}, "
+                  f"{'objective ' + format(objective, '.1f') if objective is not None else result.get('error', 'no solution')}", flush=True)
+        print(f"{worker} finished after {n_runs} runs")
+        return n_runs
+
+    def keep_lease(self, run_id, worker, solving):
+        while not solving.wait(self.lease / 3):
+            self.renew(run_id, worker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Work queue for ACP scenario runs over several workers and machines')
+    parser.add_argument('command', choices=['enqueue', 'worker', 'status', 'collect'])
+    parser.add_argument('scenario', nargs='?', help='Scenario file for enqueue (.yaml, .yml or .json)')
+    parser.add_argument('--db', default='work_queue.sqlite', help='Queue database, on a location all workers can reach')
+    parser.add_argument('--lease', type=float, default=600, help='Lease of a claimed run [s], renewed while solving')
+    parser.add_argument('--max-attempts', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=None, help='Gurobi threads per worker, by default the thread cap of the profile')
+    parser.add_argument('--max-runs', type=int, default=None, help='Worker stops after this many runs')
+    parser.add_argument('--wait', action='store_true', help='Worker waits for new runs instead of stopping when the queue is empty')
+    parser.add_argument('--output', default='work_queue_summary.csv', help='KPI table written by collect')
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.db, args.lease, args.max_attempts)
+    if args.command == 'enqueue':
+        if args.scenario is None:
+            parser.error('enqueue needs a scenario file')
+        queue.enqueue(load_scenario(args.scenario))
+    elif args.command == 'worker':
+        queue.work(threads=args.threads, max_runs=args.max_runs, idle_exit=not args.wait)
+    elif args.command == 'status':
+        print(queue.status())
+    else:
+        results = queue.results()
+        results.to_csv(args.output, index=False)
+        status = queue.status()
+        print(f"{len(results)} finished runs written to {args.output}, queue status {status}")
+        return 0 if not status.get('failed') and not status['expired_failed'] else 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())